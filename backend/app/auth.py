@@ -1,9 +1,22 @@
+import hmac
+from typing import Optional
 from fastapi import Header, HTTPException, status
 from app.config import settings
+from modules.auth.key_store import StoredKey, api_key_store
+
+# The env key is always valid; tenant keys are added through the store
+api_key_store.add_key(settings.API_KEY, "Default API Key")
+
+def authenticate_api_key(api_key: Optional[str]) -> Optional[StoredKey]:
+    """Check a tenant API key (constant-time) and count its use; None if invalid."""
+    record = api_key_store.verify(api_key) if isinstance(api_key, str) else None
+    if record is not None:
+        api_key_store.record_use(record.key_id)
+    return record
 
 async def verify_api_key(x_api_key: str = Header(None)):
-    """Verify standard API key for user endpoints."""
-    if not x_api_key or x_api_key != settings.API_KEY:
+    """Verify a tenant API key for user endpoints."""
+    if authenticate_api_key(x_api_key) is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid or missing API key"
@@ -12,9 +25,9 @@ async def verify_api_key(x_api_key: str = Header(None)):
 
 async def verify_admin_key(x_admin_key: str = Header(None)):
     """Verify admin API key for admin-only endpoints."""
-    if not x_admin_key or x_admin_key != settings.ADMIN_KEY:
+    if not x_admin_key or not hmac.compare_digest(x_admin_key.encode(), settings.ADMIN_KEY.encode()):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid or missing admin key"
         )
-    return x_admin_key
\ No newline at end of file
+    return x_admin_key
@@ -20,8 +20,8 @@ class Settings:
     # Allowed audio file extensions for transcription
     ALLOWED_AUDIO_EXTENSIONS = {".mp3", ".wav", ".m4a", ".webm"}
     
-    # Default Whisper model
-    DEFAULT_WHISPER_MODEL = "whisper-1"
+    # Whisper and translation models are picked per request by
+    # app.services.provider_router
     
     def __init__(self):
         if not self.GROQ_API_KEY:
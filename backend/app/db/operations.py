@@ -67,6 +67,68 @@ class DatabaseService:
             db.rollback()
             return False
     
+    def add_messages(self, db, session_id: str, messages: List[Dict[str, Any]]) -> bool:
+        """Add a batch of history entries to a conversation session in one commit"""
+        if not SQLALCHEMY_AVAILABLE or not db:
+            print(f"📝 Mock: Added {len(messages)} messages to session {session_id}")
+            return True
+            
+        try:
+            db.add_all([
+                ConversationMessage(
+                    session_id=session_id,
+                    speaker_id=msg["speaker_id"],
+                    message_type=msg.get("message_type", "transcription"),
+                    content=msg["content"],
+                    timestamp=datetime.fromisoformat(msg["timestamp"]) if msg.get("timestamp") else datetime.utcnow(),
+                    language=msg.get("language"),
+                    emotions=msg.get("emotions") or {},
+                    message_metadata={"seq": msg.get("seq")}
+                )
+                for msg in messages
+            ])
+            db.commit()
+            return True
+        except Exception as e:
+            print(f"Error adding messages: {e}")
+            db.rollback()
+            return False
+    
+    def get_spilled_messages(self, db, session_id: str, first_seq: int,
+                             end_seq: int) -> List[Dict[str, Any]]:
+        """
+        Get a session's spilled history entries with first_seq <= seq < end_seq
+        
+        Only rows written by add_messages carry a seq, so messages stored
+        through add_message are not part of the range.
+        """
+        if not SQLALCHEMY_AVAILABLE or not db:
+            return []
+            
+        try:
+            seq = ConversationMessage.message_metadata["seq"].as_integer()
+            messages = db.query(ConversationMessage).filter(
+                ConversationMessage.session_id == session_id,
+                seq >= first_seq,
+                seq < end_seq
+            ).order_by(seq, ConversationMessage.id).all()
+            
+            return [
+                {
+                    "seq": (msg.message_metadata or {}).get("seq"),
+                    "speaker_id": msg.speaker_id,
+                    "content": msg.content,
+                    "timestamp": msg.timestamp.isoformat(),
+                    "message_type": msg.message_type,
+                    "language": msg.language,
+                    "emotions": msg.emotions
+                }
+                for msg in messages
+            ]
+        except Exception as e:
+            print(f"Error getting messages: {e}")
+            return []
+    
     def get_session_messages(self, db, session_id: str) -> List[Dict[str, Any]]:
         """Get all messages for a session"""
         if not SQLALCHEMY_AVAILABLE or not db:
@@ -121,6 +183,99 @@ class DatabaseService:
             db.rollback()
             return False
     
+    def get_summary_checkpoint(self, db, session_id: str) -> Optional[Dict[str, Any]]:
+        """Get a session's rolling summary and the last message folded into it"""
+        if not SQLALCHEMY_AVAILABLE or not db:
+            return None
+            
+        try:
+            session = db.query(ConversationSession).filter(
+                ConversationSession.session_id == session_id
+            ).first()
+            if not session:
+                return None
+            
+            checkpoint = (session.session_metadata or {}).get("summary_checkpoint", {})
+            return {
+                "summary": session.summary,
+                "last_message_id": checkpoint.get("last_message_id", 0),
+                "summarized_messages": checkpoint.get("summarized_messages", 0),
+                "client_messages": checkpoint.get("client_messages", 0),
+                "client_tail": checkpoint.get("client_tail"),
+                "updated_at": session.updated_at.isoformat() if session.updated_at else None
+            }
+        except Exception as e:
+            print(f"Error getting summary checkpoint: {e}")
+            return None
+    
+    def get_messages_after(self, db, session_id: str, after_id: int = 0,
+                           limit: int = 50) -> List[Dict[str, Any]]:
+        """Get a session's messages with a row id above after_id, in insertion order"""
+        if not SQLALCHEMY_AVAILABLE or not db:
+            return []
+            
+        try:
+            messages = db.query(ConversationMessage).filter(
+                ConversationMessage.session_id == session_id,
+                ConversationMessage.id > after_id
+            ).order_by(ConversationMessage.id).limit(limit).all()
+            
+            return [
+                {
+                    "id": msg.id,
+                    "speaker_id": msg.speaker_id,
+                    "content": msg.content,
+                    "timestamp": msg.timestamp.isoformat(),
+                    "message_type": msg.message_type,
+                    "language": msg.language
+                }
+                for msg in messages
+            ]
+        except Exception as e:
+            print(f"Error getting messages: {e}")
+            return []
+    
+    def save_summary_checkpoint(self, db, session_id: str, summary: str,
+                                last_message_id: int, summarized_messages: int,
+                                client_state: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        Store a rolling summary with its checkpoint, creating the session row if needed
+        
+        client_state ("client_messages", "client_tail") records how much of
+        a client-posted history is folded in; it is kept when omitted.
+        """
+        if not SQLALCHEMY_AVAILABLE or not db:
+            print(f"📝 Mock: Updated summary for session {session_id}")
+            return True
+            
+        try:
+            session = db.query(ConversationSession).filter(
+                ConversationSession.session_id == session_id
+            ).first()
+            if not session:
+                session = ConversationSession(session_id=session_id, participants=[])
+                db.add(session)
+            
+            session.summary = summary
+            # Reassign so the JSON column is seen as changed
+            metadata = session.session_metadata or {}
+            session.session_metadata = {
+                **metadata,
+                "summary_checkpoint": {
+                    **metadata.get("summary_checkpoint", {}),
+                    **(client_state or {}),
+                    "last_message_id": last_message_id,
+                    "summarized_messages": summarized_messages
+                }
+            }
+            session.updated_at = datetime.utcnow()
+            db.commit()
+            return True
+        except Exception as e:
+            print(f"Error saving summary checkpoint: {e}")
+            db.rollback()
+            return False
+    
     def get_user_last_session(self, db, user_id: str) -> Optional[Dict[str, Any]]:
         """Get user's last session summary"""
         if not SQLALCHEMY_AVAILABLE or not db:
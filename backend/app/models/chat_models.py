@@ -2,7 +2,7 @@
 Pydantic models for chat-related requests and responses.
 """
 from pydantic import BaseModel
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 class ChatTestRequest(BaseModel):
     """Request model for chat test endpoint."""
@@ -18,6 +18,7 @@ class ChatRequest(BaseModel):
     """Request model for chat endpoint."""
     model: str
     messages: List[ChatMessage]
+    session_id: Optional[str] = None  # use this session's stored summary for older turns
 
 class ChatResponse(BaseModel):
     """Response model for chat endpoints."""
@@ -289,18 +289,7 @@ async def get_active_sessions(admin_key: str = Depends(verify_admin_key)):
     Get currently active sessions. Requires admin authentication.
     """
     try:
-        active_sessions = [
-            {
-                "session_id": session_id,
-                "user_id": data["user_id"],
-                "start_time": data["start_time"],
-                "language": data["language"],
-                "message_count": data["message_count"],
-                "audio_minutes": round(data["audio_minutes"], 2),
-                "features_used": list(data["features_used"])
-            }
-            for session_id, data in analytics_service.active_sessions.items()
-        ]
+        active_sessions = analytics_service.get_active_sessions()
         
         return {
             "success": True,
@@ -1,8 +1,14 @@
-from fastapi import APIRouter, Depends
-from app.auth import verify_api_key
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel
+from app.auth import api_key_store, verify_api_key, verify_admin_key
 
 router = APIRouter()
 
+class CreateKeyRequest(BaseModel):
+    name: str
+    tenant: str = "default"
+
 @router.get("/")
 def root():
     """Root endpoint for service status."""
@@ -21,3 +27,21 @@ async def get_current_user():
         "user": "authenticated",
         "message": "API key is valid"
     }
+
+@router.post("/admin/api-keys", dependencies=[Depends(verify_admin_key)])
+async def create_api_key(request: CreateKeyRequest):
+    """Issue a tenant API key. The key is only returned in this response."""
+    raw_key, record = api_key_store.create_key(request.name, request.tenant)
+    return {"api_key": raw_key, **record.public_dict()}
+
+@router.get("/admin/api-keys", dependencies=[Depends(verify_admin_key)])
+async def list_api_keys(tenant: Optional[str] = None):
+    """List API keys (without the keys themselves)."""
+    return {"keys": api_key_store.list_keys(tenant)}
+
+@router.delete("/admin/api-keys/{key_id}", dependencies=[Depends(verify_admin_key)])
+async def revoke_api_key(key_id: str):
+    """Revoke an API key."""
+    if not api_key_store.revoke(key_id):
+        raise HTTPException(status_code=404, detail="API key not found")
+    return {"status": "revoked", "key_id": key_id}
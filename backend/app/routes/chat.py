@@ -8,6 +8,7 @@ from app.auth import verify_api_key
 from app.models.chat_models import ChatTestRequest, ChatRequest
 from app.services.groq_client import groq_client
 from app.services.chat_service import generate_chat_response, transcribe_and_chat
+from app.services.context_window import context_window_manager
 
 router = APIRouter()
 
@@ -36,7 +37,7 @@ async def chat(request: ChatRequest):
     Accepts model and messages, returns AI-generated reply.
     """
     try:
-        ai_reply = await generate_chat_response(request.model, request.messages)
+        ai_reply = await generate_chat_response(request.model, request.messages, request.session_id)
         return {
             "status": "success",
             "model": request.model,
@@ -48,6 +49,14 @@ async def chat(request: ChatRequest):
             content={"status": "error", "detail": str(e)}
         )
 
+@router.get("/chat/context-metrics", dependencies=[Depends(verify_api_key)])
+async def chat_context_metrics():
+    """
+    Token usage of the chat context window manager: tokens sent versus
+    tokens the clients supplied, and cached prompt tokens reported by the provider.
+    """
+    return context_window_manager.get_metrics()
+
 @router.post("/transcribe-and-chat", dependencies=[Depends(verify_api_key)])
 async def transcribe_and_chat_endpoint(
     file: UploadFile = File(...),
@@ -3,6 +3,7 @@ Multi-Language Simple WebSocket Route
 Simple implementation for multi-party translation without complex dependencies
 """
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from starlette.websockets import WebSocketState
 from typing import Dict, List, Set
 import json
 import asyncio
@@ -10,13 +11,18 @@ import logging
 from groq import Groq
 import os
 
+from app.services.compact import intern_code
+from app.services.expiry import expiry_scheduler
+from app.services.provider_router import provider_router, estimate_translation_tokens
+
 router = APIRouter()
 
 # Simple connection manager for multi-language rooms
 class MultiLanguageManager:
-    def __init__(self):
+    def __init__(self, idle_ttl: float = 600.0):
         self.rooms: Dict[str, Dict[str, WebSocket]] = {}  # room_id -> {user_id: websocket}
         self.user_languages: Dict[str, str] = {}  # user_id -> language_code
+        expiry_scheduler.register("room", idle_ttl, self._expire_room)
         
     async def connect(self, websocket: WebSocket, room_id: str, user_id: str, language: str):
         logging.debug(f"connect: room={room_id} user={user_id} lang={language}")
@@ -24,7 +30,8 @@ class MultiLanguageManager:
             self.rooms[room_id] = {}
         
         self.rooms[room_id][user_id] = websocket
-        self.user_languages[user_id] = language
+        self.user_languages[user_id] = intern_code(language)
+        expiry_scheduler.touch("room", room_id)
         
         # Notify room about new user
         await self.broadcast_to_room(room_id, {
@@ -44,11 +51,21 @@ class MultiLanguageManager:
             # Clean up empty rooms
             if not self.rooms[room_id]:
                 del self.rooms[room_id]
+                expiry_scheduler.cancel("room", room_id)
+    
+    def _expire_room(self, room_id: str):
+        """Expiry callback: drop users whose socket has gone away and the room once it is empty"""
+        for user_id, websocket in list(self.rooms.get(room_id, {}).items()):
+            if websocket.client_state != WebSocketState.CONNECTED:
+                self.disconnect(room_id, user_id)
+        if room_id in self.rooms:
+            return False
                 
     async def broadcast_to_room(self, room_id: str, message: dict, exclude_user: str = None):
         logging.debug(f"broadcast: room={room_id} type={message.get('type')} exclude={exclude_user}")
         if room_id not in self.rooms:
             return
+        expiry_scheduler.touch("room", room_id)
             
         disconnected_users = []
         for user_id, websocket in self.rooms[room_id].items():
@@ -65,7 +82,7 @@ class MultiLanguageManager:
             self.disconnect(room_id, user_id)
 
 # Global manager instance
-multi_lang_manager = MultiLanguageManager()
+multi_lang_manager = MultiLanguageManager(idle_ttl=float(os.getenv("ROOM_IDLE_TTL", "600")))
 
 # Initialize Groq client
 groq_client = None
@@ -76,8 +93,21 @@ try:
 except Exception as e:
     logging.warning(f"Failed to initialize Groq client: {e}")
 
+def _translation_invoke(prompt: str):
+    """Build the router invoke function for one translation."""
+    def invoke(spec, client):
+        return provider_router.create(
+            spec,
+            client.chat.completions,
+            model=spec.model,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=512,
+            temperature=0.3
+        )
+    return invoke
+
 async def translate_text(text: str, target_language: str) -> str:
-    """Simple translation using Groq"""
+    """Translate with the model the provider router picks"""
     print(f"translate_text called: text='{text}', target_language='{target_language}'")
     
     if not groq_client:
@@ -89,15 +119,15 @@ async def translate_text(text: str, target_language: str) -> str:
         prompt = f"Translate this text to {target_language}. Only return the translation, no explanation:\n\n{text}"
         print(f"Translation prompt: {prompt}")
         
-        response = groq_client.chat.completions.create(
-            model="llama-3.1-8b-instant",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=512,
-            temperature=0.3
+        response, spec = await provider_router.call(
+            "translation",
+            _translation_invoke(prompt),
+            language=target_language,
+            units=estimate_translation_tokens(text)
         )
         
         translated = response.choices[0].message.content.strip()
-        print(f"Translation result: '{translated}'")
+        print(f"Translation result ({spec.key}): '{translated}'")
         return translated
     except Exception as e:
         print(f"Translation error: {e}")
@@ -8,26 +8,32 @@ import uuid
 from datetime import datetime
 import io
 
-from ..services.groq_client import groq_client
-from ..services.chat_service import ChatService
-from ..db.database import get_db
-from sqlalchemy.orm import Session
+from ..services.provider_router import provider_router, estimate_audio_minutes, estimate_translation_tokens
+from modules.emotion.emotion_service import emotion_detector
+from modules.emotion.prosody import acoustic_emotion_detector
+from modules.speaker_id.embeddings import decode_utterance
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
 async def translate_text_simple(text: str, target_language: str) -> str:
-    """Simple translation using Groq (placeholder)"""
-    try:
-        # Simple prompt-based translation
-        response = groq_client.chat.completions.create(
-            model="mixtral-8x7b-32768",
+    """Simple translation with the model the provider router picks"""
+    def invoke(spec, client):
+        return provider_router.create(
+            spec,
+            client.chat.completions,
+            model=spec.model,
             messages=[
                 {"role": "user", "content": f"Translate this text to {target_language}: {text}"}
             ],
             max_tokens=1000,
             temperature=0.1
         )
+    
+    try:
+        response, _ = await provider_router.call(
+            "translation", invoke, language=target_language, units=estimate_translation_tokens(text)
+        )
         return response.choices[0].message.content.strip()
     except Exception as e:
         logger.error(f"Translation error: {e}")
@@ -215,17 +221,23 @@ async def handle_voice_message(user_id: str, message: dict):
         # Decode audio
         audio_bytes = base64.b64decode(audio_data)
         
-        # Step 1: Transcribe audio
-        # Create a temporary file for audio processing
-        with io.BytesIO(audio_bytes) as audio_file:
+        # Step 1: Transcribe audio on the model the provider router picks
+        def transcribe(spec, client):
+            audio_file = io.BytesIO(audio_bytes)
             audio_file.name = "audio.wav"
-            transcription = groq_client.audio.transcriptions.create(
+            return provider_router.create(
+                spec,
+                client.audio.transcriptions,
                 file=audio_file,
-                model="whisper-large-v3",
+                model=spec.model,
                 language=user_language if user_language != 'auto' else None
             )
-            transcribed_text = transcription.text
-            detected_language = user_language  # Simplified for now
+        
+        transcription, _ = await provider_router.call(
+            "asr", transcribe, language=user_language, units=estimate_audio_minutes(audio_bytes)
+        )
+        transcribed_text = transcription.text
+        detected_language = user_language  # Simplified for now
         
         if not transcribed_text.strip():
             await manager.send_personal_message(user_id, {
@@ -234,8 +246,12 @@ async def handle_voice_message(user_id: str, message: dict):
             })
             return
         
-        # Step 2: Simple emotion detection (placeholder)
-        emotion = 'neutral'  # Simplified for now
+        # Step 2: Emotion from the transcript, fused with the voice's prosody
+        emotion_result = await acoustic_emotion_detector.detect_async(
+            decode_utterance(audio_bytes),
+            text_result=emotion_detector.detect_emotion(transcribed_text)
+        )
+        emotion = emotion_result.primary_emotion.value
         
         # Step 3: Send original transcription to sender
         await manager.send_personal_message(user_id, {
@@ -297,8 +313,8 @@ async def handle_text_message(user_id: str, message: dict):
         if not content or not room_code:
             raise ValueError("Missing content or room_code")
         
-        # Step 1: Simple emotion detection (placeholder)
-        emotion = 'neutral'  # Simplified for now
+        # Step 1: Emotion detection from the text
+        emotion = emotion_detector.detect_emotion(content).primary_emotion.value
         
         # Step 2: Get room users and their language preferences
         room_users = manager.get_room_users(room_code)
@@ -2,24 +2,42 @@
 Phase 4 API routes for enhanced Voice AI features.
 Includes speaker identification, emotion detection, and session management.
 """
-from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException
-from fastapi.responses import JSONResponse
-from typing import Optional, Dict
+import asyncio
+from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, Query
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import Optional, Dict, List
+from pydantic import BaseModel
 from app.auth import verify_api_key
 from app.models.chat_models import ChatMessage
 from modules.speaker_id.speaker_service import speaker_identifier
+from modules.speaker_id.embeddings import compute_embedding, decode_utterance
 from modules.emotion.emotion_service import emotion_detector
+from modules.emotion.prosody import acoustic_emotion_detector
 from modules.auth.auth_service import enhanced_auth_service
+from app.services.expiry import expiry_scheduler
 from app.services.conversation_logger import conversation_logger
+from app.services.batch_analysis import text_batch_analyzer
+from app.services.task_graph import TaskGraph
 from app.services.stt_service import transcribe_audio
 
 router = APIRouter()
 
-@router.post("/session/start", dependencies=[Depends(verify_api_key)])
+# End Phase 4 sessions when their lifetime is up instead of on the next lookup
+enhanced_auth_service.use_expiry_scheduler(expiry_scheduler)
+
+# Upper bound on texts per /analyze-text/batch request
+MAX_BATCH_TEXTS = 50000
+
+class TextBatchRequest(BaseModel):
+    texts: List[str]
+    session_id: Optional[str] = None
+
+@router.post("/session/start")
 async def start_session(
     source_language: str = Form(default="auto"),
     target_language: str = Form(default="en"),
-    voice_preference: str = Form(default="default")
+    voice_preference: str = Form(default="default"),
+    api_key: str = Depends(verify_api_key)
 ):
     """
     Start a new conversation session with Phase 4 features.
@@ -33,7 +51,7 @@ async def start_session(
         }
         
         session_id = enhanced_auth_service.create_session(
-            api_key="fast_API_KEY",  # Use actual API key validation
+            api_key=api_key,
             preferences=preferences
         )
         
@@ -106,6 +124,24 @@ async def analyze_text(
             content={"status": "error", "detail": str(e)}
         )
 
+@router.post("/analyze-text/batch", dependencies=[Depends(verify_api_key)])
+async def analyze_text_batch(request: TextBatchRequest):
+    """
+    Analyze many texts for speaker identification and emotion detection.
+    
+    Results stream back as NDJSON, one line per text (with its index) and
+    a final completion line; log entries are written in one bulk append.
+    """
+    if not request.texts:
+        raise HTTPException(status_code=400, detail="No texts provided")
+    if len(request.texts) > MAX_BATCH_TEXTS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_TEXTS} texts per batch")
+    
+    return StreamingResponse(
+        text_batch_analyzer.stream(request.texts, request.session_id),
+        media_type="application/x-ndjson"
+    )
+
 @router.post("/voice-analyze", dependencies=[Depends(verify_api_key)])
 async def voice_analyze(
     file: UploadFile = File(...),
@@ -113,23 +149,65 @@ async def voice_analyze(
 ):
     """
     Analyze uploaded audio for transcription, speaker ID, and emotion.
+    
+    Runs as a task graph: the audio is decoded once, and the speaker
+    embedding and prosody branches run alongside transcription. The
+    text-dependent parts are merged at the end. Per-branch timings are
+    returned in "timings".
     """
     try:
-        # Transcribe audio
-        transcription_result = await transcribe_audio(file)
-        if transcription_result["status"] != "success":
-            raise Exception("Transcription failed")
+        audio_bytes = await file.read()
+        await file.seek(0)
         
-        text = transcription_result["transcription"]
+        async def transcribe():
+            result = await transcribe_audio(file)
+            if result["status"] != "success":
+                raise Exception("Transcription failed")
+            return result["transcription"]
         
-        # Speaker identification
-        speaker_id, speaker_confidence = speaker_identifier.identify_speaker(text)
+        async def decode():
+            return await asyncio.to_thread(decode_utterance, audio_bytes)
+        
+        async def speaker_embedding(audio):
+            if audio is None or len(audio) == 0:
+                return None
+            return await asyncio.to_thread(compute_embedding, audio)
+        
+        async def prosody(audio):
+            return await acoustic_emotion_detector.analyze_async(audio)
+        
+        async def text_emotion(text):
+            return emotion_detector.detect_emotion(text)
+        
+        async def speaker(text, embedding):
+            # Falls back to text style if the audio couldn't be decoded
+            features = {"embedding": embedding} if embedding is not None else None
+            return speaker_identifier.identify_speaker(text, audio_features=features)
+        
+        async def emotion(text_result, analysis):
+            if analysis is None:
+                return text_result
+            features, scores = analysis
+            return acoustic_emotion_detector.fuse(text_result, scores, features)
+        
+        graph = (
+            TaskGraph()
+            .add("asr", transcribe)
+            .add("decode", decode)
+            .add("speaker_embedding", speaker_embedding, ["decode"])
+            .add("prosody", prosody, ["decode"])
+            .add("text_emotion", text_emotion, ["asr"])
+            .add("speaker", speaker, ["asr", "speaker_embedding"])
+            .add("emotion", emotion, ["text_emotion", "prosody"])
+        )
+        results, timings = await graph.run()
+        
+        text = results["asr"]
+        speaker_id, speaker_confidence = results["speaker"]
+        emotion_result = results["emotion"]
         speaker_info = speaker_identifier.get_speaker_info(speaker_id)
         speaker_label = speaker_info.label if speaker_info else "Unknown"
         
-        # Emotion detection
-        emotion_result = emotion_detector.detect_emotion(text)
-        
         # Log to conversation if session provided
         if session_id:
             conversation_logger.log_conversation(
@@ -154,7 +232,8 @@ async def voice_analyze(
                 "primary": emotion_result.primary_emotion.value,
                 "confidence": emotion_result.confidence,
                 "all_scores": emotion_result.emotion_scores
-            }
+            },
+            "timings": timings
         }
         
     except Exception as e:
@@ -206,6 +285,43 @@ async def get_session_history(session_id: str):
             content={"status": "error", "detail": str(e)}
         )
 
+EXPORT_MEDIA_TYPES = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "txt": "text/plain"
+}
+
+@router.get("/session/{session_id}/export", dependencies=[Depends(verify_api_key)])
+async def export_session(
+    session_id: str,
+    format: str = Query("json", description="Export format: json, ndjson, csv or txt"),
+    gzip: bool = Query(False, description="Gzip the export on the fly")
+):
+    """
+    Stream a conversation session export without loading it into memory.
+    """
+    if format not in EXPORT_MEDIA_TYPES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported format. Supported: {list(EXPORT_MEDIA_TYPES)}"
+        )
+    
+    if not conversation_logger.get_session_metadata(session_id):
+        raise HTTPException(status_code=404, detail="Session not found")
+    
+    filename = f"session_{session_id}.{format}"
+    media_type = EXPORT_MEDIA_TYPES[format]
+    if gzip:
+        filename += ".gz"
+        media_type = "application/gzip"
+    
+    return StreamingResponse(
+        conversation_logger.stream_export(session_id, format, compress=gzip),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
 @router.post("/session/{session_id}/end", dependencies=[Depends(verify_api_key)])
 async def end_session(session_id: str):
     """
@@ -238,23 +354,11 @@ async def get_recent_sessions():
     Get list of recent sessions.
     """
     try:
-        recent_sessions = conversation_logger.get_recent_sessions(10)
-        
-        sessions_info = []
-        for session_id in recent_sessions:
-            session = conversation_logger.get_session_history(session_id)
-            if session:
-                sessions_info.append({
-                    "session_id": session_id,
-                    "start_time": session.start_time,
-                    "total_entries": session.total_entries,
-                    "participant_count": session.participant_count,
-                    "languages": f"{session.source_language} → {session.target_language}"
-                })
+        recent_sessions = conversation_logger.get_recent_session_summaries(10)
         
         return {
             "status": "success",
-            "sessions": sessions_info
+            "sessions": [_format_catalog_row(row) for row in recent_sessions]
         }
         
     except Exception as e:
@@ -263,6 +367,65 @@ async def get_recent_sessions():
             content={"status": "error", "detail": str(e)}
         )
 
+@router.get("/sessions/by-language/{language}", dependencies=[Depends(verify_api_key)])
+async def get_sessions_by_language(
+    language: str,
+    limit: int = Query(10, ge=1, le=100)
+):
+    """
+    Get recent sessions using a language as source or target.
+    """
+    try:
+        sessions = conversation_logger.get_sessions_by_language(language, limit)
+        
+        return {
+            "status": "success",
+            "language": language,
+            "sessions": [_format_catalog_row(row) for row in sessions]
+        }
+        
+    except Exception as e:
+        return JSONResponse(
+            status_code=500,
+            content={"status": "error", "detail": str(e)}
+        )
+
+@router.get("/sessions/by-participants", dependencies=[Depends(verify_api_key)])
+async def get_sessions_by_participants(
+    min_participants: int = Query(0, ge=0),
+    max_participants: Optional[int] = Query(None, ge=0),
+    limit: int = Query(10, ge=1, le=100)
+):
+    """
+    Get recent sessions within a participant count range.
+    """
+    try:
+        sessions = conversation_logger.get_sessions_by_participant_count(
+            min_participants, max_participants, limit
+        )
+        
+        return {
+            "status": "success",
+            "sessions": [_format_catalog_row(row) for row in sessions]
+        }
+        
+    except Exception as e:
+        return JSONResponse(
+            status_code=500,
+            content={"status": "error", "detail": str(e)}
+        )
+
+def _format_catalog_row(row: Dict) -> Dict:
+    """Shape a session catalog row for API responses."""
+    return {
+        "session_id": row["session_id"],
+        "start_time": row["start_time"],
+        "end_time": row["end_time"],
+        "total_entries": row["total_entries"],
+        "participant_count": row["participant_count"],
+        "languages": f"{row['source_language']} → {row['target_language']}"
+    }
+
 @router.get("/system/status", dependencies=[Depends(verify_api_key)])
 async def get_system_status():
     """
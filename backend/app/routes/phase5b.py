@@ -1,6 +1,7 @@
 """
 Phase 5B Routes - Multiparty, Persistent Memory, and Local Mode
 """
+import asyncio
 from typing import List, Dict, Any, Optional
 from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel
@@ -21,6 +22,8 @@ except ImportError:
 from app.services.multiparty import multiparty_manager
 from app.services.persistent_memory import persistent_memory_service
 from app.services.local_mode import local_mode_service
+from app.services.provider_router import provider_router
+from app.services.expiry import expiry_scheduler
 
 router = APIRouter()
 
@@ -45,6 +48,11 @@ class LocalModeRequest(BaseModel):
     asr_mode: Optional[str] = None
     tts_mode: Optional[str] = None
 
+class SharedAudioRequest(BaseModel):
+    audio_data: str  # Base64 encoded 16 kHz mono 16-bit PCM
+    language: str = "en"
+    final: bool = False
+
 class ProcessAudioRequest(BaseModel):
     audio_data: str  # Base64 encoded
     language: str = "en"
@@ -94,13 +102,29 @@ async def get_multiparty_session_info(
     if not session_info:
         raise HTTPException(status_code=404, detail="Session not found")
     
-    # Get persistent summary if available
-    summary = persistent_memory_service.get_session_summary(db, session_id)
+    # Get persistent summary if available (built by an LLM call on first request)
+    summary = await asyncio.to_thread(persistent_memory_service.get_session_summary, db, session_id)
     if summary:
         session_info["summary"] = summary
     
     return session_info
 
+@router.get("/sessions/multiparty/{session_id}/history")
+async def get_multiparty_session_history(
+    session_id: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=500),
+    api_key: str = Depends(verify_api_key)
+):
+    """Page through a multiparty session's history, oldest first; follow next_offset for more"""
+    # Older pages come from the database
+    page = await asyncio.to_thread(multiparty_manager.get_history_page, session_id, offset, limit)
+    
+    if page is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    
+    return page
+
 @router.get("/sessions/multiparty")
 async def list_multiparty_sessions(
     api_key: str = Depends(verify_api_key)
@@ -114,6 +138,36 @@ async def list_multiparty_sessions(
         "total_participants": sum(s.get("participant_count", 0) for s in sessions)
     }
 
+@router.post("/sessions/multiparty/{session_id}/audio")
+async def process_shared_microphone_audio(
+    session_id: str,
+    request: SharedAudioRequest,
+    api_key: str = Depends(verify_api_key)
+):
+    """Diarize a chunk of shared-microphone audio and transcribe each speaker's segments"""
+    import base64
+    
+    try:
+        audio_data = base64.b64decode(request.audio_data)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid base64 audio data")
+    
+    result = await multiparty_manager.process_shared_audio(
+        session_id,
+        audio_data,
+        local_mode_service.process_audio_transcription,
+        language=request.language,
+        final=request.final
+    )
+    
+    if "error" in result:
+        raise HTTPException(status_code=404, detail=result["error"])
+    if "unavailable" in result:
+        # Every ASR backend failed or has an open circuit
+        raise HTTPException(status_code=503, detail=f"Audio processing unavailable: {result['unavailable']}")
+    
+    return result
+
 # Persistent Memory Endpoints
 
 @router.post("/memory/session-summary")
@@ -124,7 +178,8 @@ async def store_session_summary(
 ):
     """Store a session summary in persistent memory"""
     try:
-        success = persistent_memory_service.store_session_summary(
+        success = await asyncio.to_thread(
+            persistent_memory_service.store_session_summary,
             db, request.session_id, request.participants, request.messages
         )
         
@@ -147,7 +202,7 @@ async def get_session_summary(
     api_key: str = Depends(verify_api_key)
 ):
     """Get session summary from persistent memory"""
-    summary = persistent_memory_service.get_session_summary(db, session_id)
+    summary = await asyncio.to_thread(persistent_memory_service.get_session_summary, db, session_id)
     
     if summary:
         return {
@@ -225,12 +280,16 @@ async def process_audio_local_mode(
         # Decode base64 audio data
         audio_data = base64.b64decode(request.audio_data)
         
-        # Process using current mode
-        result = local_mode_service.process_audio_transcription(
+        # Process using current mode; local inference is CPU-bound
+        result = await asyncio.to_thread(
+            local_mode_service.process_audio_transcription,
             audio_data, request.language
         )
         
         return result
+    except RuntimeError as e:
+        # Every ASR backend failed or has an open circuit
+        raise HTTPException(status_code=503, detail=f"Audio processing unavailable: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Audio processing failed: {str(e)}")
 
@@ -243,8 +302,10 @@ async def generate_speech_local_mode(
 ):
     """Generate speech using current local/cloud mode"""
     try:
-        result = local_mode_service.generate_speech(text, voice_id, language)
+        result = await asyncio.to_thread(local_mode_service.generate_speech, text, voice_id, language)
         return result
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=f"Speech generation unavailable: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Speech generation failed: {str(e)}")
 
@@ -253,7 +314,7 @@ async def switch_to_fallback_mode(
     service: str,
     api_key: str = Depends(verify_api_key)
 ):
-    """Switch to fallback mode for a service (asr or tts)"""
+    """Swap the preferred mode for a service (asr or tts); automatic failover still applies"""
     if service not in ["asr", "tts"]:
         raise HTTPException(status_code=400, detail="Service must be 'asr' or 'tts'")
     
@@ -268,6 +329,11 @@ async def switch_to_fallback_mode(
     else:
         raise HTTPException(status_code=500, detail=f"Failed to switch {service} to fallback mode")
 
+@router.get("/providers/metrics")
+async def get_provider_metrics(api_key: str = Depends(verify_api_key)):
+    """Cloud model routing decisions, per-model latency/error/cost and rate-limit backoff"""
+    return provider_router.get_metrics()
+
 # Health check for Phase 5B features
 @router.get("/phase5b/health")
 async def phase5b_health_check():
@@ -281,6 +347,7 @@ async def phase5b_health_check():
             "local_mode": "available",
             "database": "connected" if HAS_DATABASE else "disabled"
         },
-        "active_sessions": len(multiparty_manager.get_all_sessions()),
+        "active_sessions": len(multiparty_manager.sessions),
+        "expiry": expiry_scheduler.get_metrics(),
         "local_mode_status": local_mode_service.get_status()
     }
@@ -2,13 +2,14 @@
 Voice profile management routes for Phase 5A
 REST API endpoints for voice cloning pipeline.
 """
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, StreamingResponse
 from typing import List, Optional
 import json
 
-from ..auth import verify_api_key
+from ..auth import authenticate_api_key, verify_api_key
 from ..services.voice.voice_profile_service import voice_profile_manager
+from ..workers.job_queue import job_queue
 
 router = APIRouter()
 
@@ -204,6 +205,67 @@ async def get_training_status(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving training status: {str(e)}")
 
+@router.get("/voice/profiles/{profile_id}/events")
+async def stream_training_status(
+    profile_id: str,
+    api_key: str = Depends(verify_api_key)
+):
+    """
+    Stream training progress for a voice profile as Server-Sent Events.
+    
+    Sends a `status` event on every change and closes once the profile
+    is ready or failed.
+    """
+    profile = voice_profile_manager.get_voice_profile(profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Voice profile not found")
+    
+    if profile.user_id != api_key:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    async def event_stream():
+        async for status in voice_profile_manager.watch_training(profile_id):
+            yield f"event: status\ndata: {json.dumps(status)}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.websocket("/voice/profiles/{profile_id}/ws")
+async def training_status_websocket(websocket: WebSocket, profile_id: str):
+    """
+    Push training progress for a voice profile over a WebSocket.
+    
+    The first message must be {"type": "auth", "api_key": "..."}.
+    """
+    await websocket.accept()
+    try:
+        message = json.loads(await websocket.receive_text())
+        profile = voice_profile_manager.get_voice_profile(profile_id)
+        
+        if message.get("type") != "auth" or authenticate_api_key(message.get("api_key")) is None:
+            await websocket.send_text(json.dumps({"type": "error", "message": "Invalid API key"}))
+            await websocket.close()
+            return
+        
+        if not profile or profile.user_id != message["api_key"]:
+            await websocket.send_text(json.dumps({"type": "error", "message": "Voice profile not found"}))
+            await websocket.close()
+            return
+        
+        async for status in voice_profile_manager.watch_training(profile_id):
+            await websocket.send_text(json.dumps({"type": "status", "status": status}))
+        
+        await websocket.close()
+        
+    except WebSocketDisconnect:
+        pass
+    except json.JSONDecodeError:
+        await websocket.send_text(json.dumps({"type": "error", "message": "Invalid JSON"}))
+        await websocket.close()
+
 @router.delete("/voice/profiles/{profile_id}")
 async def delete_voice_profile(
     profile_id: str,
@@ -263,6 +325,7 @@ async def get_voice_sample_info(
                 "duration_seconds": sample.duration_seconds,
                 "sample_rate": sample.sample_rate,
                 "quality_score": sample.quality_score,
+                "snr_db": sample.snr_db,
                 "uploaded_at": sample.uploaded_at
             }
         }
@@ -324,5 +387,6 @@ async def voice_service_health():
         "service": "voice_profiles",
         "status": "healthy",
         "total_profiles": len(voice_profile_manager.profiles),
-        "total_samples": len(voice_profile_manager.samples)
+        "total_samples": len(voice_profile_manager.samples),
+        "training_jobs": job_queue.stats()
     }
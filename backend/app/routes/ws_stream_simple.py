@@ -4,7 +4,8 @@ Enhanced WebSocket endpoint that returns JSON messages (no plain string echo).
 import json
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 from fastapi.responses import HTMLResponse
-from app.config import settings
+from app.auth import api_key_store
+from modules.emotion.emotion_service import emotion_detector
 
 router = APIRouter()
 
@@ -23,7 +24,7 @@ async def websocket_endpoint(websocket: WebSocket, session_id: str):
                 continue
 
             if msg.get("type") == "auth":
-                if msg.get("api_key") == settings.API_KEY:
+                if api_key_store.verify(msg.get("api_key")):
                     authed = True
                     await websocket.send_text(json.dumps({"type": "auth_ok", "session_id": session_id}))
                 else:
@@ -39,7 +40,11 @@ async def websocket_endpoint(websocket: WebSocket, session_id: str):
                 if not user_text:
                     await websocket.send_text(json.dumps({"type": "error", "message": "Empty message"}))
                     continue
-                await websocket.send_text(json.dumps({"type": "response", "text": f"You said: {user_text}", "emotion": "neutral"}))
+                await websocket.send_text(json.dumps({
+                    "type": "response",
+                    "text": f"You said: {user_text}",
+                    "emotion": emotion_detector.detect_emotion(user_text).primary_emotion.value
+                }))
                 continue
 
             await websocket.send_text(json.dumps({"type": "error", "message": "Unsupported message"}))
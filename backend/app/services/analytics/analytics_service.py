@@ -4,13 +4,20 @@ Tracks usage metrics, session analytics, and provides dashboard data.
 """
 import json
 import os
+import time
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
-from dataclasses import dataclass, asdict
-from collections import defaultdict, Counter
+from typing import Dict, List, Any, Optional, Set
+from dataclasses import dataclass, asdict, field
+from collections import Counter, OrderedDict
 import asyncio
 
-@dataclass
+from .columnar_store import ColumnarMetricsStore
+from app.services.compact import SessionCounters, intern_code
+
+# Recently finished sessions kept in memory for detail lookups
+RECENT_SESSION_CACHE_SIZE = 1000
+
+@dataclass(slots=True)
 class SessionMetric:
     """Session analytics data structure."""
     session_id: str
@@ -25,6 +32,24 @@ class SessionMetric:
     features_used: List[str]
     endpoint_calls: Dict[str, int]
     errors: List[str]
+    
+    def __post_init__(self):
+        self.language = intern_code(self.language)
+
+@dataclass(slots=True)
+class ActiveSession:
+    """
+    A session still being tracked. Its hot counters (messages, tokens,
+    audio) live in AnalyticsService.counters at row `row`; the
+    collections are only created once something is recorded.
+    """
+    user_id: str
+    start_time: str
+    language: str
+    row: int
+    features_used: Optional[Set[str]] = None
+    endpoint_calls: Optional[Dict[str, int]] = None
+    errors: Optional[List[Dict[str, str]]] = None
 
 @dataclass
 class UsageMetric:
@@ -40,77 +65,122 @@ class UsageMetric:
     error_rate: float
     endpoint_usage: Dict[str, int]
 
+@dataclass
+class DailyAggregate:
+    """Running per-day totals, folded in one session at a time."""
+    date: str
+    total_sessions: int = 0
+    total_messages: int = 0
+    total_audio_minutes: float = 0.0
+    total_tokens: int = 0
+    total_duration_seconds: float = 0.0
+    total_errors: int = 0
+    total_requests: int = 0
+    users: Set[str] = field(default_factory=set)
+    feature_counts: Counter = field(default_factory=Counter)
+    endpoint_counts: Counter = field(default_factory=Counter)
+    
+    def add_session(self, session: SessionMetric):
+        """Fold a finished session into the running totals."""
+        self.total_sessions += 1
+        self.total_messages += session.message_count
+        self.total_audio_minutes += session.audio_minutes
+        self.total_tokens += session.tokens_used
+        self.total_duration_seconds += session.duration_seconds
+        self.total_errors += len(session.errors)
+        self.total_requests += sum(session.endpoint_calls.values())
+        self.users.add(session.user_id)
+        self.feature_counts.update(session.features_used)
+        self.endpoint_counts.update(session.endpoint_calls)
+    
+    def to_usage_metric(self) -> UsageMetric:
+        """Derive the reported daily metric from the running totals."""
+        return UsageMetric(
+            date=self.date,
+            total_sessions=self.total_sessions,
+            total_users=len(self.users),
+            total_messages=self.total_messages,
+            total_audio_minutes=self.total_audio_minutes,
+            total_tokens=self.total_tokens,
+            avg_session_duration=self.total_duration_seconds / max(self.total_sessions, 1),
+            top_features=[feature for feature, count in self.feature_counts.most_common(5)],
+            error_rate=(self.total_errors / max(self.total_requests, 1)) * 100,
+            endpoint_usage=dict(self.endpoint_counts)
+        )
+    
+    @classmethod
+    def from_totals(cls, date_str: str, totals: Dict[str, Any]) -> "DailyAggregate":
+        """Build a running aggregate from totals computed over a stored partition."""
+        return cls(
+            date=date_str,
+            total_sessions=totals["total_sessions"],
+            total_messages=totals["total_messages"],
+            total_audio_minutes=totals["total_audio_minutes"],
+            total_tokens=totals["total_tokens"],
+            total_duration_seconds=totals["total_duration_seconds"],
+            total_errors=totals["total_errors"],
+            total_requests=totals["total_requests"],
+            users=set(totals["users"]),
+            feature_counts=Counter(totals["feature_counts"]),
+            endpoint_counts=Counter(totals["endpoint_counts"])
+        )
+
 class AnalyticsService:
     """Manages analytics collection and reporting."""
     
-    def __init__(self, storage_path: str = "analytics"):
+    def __init__(self, storage_path: str = "analytics", checkpoint_interval: float = 60.0):
         self.storage_path = storage_path
-        self.sessions: Dict[str, SessionMetric] = {}
+        self.sessions: "OrderedDict[str, SessionMetric]" = OrderedDict()
         self.daily_metrics: Dict[str, UsageMetric] = {}
-        self.active_sessions: Dict[str, Dict] = {}
+        self.daily_aggregates: Dict[str, DailyAggregate] = {}
+        self.active_sessions: Dict[str, ActiveSession] = {}
+        self.counters = SessionCounters({"message_count": "q", "tokens_used": "q", "audio_seconds": "d"})
+        
+        # Finished sessions are buffered and flushed to the store at most once per interval
+        self.checkpoint_interval = checkpoint_interval
+        self._last_checkpoint = time.monotonic()
+        
         self._ensure_storage_directory()
-        self._load_existing_data()
+        self.store = ColumnarMetricsStore(os.path.join(self.storage_path, "segments"))
+        self._import_legacy_sessions()
     
     def _ensure_storage_directory(self):
         """Ensure analytics storage directory exists."""
         os.makedirs(self.storage_path, exist_ok=True)
         os.makedirs(os.path.join(self.storage_path, "sessions"), exist_ok=True)
-        os.makedirs(os.path.join(self.storage_path, "daily"), exist_ok=True)
     
-    def _load_existing_data(self):
-        """Load existing analytics data."""
+    def _import_legacy_sessions(self):
+        """
+        One-off import of per-session JSON files into the columnar store.
+        
+        Only runs while the store is still empty, so later startups never
+        read historical data.
+        """
+        sessions_dir = os.path.join(self.storage_path, "sessions")
+        if self.store.has_data() or not os.listdir(sessions_dir):
+            return
+        
         try:
-            # Load recent sessions (last 30 days)
-            sessions_dir = os.path.join(self.storage_path, "sessions")
-            if os.path.exists(sessions_dir):
-                cutoff_date = datetime.now() - timedelta(days=30)
-                
-                for filename in os.listdir(sessions_dir):
-                    if filename.endswith('.json'):
-                        file_path = os.path.join(sessions_dir, filename)
-                        file_date = datetime.fromtimestamp(os.path.getmtime(file_path))
-                        
-                        if file_date >= cutoff_date:
-                            with open(file_path, 'r') as f:
-                                session_data = json.load(f)
-                                session = SessionMetric(**session_data)
-                                self.sessions[session.session_id] = session
-            
-            # Load daily metrics (last 90 days)
-            daily_dir = os.path.join(self.storage_path, "daily")
-            if os.path.exists(daily_dir):
-                cutoff_date = datetime.now() - timedelta(days=90)
-                
-                for filename in os.listdir(daily_dir):
-                    if filename.endswith('.json'):
-                        date_str = filename.replace('.json', '')
-                        try:
-                            file_date = datetime.strptime(date_str, '%Y-%m-%d')
-                            if file_date >= cutoff_date:
-                                file_path = os.path.join(daily_dir, filename)
-                                with open(file_path, 'r') as f:
-                                    metric_data = json.load(f)
-                                    metric = UsageMetric(**metric_data)
-                                    self.daily_metrics[date_str] = metric
-                        except ValueError:
-                            continue
-                            
+            for filename in os.listdir(sessions_dir):
+                if filename.endswith('.json'):
+                    with open(os.path.join(sessions_dir, filename), 'r') as f:
+                        self._append_to_store(SessionMetric(**json.load(f)))
+            self.store.flush()
         except Exception as e:
-            print(f"Error loading analytics data: {e}")
+            print(f"Error importing analytics sessions: {e}")
     
     def start_session(self, session_id: str, user_id: str, language: str = "en"):
         """Start tracking a new session."""
-        self.active_sessions[session_id] = {
-            "user_id": user_id,
-            "start_time": datetime.now().isoformat(),
-            "language": language,
-            "message_count": 0,
-            "audio_minutes": 0.0,
-            "tokens_used": 0,
-            "features_used": set(),
-            "endpoint_calls": defaultdict(int),
-            "errors": []
-        }
+        previous = self.active_sessions.get(session_id)
+        if previous:
+            self.counters.release(previous.row)
+        
+        self.active_sessions[session_id] = ActiveSession(
+            user_id=user_id,
+            start_time=datetime.now().isoformat(),
+            language=intern_code(language),
+            row=self.counters.allocate()
+        )
     
     def end_session(self, session_id: str):
         """End session tracking and save metrics."""
@@ -118,28 +188,30 @@ class AnalyticsService:
             return
         
         session_data = self.active_sessions[session_id]
+        counters = self.counters.row(session_data.row)
         end_time = datetime.now()
-        start_time = datetime.fromisoformat(session_data["start_time"])
+        start_time = datetime.fromisoformat(session_data.start_time)
         duration = (end_time - start_time).total_seconds()
         
         # Create session metric
         session_metric = SessionMetric(
             session_id=session_id,
-            user_id=session_data["user_id"],
-            start_time=session_data["start_time"],
+            user_id=session_data.user_id,
+            start_time=session_data.start_time,
             end_time=end_time.isoformat(),
             duration_seconds=duration,
-            message_count=session_data["message_count"],
-            audio_minutes=session_data["audio_minutes"],
-            tokens_used=session_data["tokens_used"],
-            language=session_data["language"],
-            features_used=list(session_data["features_used"]),
-            endpoint_calls=dict(session_data["endpoint_calls"]),
-            errors=session_data["errors"]
+            message_count=counters["message_count"],
+            audio_minutes=counters["audio_seconds"] / 60,
+            tokens_used=counters["tokens_used"],
+            language=session_data.language,
+            features_used=list(session_data.features_used or ()),
+            endpoint_calls=dict(session_data.endpoint_calls or {}),
+            errors=session_data.errors or []
         )
         
-        self.sessions[session_id] = session_metric
+        self._remember_session(session_metric)
         del self.active_sessions[session_id]
+        self.counters.release(session_data.row)
         
         # Save session data
         self._save_session_data(session_metric)
@@ -149,33 +221,84 @@ class AnalyticsService:
     
     def track_message(self, session_id: str, tokens_used: int = 0):
         """Track a message in a session."""
-        if session_id in self.active_sessions:
-            self.active_sessions[session_id]["message_count"] += 1
-            self.active_sessions[session_id]["tokens_used"] += tokens_used
+        session = self.active_sessions.get(session_id)
+        if session:
+            self.counters.add(session.row, "message_count")
+            self.counters.add(session.row, "tokens_used", tokens_used)
     
     def track_audio(self, session_id: str, duration_seconds: float):
         """Track audio usage in a session."""
-        if session_id in self.active_sessions:
-            self.active_sessions[session_id]["audio_minutes"] += duration_seconds / 60
+        session = self.active_sessions.get(session_id)
+        if session:
+            self.counters.add(session.row, "audio_seconds", duration_seconds)
     
     def track_feature_usage(self, session_id: str, feature: str):
         """Track feature usage in a session."""
-        if session_id in self.active_sessions:
-            self.active_sessions[session_id]["features_used"].add(feature)
+        session = self.active_sessions.get(session_id)
+        if session:
+            if session.features_used is None:
+                session.features_used = set()
+            session.features_used.add(intern_code(feature))
     
     def track_endpoint_call(self, session_id: str, endpoint: str):
         """Track API endpoint usage."""
-        if session_id in self.active_sessions:
-            self.active_sessions[session_id]["endpoint_calls"][endpoint] += 1
+        session = self.active_sessions.get(session_id)
+        if session:
+            if session.endpoint_calls is None:
+                session.endpoint_calls = {}
+            endpoint = intern_code(endpoint)
+            session.endpoint_calls[endpoint] = session.endpoint_calls.get(endpoint, 0) + 1
     
     def track_error(self, session_id: str, error: str):
         """Track an error in a session."""
-        if session_id in self.active_sessions:
-            self.active_sessions[session_id]["errors"].append({
+        session = self.active_sessions.get(session_id)
+        if session:
+            if session.errors is None:
+                session.errors = []
+            session.errors.append({
                 "error": error,
                 "timestamp": datetime.now().isoformat()
             })
     
+    def get_active_sessions(self) -> List[Dict[str, Any]]:
+        """Live view of sessions still being tracked."""
+        sessions = []
+        for session_id, session in self.active_sessions.items():
+            counters = self.counters.row(session.row)
+            sessions.append({
+                "session_id": session_id,
+                "user_id": session.user_id,
+                "start_time": session.start_time,
+                "language": session.language,
+                "message_count": counters["message_count"],
+                "audio_minutes": round(counters["audio_seconds"] / 60, 2),
+                "features_used": list(session.features_used or ())
+            })
+        return sessions
+    
+    def _remember_session(self, session: SessionMetric):
+        """Keep a finished session in the bounded recent-session cache."""
+        self.sessions[session.session_id] = session
+        self.sessions.move_to_end(session.session_id)
+        if len(self.sessions) > RECENT_SESSION_CACHE_SIZE:
+            self.sessions.popitem(last=False)
+    
+    def _append_to_store(self, session: SessionMetric):
+        """Buffer a finished session's metrics for the columnar store."""
+        self.store.append(
+            session_id=session.session_id,
+            user_id=session.user_id,
+            start_time=session.start_time,
+            duration_seconds=session.duration_seconds,
+            message_count=session.message_count,
+            audio_minutes=session.audio_minutes,
+            tokens_used=session.tokens_used,
+            language=session.language,
+            features_used=session.features_used,
+            endpoint_calls=session.endpoint_calls,
+            error_count=len(session.errors)
+        )
+    
     def _save_session_data(self, session: SessionMetric):
         """Save session data to file."""
         try:
@@ -190,92 +313,51 @@ class AnalyticsService:
             print(f"Error saving session data: {e}")
     
     def _update_daily_metrics(self, session: SessionMetric):
-        """Update daily aggregated metrics."""
+        """Append a finished session to the store and fold it into its day's aggregate."""
         try:
             date_str = session.start_time[:10]  # Extract date part
             
-            if date_str not in self.daily_metrics:
-                self.daily_metrics[date_str] = UsageMetric(
-                    date=date_str,
-                    total_sessions=0,
-                    total_users=0,
-                    total_messages=0,
-                    total_audio_minutes=0.0,
-                    total_tokens=0,
-                    avg_session_duration=0.0,
-                    top_features=[],
-                    error_rate=0.0,
-                    endpoint_usage={}
-                )
-            
-            metric = self.daily_metrics[date_str]
-            
-            # Update metrics
-            metric.total_sessions += 1
-            metric.total_messages += session.message_count
-            metric.total_audio_minutes += session.audio_minutes
-            metric.total_tokens += session.tokens_used
+            # Load the day before buffering the row so it is counted exactly once
+            aggregate = self._get_daily_aggregate(date_str)
+            if aggregate is None:
+                aggregate = DailyAggregate(date=date_str)
+                self.daily_aggregates[date_str] = aggregate
             
-            # Recalculate aggregated values for the day
-            self._recalculate_daily_metrics(date_str)
+            self._append_to_store(session)
+            aggregate.add_session(session)
+            self.daily_metrics[date_str] = aggregate.to_usage_metric()
             
-            # Save daily metrics
-            self._save_daily_metrics(metric)
+            if time.monotonic() - self._last_checkpoint >= self.checkpoint_interval:
+                self.checkpoint()
             
         except Exception as e:
             print(f"Error updating daily metrics: {e}")
     
-    def _recalculate_daily_metrics(self, date_str: str):
-        """Recalculate aggregated metrics for a specific date."""
-        # Get all sessions for this date
-        date_sessions = [
-            session for session in self.sessions.values()
-            if session.start_time.startswith(date_str)
-        ]
+    def _get_daily_aggregate(self, date_str: str) -> Optional[DailyAggregate]:
+        """Get a day's running aggregate, computing it from the store on first access."""
+        aggregate = self.daily_aggregates.get(date_str)
+        if aggregate is not None:
+            return aggregate
         
-        if not date_sessions:
-            return
-        
-        metric = self.daily_metrics[date_str]
-        
-        # Calculate unique users
-        unique_users = set(session.user_id for session in date_sessions)
-        metric.total_users = len(unique_users)
-        
-        # Calculate average session duration
-        total_duration = sum(session.duration_seconds for session in date_sessions)
-        metric.avg_session_duration = total_duration / len(date_sessions)
-        
-        # Calculate top features
-        feature_counter = Counter()
-        for session in date_sessions:
-            feature_counter.update(session.features_used)
-        metric.top_features = [feature for feature, count in feature_counter.most_common(5)]
-        
-        # Calculate error rate
-        total_errors = sum(len(session.errors) for session in date_sessions)
-        total_requests = sum(sum(session.endpoint_calls.values()) for session in date_sessions)
-        metric.error_rate = (total_errors / max(total_requests, 1)) * 100
+        totals = self.store.day_totals(date_str)
+        if totals is None:
+            return None
         
-        # Aggregate endpoint usage
-        endpoint_usage = defaultdict(int)
-        for session in date_sessions:
-            for endpoint, count in session.endpoint_calls.items():
-                endpoint_usage[endpoint] += count
-        metric.endpoint_usage = dict(endpoint_usage)
+        aggregate = DailyAggregate.from_totals(date_str, totals)
+        self.daily_aggregates[date_str] = aggregate
+        self.daily_metrics[date_str] = aggregate.to_usage_metric()
+        return aggregate
     
-    def _save_daily_metrics(self, metric: UsageMetric):
-        """Save daily metrics to file."""
-        try:
-            daily_dir = os.path.join(self.storage_path, "daily")
-            filename = f"{metric.date}.json"
-            filepath = os.path.join(daily_dir, filename)
-            
-            with open(filepath, 'w') as f:
-                json.dump(asdict(metric), f, indent=2)
-                
-        except Exception as e:
-            print(f"Error saving daily metrics: {e}")
+    def checkpoint(self):
+        """Flush buffered session metrics to the columnar store."""
+        self._last_checkpoint = time.monotonic()
+        self.store.flush()
+    
+    async def run_checkpoint_loop(self):
+        """Periodically checkpoint session metrics while the app is running."""
+        while True:
+            await asyncio.sleep(self.checkpoint_interval)
+            self.checkpoint()
     
     def get_dashboard_data(self, days: int = 30) -> Dict[str, Any]:
         """Get dashboard analytics data."""
@@ -285,12 +367,15 @@ class AnalyticsService:
             
             # Get metrics for the date range
             relevant_metrics = []
+            relevant_aggregates = []
             current_date = start_date
             
             while current_date <= end_date:
                 date_str = current_date.strftime('%Y-%m-%d')
-                if date_str in self.daily_metrics:
+                aggregate = self._get_daily_aggregate(date_str)
+                if aggregate is not None:
                     relevant_metrics.append(self.daily_metrics[date_str])
+                    relevant_aggregates.append(aggregate)
                 current_date += timedelta(days=1)
             
             if not relevant_metrics:
@@ -298,10 +383,7 @@ class AnalyticsService:
             
             # Calculate summary statistics
             total_sessions = sum(m.total_sessions for m in relevant_metrics)
-            total_users = len(set(
-                session.user_id for session in self.sessions.values()
-                if session.start_time >= start_date.isoformat()
-            ))
+            total_users = len(set().union(*(a.users for a in relevant_aggregates)))
             total_messages = sum(m.total_messages for m in relevant_metrics)
             total_audio_minutes = sum(m.total_audio_minutes for m in relevant_metrics)
             total_tokens = sum(m.total_tokens for m in relevant_metrics)
@@ -315,18 +397,15 @@ class AnalyticsService:
                 session_trend = 0.0
             
             # Top features and endpoints
-            all_features = []
-            all_endpoints = defaultdict(int)
+            feature_counter = Counter()
+            endpoint_counter = Counter()
             
-            for metric in relevant_metrics:
-                all_features.extend(metric.top_features)
-                for endpoint, count in metric.endpoint_usage.items():
-                    all_endpoints[endpoint] += count
+            for aggregate in relevant_aggregates:
+                feature_counter.update(aggregate.feature_counts)
+                endpoint_counter.update(aggregate.endpoint_counts)
             
-            feature_counter = Counter(all_features)
             top_features = [{"name": f, "count": c} for f, c in feature_counter.most_common(10)]
-            top_endpoints = [{"name": e, "calls": c} for e, c in 
-                           sorted(all_endpoints.items(), key=lambda x: x[1], reverse=True)[:10]]
+            top_endpoints = [{"name": e, "calls": c} for e, c in endpoint_counter.most_common(10)]
             
             # Calculate average error rate
             avg_error_rate = sum(m.error_rate for m in relevant_metrics) / len(relevant_metrics)
@@ -395,7 +474,7 @@ class AnalyticsService:
     
     def get_session_details(self, session_id: str) -> Optional[Dict[str, Any]]:
         """Get detailed information about a specific session."""
-        session = self.sessions.get(session_id)
+        session = self.sessions.get(session_id) or self._load_session_data(session_id)
         if not session:
             return None
         
@@ -414,33 +493,33 @@ class AnalyticsService:
             "errors": session.errors
         }
     
+    def _load_session_data(self, session_id: str) -> Optional[SessionMetric]:
+        """Load a finished session's details from file on demand."""
+        filepath = os.path.join(self.storage_path, "sessions", f"{session_id}.json")
+        if not os.path.exists(filepath):
+            return None
+        
+        try:
+            with open(filepath, 'r') as f:
+                return SessionMetric(**json.load(f))
+        except Exception as e:
+            print(f"Error loading session data: {e}")
+            return None
+    
     def get_user_analytics(self, user_id: str, days: int = 30) -> Dict[str, Any]:
         """Get analytics for a specific user."""
         end_date = datetime.now()
         start_date = end_date - timedelta(days=days)
         
-        # Get user sessions in date range
-        user_sessions = [
-            session for session in self.sessions.values()
-            if session.user_id == user_id and 
-            datetime.fromisoformat(session.start_time) >= start_date
-        ]
+        # Make buffered sessions visible to the store scan
+        self.checkpoint()
         
-        if not user_sessions:
-            return {"user_id": user_id, "sessions": [], "summary": {}}
+        user_data = self.store.user_summary(user_id, start_date.timestamp())
         
-        # Calculate user summary
-        total_sessions = len(user_sessions)
-        total_messages = sum(s.message_count for s in user_sessions)
-        total_audio = sum(s.audio_minutes for s in user_sessions)
-        total_tokens = sum(s.tokens_used for s in user_sessions)
-        avg_duration = sum(s.duration_seconds for s in user_sessions) / total_sessions
+        if not user_data:
+            return {"user_id": user_id, "sessions": [], "summary": {}}
         
-        # Feature usage
-        all_features = []
-        for session in user_sessions:
-            all_features.extend(session.features_used)
-        feature_usage = dict(Counter(all_features))
+        total_sessions = user_data["total_sessions"]
         
         return {
             "user_id": user_id,
@@ -450,21 +529,21 @@ class AnalyticsService:
             },
             "summary": {
                 "total_sessions": total_sessions,
-                "total_messages": total_messages,
-                "total_audio_minutes": round(total_audio, 2),
-                "total_tokens": total_tokens,
-                "avg_session_duration": round(avg_duration, 2),
-                "feature_usage": feature_usage
+                "total_messages": user_data["total_messages"],
+                "total_audio_minutes": round(user_data["total_audio_minutes"], 2),
+                "total_tokens": user_data["total_tokens"],
+                "avg_session_duration": round(user_data["total_duration_seconds"] / total_sessions, 2),
+                "feature_usage": user_data["feature_counts"]
             },
             "sessions": [
                 {
-                    "session_id": s.session_id,
-                    "start_time": s.start_time,
-                    "duration_seconds": s.duration_seconds,
-                    "message_count": s.message_count,
-                    "features_used": s.features_used
+                    "session_id": s["session_id"],
+                    "start_time": s["start_time"],
+                    "duration_seconds": s["duration_seconds"],
+                    "message_count": s["message_count"],
+                    "features_used": s["features_used"]
                 }
-                for s in sorted(user_sessions, key=lambda x: x.start_time, reverse=True)[:50]
+                for s in user_data["sessions"]
             ]
         }
 
@@ -0,0 +1,452 @@
+"""
+Columnar analytics storage for Phase 5A
+Appends session metrics to per-day column files and aggregates them with NumPy.
+"""
+import json
+import os
+import threading
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Tuple
+
+import numpy as np
+
+# Per-session columns: name -> dtype
+SESSION_COLUMNS = {
+    "start_ts": np.float64,
+    "duration": np.float64,
+    "messages": np.int32,
+    "audio_minutes": np.float64,
+    "tokens": np.int64,
+    "errors": np.int32,
+    "requests": np.int32,
+    "user": np.int32,
+    "language": np.int32,
+}
+
+# Per-session feature/endpoint events, one row per (session, name)
+EVENT_COLUMNS = {
+    "ev_row": np.int32,
+    "ev_kind": np.int8,
+    "ev_code": np.int32,
+    "ev_count": np.int32,
+}
+
+EVENT_FEATURE = 0
+EVENT_ENDPOINT = 1
+
+SESSION_IDS_FILE = "session_ids.txt"
+# Row, event and session ID lengths of the last complete flush
+COMMIT_FILE = "commit.json"
+
+class StringDictionary:
+    """Append-only string <-> integer code mapping backed by a text file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._codes: Optional[Dict[str, int]] = None
+        self._values: List[str] = []
+
+    def _load(self):
+        """Load the dictionary on first use."""
+        if self._codes is not None:
+            return
+
+        self._codes = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    value = line.rstrip("\n")
+                    self._codes[value] = len(self._values)
+                    self._values.append(value)
+
+    def encode(self, value: str) -> int:
+        """Get the code for a value, adding it if new."""
+        self._load()
+        code = self._codes.get(value)
+        if code is None:
+            code = len(self._values)
+            self._codes[value] = code
+            self._values.append(value)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(value.replace("\n", " ") + "\n")
+        return code
+
+    def lookup(self, value: str) -> Optional[int]:
+        """Get the code for a value without adding it."""
+        self._load()
+        return self._codes.get(value)
+
+    def decode(self, code: int) -> str:
+        """Get the value for a code."""
+        self._load()
+        return self._values[code]
+
+class UserSessionIndex:
+    """
+    Secondary index of user code -> session refs sorted by start time.
+
+    A user's entry is hydrated from the partitions on first lookup and
+    then kept current as new rows are flushed, so date-range queries
+    are a bisect instead of a column scan.
+    """
+
+    def __init__(self):
+        self._starts: Dict[int, List[float]] = {}
+        self._refs: Dict[int, List[Tuple[str, int]]] = {}
+
+    def is_loaded(self, user_code: int) -> bool:
+        """Whether the user's entry has been hydrated."""
+        return user_code in self._starts
+
+    def load(self, user_code: int, starts: List[float], refs: List[Tuple[str, int]]):
+        """Install a hydrated entry; starts must be sorted ascending."""
+        self._starts[user_code] = starts
+        self._refs[user_code] = refs
+
+    def insert(self, user_code: int, start_ts: float, ref: Tuple[str, int]):
+        """Add a (date, row) ref for a hydrated user, keeping start order."""
+        starts = self._starts.get(user_code)
+        if starts is None:
+            return
+
+        position = bisect_right(starts, start_ts)
+        starts.insert(position, start_ts)
+        self._refs[user_code].insert(position, ref)
+
+    def range(self, user_code: int, start_ts: float,
+              end_ts: float = float("inf")) -> List[Tuple[str, int]]:
+        """Refs for sessions starting in [start_ts, end_ts), oldest first."""
+        starts = self._starts.get(user_code, [])
+        low = bisect_left(starts, start_ts)
+        high = bisect_left(starts, end_ts)
+        return self._refs[user_code][low:high] if high > low else []
+
+class ColumnarMetricsStore:
+    """
+    Day-partitioned columnar store for finished session metrics.
+
+    Each day is a directory of raw little-endian column files. Rows are
+    buffered in memory and appended on flush; reads memory-map the
+    column files so historical data is never loaded up front.
+    """
+
+    def __init__(self, storage_path: str):
+        self.storage_path = storage_path
+        os.makedirs(storage_path, exist_ok=True)
+
+        self.users = StringDictionary(os.path.join(storage_path, "users.txt"))
+        self.languages = StringDictionary(os.path.join(storage_path, "languages.txt"))
+        self.features = StringDictionary(os.path.join(storage_path, "features.txt"))
+        self.endpoints = StringDictionary(os.path.join(storage_path, "endpoints.txt"))
+
+        self.user_index = UserSessionIndex()
+
+        self._lock = threading.Lock()
+        self._pending: Dict[str, List[Tuple[Dict[str, Any], List[Tuple[int, int, int]], str]]] = {}
+
+    def _partition_path(self, date_str: str) -> str:
+        """Directory holding a day's column files."""
+        return os.path.join(self.storage_path, date_str)
+
+    def has_data(self) -> bool:
+        """Whether any partition has been written."""
+        return any(
+            os.path.isdir(self._partition_path(name)) for name in os.listdir(self.storage_path)
+        )
+
+    def append(self,
+               session_id: str,
+               user_id: str,
+               start_time: str,
+               duration_seconds: float,
+               message_count: int,
+               audio_minutes: float,
+               tokens_used: int,
+               language: str,
+               features_used: List[str],
+               endpoint_calls: Dict[str, int],
+               error_count: int):
+        """Buffer one finished session for the next flush."""
+        row = {
+            "start_ts": datetime.fromisoformat(start_time).timestamp(),
+            "duration": duration_seconds,
+            "messages": message_count,
+            "audio_minutes": audio_minutes,
+            "tokens": tokens_used,
+            "errors": error_count,
+            "requests": sum(endpoint_calls.values()),
+            "user": self.users.encode(user_id),
+            "language": self.languages.encode(language),
+        }
+        events = [(EVENT_FEATURE, self.features.encode(feature), 1) for feature in features_used]
+        events.extend(
+            (EVENT_ENDPOINT, self.endpoints.encode(endpoint), count)
+            for endpoint, count in endpoint_calls.items()
+        )
+
+        with self._lock:
+            self._pending.setdefault(start_time[:10], []).append((row, events, session_id))
+
+    def flush(self):
+        """Append buffered rows to their day partitions."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        for date_str, rows in pending.items():
+            try:
+                self._write_rows(date_str, rows)
+            except Exception as e:
+                print(f"Error flushing analytics partition {date_str}: {e}")
+
+    def _write_rows(self, date_str: str, rows: List[Tuple[Dict[str, Any], List[Tuple[int, int, int]], str]]):
+        """Append rows to a partition's column files."""
+        partition = self._partition_path(date_str)
+        os.makedirs(partition, exist_ok=True)
+
+        base_row, base_event, base_ids = self._committed(partition)
+
+        # Drop any torn tail left by an interrupted flush, in every file,
+        # so all of them line up with the last commit record again
+        for columns, length in ((SESSION_COLUMNS, base_row), (EVENT_COLUMNS, base_event)):
+            for name, dtype in columns.items():
+                path = os.path.join(partition, name)
+                if os.path.exists(path):
+                    os.truncate(path, length * np.dtype(dtype).itemsize)
+        ids_path = os.path.join(partition, SESSION_IDS_FILE)
+        if os.path.exists(ids_path):
+            os.truncate(ids_path, base_ids)
+
+        for name, dtype in SESSION_COLUMNS.items():
+            values = np.array([row[name] for row, _, _ in rows], dtype=dtype)
+            with open(os.path.join(partition, name), 'ab') as f:
+                f.write(values.tobytes())
+
+        events = [
+            (base_row + offset, kind, code, count)
+            for offset, (_, row_events, _) in enumerate(rows)
+            for kind, code, count in row_events
+        ]
+        if events:
+            event_array = np.array(events, dtype=np.int64).T
+            for (name, dtype), values in zip(EVENT_COLUMNS.items(), event_array):
+                with open(os.path.join(partition, name), 'ab') as f:
+                    f.write(values.astype(dtype).tobytes())
+
+        ids = "".join(f"{session_id.replace(chr(10), ' ')}\n" for _, _, session_id in rows).encode("utf-8")
+        with open(ids_path, 'ab') as f:
+            f.write(ids)
+
+        # The flush only counts once the commit record names the new lengths
+        self._write_commit(partition, base_row + len(rows), base_event + len(events), base_ids + len(ids))
+
+        for offset, (row, _, _) in enumerate(rows):
+            self.user_index.insert(row["user"], row["start_ts"], (date_str, base_row + offset))
+
+    @staticmethod
+    def _committed(partition: str) -> Tuple[int, int, int]:
+        """
+        Committed (rows, events, session ID bytes) of a partition.
+
+        A partition without a commit record has nothing committed: its
+        first flush was interrupted before the record was written.
+        """
+        commit_path = os.path.join(partition, COMMIT_FILE)
+        if not os.path.exists(commit_path):
+            return 0, 0, 0
+
+        with open(commit_path, 'r', encoding='utf-8') as f:
+            commit = json.load(f)
+        return commit["rows"], commit["events"], commit["session_ids_bytes"]
+
+    @staticmethod
+    def _write_commit(partition: str, rows: int, events: int, ids_bytes: int):
+        """Atomically record a partition's committed lengths."""
+        commit_path = os.path.join(partition, COMMIT_FILE)
+        with open(commit_path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump({"rows": rows, "events": events, "session_ids_bytes": ids_bytes}, f)
+        os.replace(commit_path + ".tmp", commit_path)
+
+    def _read_columns(self, date_str: str, columns: Dict[str, Any]) -> Dict[str, np.ndarray]:
+        """Memory-map a partition's columns, exactly the committed length."""
+        partition = self._partition_path(date_str)
+        rows, events, _ = self._committed(partition)
+        length = events if set(columns) <= set(EVENT_COLUMNS) else rows
+
+        arrays = {}
+        for name, dtype in columns.items():
+            if length:
+                arrays[name] = np.memmap(os.path.join(partition, name), dtype=dtype, mode='r', shape=(length,))
+            else:
+                arrays[name] = np.empty(0, dtype=dtype)
+        return arrays
+
+    def _read_events(self, date_str: str, row_count: int) -> Dict[str, np.ndarray]:
+        """Memory-map a partition's event columns, dropping rows past row_count."""
+        events = self._read_columns(date_str, EVENT_COLUMNS)
+        valid = events["ev_row"] < row_count
+        return {name: values[valid] for name, values in events.items()}
+
+    def day_totals(self, date_str: str) -> Optional[Dict[str, Any]]:
+        """
+        Aggregate one day partition with vectorized column sums.
+
+        Args:
+            date_str: Partition date (YYYY-MM-DD)
+
+        Returns:
+            Running-total fields for the day, or None if the day has no data
+        """
+        if not os.path.isdir(self._partition_path(date_str)):
+            return None
+
+        cols = self._read_columns(date_str, SESSION_COLUMNS)
+        row_count = len(cols["start_ts"])
+        if row_count == 0:
+            return None
+
+        events = self._read_events(date_str, row_count)
+
+        return {
+            "total_sessions": row_count,
+            "total_messages": int(cols["messages"].sum()),
+            "total_audio_minutes": float(cols["audio_minutes"].sum()),
+            "total_tokens": int(cols["tokens"].sum()),
+            "total_duration_seconds": float(cols["duration"].sum()),
+            "total_errors": int(cols["errors"].sum()),
+            "total_requests": int(cols["requests"].sum()),
+            "users": {self.users.decode(int(code)) for code in np.unique(cols["user"])},
+            "feature_counts": self._count_events(events, EVENT_FEATURE, self.features),
+            "endpoint_counts": self._count_events(events, EVENT_ENDPOINT, self.endpoints),
+        }
+
+    def _count_events(self, events: Dict[str, np.ndarray], kind: int,
+                      dictionary: StringDictionary) -> Dict[str, int]:
+        """Sum event counts per name for one event kind."""
+        mask = events["ev_kind"] == kind
+        if not mask.any():
+            return {}
+
+        totals = np.bincount(events["ev_code"][mask], weights=events["ev_count"][mask])
+        codes = np.nonzero(totals)[0]
+        return {dictionary.decode(int(code)): int(totals[code]) for code in codes}
+
+    def _partition_dates(self) -> List[str]:
+        """Dates of all partitions, oldest first."""
+        return sorted(
+            name for name in os.listdir(self.storage_path)
+            if os.path.isdir(self._partition_path(name))
+        )
+
+    def _hydrate_user_index(self, user_code: int):
+        """Build a user's index entry with one vectorized pass over the partitions."""
+        starts = []
+        refs = []
+
+        for date_str in self._partition_dates():
+            cols = self._read_columns(date_str, {"start_ts": np.float64, "user": np.int32})
+            rows = np.nonzero(cols["user"] == user_code)[0]
+            starts.append(cols["start_ts"][rows])
+            refs.extend((date_str, int(row)) for row in rows)
+
+        all_starts = np.concatenate(starts) if starts else np.empty(0)
+        order = np.argsort(all_starts, kind="stable")
+        self.user_index.load(
+            user_code, all_starts[order].tolist(), [refs[i] for i in order.tolist()]
+        )
+
+    def user_summary(self, user_id: str, start_ts: float,
+                     session_limit: int = 50) -> Optional[Dict[str, Any]]:
+        """
+        Aggregate one user's sessions starting at or after start_ts.
+
+        The per-user index narrows the query to the user's rows by bisect;
+        totals and feature counts are then vectorized over those rows, and
+        only the latest session_limit rows are materialized as dicts.
+
+        Args:
+            user_id: User to select
+            start_ts: Only include sessions starting at or after this epoch time
+            session_limit: Number of most recent sessions to return
+
+        Returns:
+            Totals, feature counts and recent sessions, or None if the user has no sessions
+        """
+        user_code = self.users.lookup(user_id)
+        if user_code is None:
+            return None
+
+        if not self.user_index.is_loaded(user_code):
+            self._hydrate_user_index(user_code)
+
+        refs = self.user_index.range(user_code, start_ts)
+        if not refs:
+            return None
+
+        rows_by_date: Dict[str, List[int]] = {}
+        for date_str, row in refs:
+            rows_by_date.setdefault(date_str, []).append(row)
+        recent_refs = set(refs[-session_limit:])
+
+        totals = Counter()
+        feature_counts = Counter()
+        recent = []
+
+        for date_str, row_list in rows_by_date.items():
+            cols = self._read_columns(date_str, SESSION_COLUMNS)
+            rows = np.array(row_list, dtype=np.int64)
+
+            totals["messages"] += int(cols["messages"][rows].sum())
+            totals["audio_minutes"] += float(cols["audio_minutes"][rows].sum())
+            totals["tokens"] += int(cols["tokens"][rows].sum())
+            totals["duration"] += float(cols["duration"][rows].sum())
+
+            events = self._read_events(date_str, len(cols["start_ts"]))
+            event_mask = np.isin(events["ev_row"], rows) & (events["ev_kind"] == EVENT_FEATURE)
+            feature_counts.update(self._count_events(
+                {name: values[event_mask] for name, values in events.items()},
+                EVENT_FEATURE, self.features
+            ))
+
+            keep = np.array([row for row in row_list if (date_str, row) in recent_refs], dtype=np.int64)
+            if len(keep):
+                recent.extend(self._materialize_rows(date_str, cols, keep, events))
+
+        recent.sort(key=lambda session: session["start_time"], reverse=True)
+
+        return {
+            "total_sessions": len(refs),
+            "total_messages": totals["messages"],
+            "total_audio_minutes": totals["audio_minutes"],
+            "total_tokens": totals["tokens"],
+            "total_duration_seconds": totals["duration"],
+            "feature_counts": dict(feature_counts),
+            "sessions": recent,
+        }
+
+    def _materialize_rows(self, date_str: str, cols: Dict[str, np.ndarray], rows: np.ndarray,
+                          events: Optional[Dict[str, np.ndarray]] = None) -> List[Dict[str, Any]]:
+        """Build session dicts for selected rows of a partition (reusing its events if already read)."""
+        with open(os.path.join(self._partition_path(date_str), SESSION_IDS_FILE), 'r', encoding='utf-8') as f:
+            session_ids = f.read().split("\n")
+
+        if events is None:
+            events = self._read_events(date_str, len(cols["start_ts"]))
+        event_mask = np.isin(events["ev_row"], rows) & (events["ev_kind"] == EVENT_FEATURE)
+        features_by_row: Dict[int, List[str]] = {}
+        for row, code in zip(events["ev_row"][event_mask], events["ev_code"][event_mask]):
+            features_by_row.setdefault(int(row), []).append(self.features.decode(int(code)))
+
+        return [
+            {
+                "session_id": session_ids[row] if row < len(session_ids) else "",
+                "start_time": datetime.fromtimestamp(float(cols["start_ts"][row])).isoformat(),
+                "duration_seconds": float(cols["duration"][row]),
+                "message_count": int(cols["messages"][row]),
+                "audio_minutes": float(cols["audio_minutes"][row]),
+                "tokens_used": int(cols["tokens"][row]),
+                "features_used": features_by_row.get(row, []),
+            }
+            for row in rows.tolist()
+        ]
@@ -0,0 +1,136 @@
+"""
+Batch text analysis for Phase 4
+Speaker identification and emotion detection for large batches of texts,
+streamed back as NDJSON.
+"""
+import asyncio
+import json
+import os
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import AsyncIterator, List, Optional
+
+from modules.emotion.emotion_service import emotion_detector
+from modules.speaker_id.speaker_service import speaker_identifier
+from app.services.conversation_logger import conversation_logger
+
+def analyze_text_chunk(texts: List[str]) -> List[tuple]:
+    """
+    Stateless analysis of one chunk; runs in the worker pool.
+
+    Returns:
+        ((signature, speaker_confidence), EmotionResult) per text
+    """
+    emotions = emotion_detector.detect_emotions(texts)
+    return [(speaker_identifier.text_signature(text), emotion) for text, emotion in zip(texts, emotions)]
+
+class TextBatchAnalyzer:
+    """
+    Analyzes batches of texts on a worker pool and streams NDJSON results.
+
+    Texts are split into chunks; emotion detection and text signatures
+    (both pure functions of the text) run in the pool with a bounded
+    number of chunks in flight. Signatures are resolved to speakers in
+    this process, in input order, because speaker state lives here. Log
+    entries for the whole batch are written with one bulk append.
+    """
+
+    def __init__(self, chunk_size: int = 500, use_processes: bool = True, max_workers: int = 2):
+        self.chunk_size = chunk_size
+        self.use_processes = use_processes
+        self.max_workers = max_workers
+        self._executor: Optional[Executor] = None
+
+    def _get_executor(self) -> Executor:
+        """Lazily create the analysis pool."""
+        if self._executor is None:
+            pool_class = ProcessPoolExecutor if self.use_processes else ThreadPoolExecutor
+            self._executor = pool_class(max_workers=self.max_workers)
+        return self._executor
+
+    async def stream(self, texts: List[str], session_id: Optional[str] = None) -> AsyncIterator[str]:
+        """
+        Analyze texts and yield NDJSON, one chunk of result lines at a time.
+
+        Each result line carries the input index, speaker and emotion; a
+        final line reports completion. When session_id is given, all
+        results are logged to the session once the batch is done.
+
+        Args:
+            texts: Texts to analyze
+            session_id: Optional session to log the results to
+
+        Returns:
+            Async iterator of NDJSON text chunks
+        """
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        starts = range(0, len(texts), self.chunk_size)
+        pending = deque()
+        next_chunk = 0
+        log_entries = []
+
+        try:
+            while pending or next_chunk < len(starts):
+                # Keep every worker busy while results are emitted in order
+                while next_chunk < len(starts) and len(pending) < 2 * self.max_workers:
+                    start = starts[next_chunk]
+                    chunk = texts[start:start + self.chunk_size]
+                    pending.append((start, loop.run_in_executor(executor, analyze_text_chunk, chunk)))
+                    next_chunk += 1
+
+                start, future = pending.popleft()
+                chunk_results = await future
+                speakers = speaker_identifier.identify_signatures([signature for signature, _ in chunk_results])
+
+                lines = []
+                for offset, ((speaker_id, speaker_confidence), (_, emotion)) in enumerate(zip(speakers, chunk_results)):
+                    index = start + offset
+                    speaker_info = speaker_identifier.get_speaker_info(speaker_id)
+                    speaker_label = speaker_info.label if speaker_info else "Unknown"
+
+                    lines.append(json.dumps({
+                        "index": index,
+                        "speaker": {
+                            "id": speaker_id,
+                            "label": speaker_label,
+                            "confidence": speaker_confidence
+                        },
+                        "emotion": {
+                            "primary": emotion.primary_emotion.value,
+                            "confidence": emotion.confidence,
+                            "all_scores": emotion.emotion_scores,
+                            "indicators": emotion.detected_indicators
+                        }
+                    }, ensure_ascii=False) + "\n")
+
+                    if session_id:
+                        log_entries.append({
+                            "speaker_id": speaker_id,
+                            "speaker_label": speaker_label,
+                            "original_text": texts[index],
+                            "emotion": emotion.primary_emotion.value,
+                            "emotion_confidence": emotion.confidence
+                        })
+
+                yield "".join(lines)
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+        if log_entries:
+            await asyncio.to_thread(conversation_logger.log_conversations, session_id, log_entries)
+
+        yield json.dumps({"status": "complete", "count": len(texts), "logged": len(log_entries)}) + "\n"
+
+    def shutdown(self):
+        """Stop the analysis pool."""
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+# Global batch analyzer instance
+text_batch_analyzer = TextBatchAnalyzer(
+    chunk_size=int(os.getenv("TEXT_BATCH_CHUNK_SIZE", "500")),
+    max_workers=int(os.getenv("TEXT_BATCH_PROCESSES", "2"))
+)
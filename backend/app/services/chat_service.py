@@ -1,17 +1,37 @@
 """
 Chat service for conversational AI using Groq Chat API.
 """
-from typing import List, Dict, Any
+import asyncio
+from typing import List, Dict, Any, Optional
 from app.services.groq_client import groq_client
+from app.services.context_window import context_window_manager
 from app.models.chat_models import ChatMessage
 
-async def generate_chat_response(model: str, messages: List[ChatMessage]) -> str:
+def _load_session_summary(session_id: str) -> Optional[str]:
+    """Stored rolling summary for a session, without regenerating it"""
+    from app.services.persistent_memory import persistent_memory_service, SessionLocal
+    
+    if not persistent_memory_service.db_service or SessionLocal is None:
+        return None
+    db = SessionLocal()
+    try:
+        checkpoint = persistent_memory_service.db_service.get_summary_checkpoint(db, session_id)
+        return checkpoint.get("summary") if checkpoint else None
+    finally:
+        db.close()
+
+async def generate_chat_response(model: str, messages: List[ChatMessage],
+                                 session_id: Optional[str] = None) -> str:
     """
     Generate AI response using Groq Chat Completions API.
     
+    The conversation is fitted to the model's context by the context
+    window manager: system prompt, rolling summary, then recent turns.
+    
     Args:
         model: Groq model name (e.g., "llama3-8b-8192")
         messages: List of chat messages with role and content
+        session_id: Conversation whose stored summary stands in for older turns
         
     Returns:
         str: Generated AI response text
@@ -22,13 +42,17 @@ async def generate_chat_response(model: str, messages: List[ChatMessage]) -> str
     # Convert Pydantic models to dict format for Groq API
     message_dicts = [{"role": msg.role, "content": msg.content} for msg in messages]
     
+    summary = await asyncio.to_thread(_load_session_summary, session_id) if session_id else None
+    prompt_messages, _ = context_window_manager.build(model, message_dicts, summary)
+    
     # Call Groq Chat Completions API
     response = groq_client.chat.completions.create(
         model=model,
-        messages=message_dicts,
+        messages=prompt_messages,
         temperature=0.7,
-        max_tokens=512
+        max_tokens=context_window_manager.completion_tokens
     )
+    context_window_manager.record_usage(getattr(response, "usage", None))
     
     # Extract the assistant's reply
     if hasattr(response, 'choices') and response.choices:
@@ -0,0 +1,65 @@
+"""
+Compact session state
+Helpers for keeping per-session state small when tens of thousands of
+sessions are live: interned low-cardinality strings and struct-of-arrays
+counter storage.
+"""
+import sys
+from array import array
+from typing import Dict, List, Optional
+
+def intern_code(value: Optional[str]) -> Optional[str]:
+    """
+    Intern a low-cardinality string such as a language code or emotion label.
+
+    Every session then shares one "en" object instead of holding its own
+    copy decoded from JSON or a request body.
+    """
+    return sys.intern(value) if isinstance(value, str) else value
+
+class SessionCounters:
+    """
+    Struct-of-arrays storage for hot per-session counters.
+
+    Each counter is one typed array ("q" for int64, "d" for float64) and
+    each session owns a row index into all of them, so a session costs a
+    few machine words of counter storage instead of a dict of boxed
+    Python numbers. Rows of ended sessions are reused.
+    """
+
+    def __init__(self, fields: Dict[str, str]):
+        """
+        Args:
+            fields: Counter name -> array typecode
+        """
+        self.columns: Dict[str, array] = {name: array(typecode) for name, typecode in fields.items()}
+        self._free_rows: List[int] = []
+
+    def allocate(self) -> int:
+        """Reserve a zeroed row and return its index."""
+        if self._free_rows:
+            row = self._free_rows.pop()
+            for column in self.columns.values():
+                column[row] = 0
+            return row
+
+        for column in self.columns.values():
+            column.append(0)
+        return len(next(iter(self.columns.values()))) - 1
+
+    def release(self, row: int):
+        """Return a row for reuse."""
+        self._free_rows.append(row)
+
+    def add(self, row: int, name: str, amount=1):
+        self.columns[name][row] += amount
+
+    def get(self, row: int, name: str):
+        return self.columns[name][row]
+
+    def row(self, row: int) -> Dict[str, float]:
+        """All counters of one row as a dict."""
+        return {name: column[row] for name, column in self.columns.items()}
+
+    def __len__(self) -> int:
+        return len(next(iter(self.columns.values()), ())) - len(self._free_rows)
@@ -0,0 +1,257 @@
+"""
+Chat context window management
+Builds chat prompts that fit the model's context: the client's system
+prompt, a rolling summary of older turns, then the most recent turns.
+"""
+import math
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+# Context sizes of the Groq chat models, in tokens
+MODEL_CONTEXT_WINDOWS = {
+    "llama-3.1-8b-instant": 131072,
+    "llama-3.3-70b-versatile": 131072,
+    "llama3-8b-8192": 8192,
+    "llama3-70b-8192": 8192,
+    "mixtral-8x7b-32768": 32768,
+    "gemma2-9b-it": 8192
+}
+DEFAULT_CONTEXT_WINDOW = 8192
+
+# Per-message overhead of the chat format (role markers, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+_TOKEN_PIECES = re.compile(r"\w+|[^\w\s]")
+_encoding = None
+_encoding_checked = False
+
+def count_tokens(text: str) -> int:
+    """
+    Count tokens locally.
+
+    Uses tiktoken's cl100k_base encoding when it is installed (close to
+    the Llama tokenizers for budgeting purposes); otherwise estimates from
+    words and punctuation, one token per four characters of each word.
+    """
+    global _encoding, _encoding_checked
+    if not _encoding_checked:
+        _encoding_checked = True
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoding = None
+
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return sum(math.ceil(len(piece) / 4) for piece in _TOKEN_PIECES.findall(text))
+
+def message_tokens(message: Dict[str, str]) -> int:
+    return count_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """The longest end of text that fits in max_tokens."""
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+
+    # Binary search on the number of trailing characters kept
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_tokens(text[len(text) - middle:]) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return text[len(text) - low:]
+
+class ContextWindowManager:
+    """
+    Chooses which messages to send for a chat request.
+
+    The prompt is laid out as [client system messages] + [summary of
+    older turns] + [recent turns]. Older turns are dropped in blocks of
+    `step` turns rather than one at a time, so the leading messages stay
+    byte-identical for several requests in a row and the provider's
+    prompt cache keeps hitting. The summary comes from the session's
+    stored rolling summary when a session ID is given, otherwise from a
+    local extractive summary of the dropped turns.
+    """
+
+    def __init__(self,
+                 max_recent_turns: int = 12,
+                 step: int = 4,
+                 budget_tokens: Optional[int] = None,
+                 completion_tokens: int = 512,
+                 summary_max_tokens: int = 600,
+                 summary_cache_size: int = 1024):
+        """
+        Args:
+            max_recent_turns: Most non-system messages sent verbatim
+            step: Turns dropped at a time when the window slides
+            budget_tokens: Prompt budget; defaults to the model's context window
+            completion_tokens: Tokens kept free for the reply
+            summary_max_tokens: Cap on the summary message
+            summary_cache_size: Folded blocks remembered for local summaries
+        """
+        self.max_recent_turns = max_recent_turns
+        self.step = max(1, min(step, max_recent_turns))
+        self.budget_tokens = budget_tokens
+        self.completion_tokens = completion_tokens
+        self.summary_max_tokens = summary_max_tokens
+        self.summary_cache_size = summary_cache_size
+        self._summary_cache: "OrderedDict[int, str]" = OrderedDict()
+        self.stats = {"requests": 0, "trimmed": 0, "prompt_tokens": 0, "client_tokens": 0,
+                      "reported_prompt_tokens": 0, "cached_tokens": 0}
+        self._lock = threading.Lock()
+
+    def budget_for(self, model: str) -> int:
+        window = MODEL_CONTEXT_WINDOWS.get(model, DEFAULT_CONTEXT_WINDOW)
+        budget = min(self.budget_tokens, window) if self.budget_tokens else window
+        return max(256, budget - self.completion_tokens)
+
+    def build(self,
+              model: str,
+              messages: List[Dict[str, str]],
+              summary: Optional[str] = None) -> Tuple[List[Dict[str, str]], Dict[str, Any]]:
+        """
+        Fit a conversation into the model's prompt budget.
+
+        Args:
+            model: Chat model name
+            messages: Full conversation as role/content dicts
+            summary: Stored rolling summary of the conversation, if any
+
+        Returns:
+            (messages to send, stats with token counts and what was dropped)
+        """
+        system = [m for m in messages if m["role"] == "system"]
+        turns = [m for m in messages if m["role"] != "system"]
+        budget = self.budget_for(model)
+
+        # Slide the window in whole steps so the prefix changes rarely
+        start = 0
+        if len(turns) > self.max_recent_turns:
+            start = math.ceil((len(turns) - self.max_recent_turns) / self.step) * self.step
+
+        fixed_tokens = sum(message_tokens(m) for m in system)
+        turn_tokens = [message_tokens(m) for m in turns]
+
+        while True:
+            summary_message = self._summary_message(summary, turns[:start])
+            used = fixed_tokens + sum(turn_tokens[start:])
+            if summary_message:
+                used += message_tokens(summary_message)
+            if used <= budget or start >= len(turns) - 1:
+                break
+            start = min(start + self.step, len(turns) - 1)
+
+        recent = turns[start:]
+        if recent and used > budget:
+            # Only the latest message is left and it doesn't fit: it takes
+            # priority over the summary, then its end is kept
+            last = recent[-1]
+            room = budget - fixed_tokens - MESSAGE_OVERHEAD_TOKENS
+            if summary_message and room - message_tokens(summary_message) < count_tokens(last["content"]):
+                summary_message = None
+            elif summary_message:
+                room -= message_tokens(summary_message)
+            recent = [{"role": last["role"], "content": truncate_tokens(last["content"], room)}]
+            used = fixed_tokens + message_tokens(recent[0])
+            if summary_message:
+                used += message_tokens(summary_message)
+
+        prompt = system + ([summary_message] if summary_message else []) + recent
+        client_tokens = fixed_tokens + sum(turn_tokens)
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["trimmed"] += 1 if start else 0
+            self.stats["prompt_tokens"] += used
+            self.stats["client_tokens"] += client_tokens
+
+        return prompt, {
+            "prompt_tokens": used,
+            "client_tokens": client_tokens,
+            "budget": budget,
+            "dropped_turns": start,
+            "summarized": summary_message is not None
+        }
+
+    def _summary_message(self, summary: Optional[str], dropped: List[Dict[str, str]]) -> Optional[Dict[str, str]]:
+        """System message standing in for the dropped turns (None if nothing was dropped)."""
+        if not dropped:
+            return None
+
+        if not summary:
+            summary = self._local_summary(dropped)
+
+        # Keep the most recent lines, cut at a line boundary so the same
+        # summary always yields the same text; a single long line is cut by tokens
+        lines = summary.splitlines()
+        while len(lines) > 1 and count_tokens("\n".join(lines)) > self.summary_max_tokens:
+            lines.pop(0)
+        text = truncate_tokens("\n".join(lines), self.summary_max_tokens)
+        if not text:
+            return None
+        return {"role": "system", "content": SUMMARY_PREFIX + text}
+
+    def _local_summary(self, dropped: List[Dict[str, str]]) -> str:
+        """
+        Extractive summary of dropped turns, folded one step-sized block at a time.
+
+        Each block's result is cached under the previous summary and the
+        block's content, so a growing conversation only folds its newly
+        dropped block.
+        """
+        from app.services.persistent_memory import persistent_memory_service
+
+        summary = None
+        for index in range(0, len(dropped), self.step):
+            block = dropped[index:index + self.step]
+            key = hash((summary, tuple((m["role"], m["content"]) for m in block)))
+            with self._lock:
+                cached = self._summary_cache.get(key)
+                if cached is not None:
+                    self._summary_cache.move_to_end(key)
+            if cached is None:
+                cached = persistent_memory_service.summarize_locally(
+                    [{"speaker_id": m["role"], "content": m["content"]} for m in block], summary,
+                    sentences=max(1, self.step // 2)
+                )
+                with self._lock:
+                    self._summary_cache[key] = cached
+                    while len(self._summary_cache) > self.summary_cache_size:
+                        self._summary_cache.popitem(last=False)
+            summary = cached
+        return summary or ""
+
+    def record_usage(self, usage: Any):
+        """Add the provider's reported prompt and cached token counts."""
+        if usage is None:
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        with self._lock:
+            self.stats["reported_prompt_tokens"] += getattr(usage, "prompt_tokens", 0) or 0
+            self.stats["cached_tokens"] += (getattr(details, "cached_tokens", 0) or 0) if details else 0
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+        stats["tokens_saved"] = stats["client_tokens"] - stats["prompt_tokens"]
+        stats["tokenizer"] = "tiktoken" if _encoding is not None else "estimate"
+        return stats
+
+# Global context window manager
+context_window_manager = ContextWindowManager(
+    max_recent_turns=int(os.getenv("CHAT_CONTEXT_TURNS", "12")),
+    step=int(os.getenv("CHAT_CONTEXT_STEP", "4")),
+    budget_tokens=int(os.getenv("CHAT_CONTEXT_BUDGET", "0")) or None,
+    completion_tokens=int(os.getenv("CHAT_MAX_TOKENS", "512")),
+    summary_max_tokens=int(os.getenv("CHAT_SUMMARY_MAX_TOKENS", "600"))
+)
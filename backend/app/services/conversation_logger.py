@@ -4,11 +4,17 @@ Manages session-based conversation storage and retrieval.
 """
 import json
 import os
+import zlib
 from datetime import datetime
-from typing import Dict, List, Optional
-from dataclasses import dataclass, asdict
+from typing import Dict, Iterable, Iterator, List, Optional, Set
+from dataclasses import dataclass, asdict, fields
+from app.services.compact import intern_code
+from app.services.session_catalog import SessionCatalog
 
-@dataclass
+# Number of CSV rows per streamed export chunk
+EXPORT_BATCH_SIZE = 100
+
+@dataclass(slots=True)
 class ConversationEntry:
     """Single conversation entry."""
     timestamp: str
@@ -22,6 +28,11 @@ class ConversationEntry:
     emotion: str
     emotion_confidence: float
     audio_file_path: Optional[str] = None
+    
+    def __post_init__(self):
+        self.source_language = intern_code(self.source_language)
+        self.target_language = intern_code(self.target_language)
+        self.emotion = intern_code(self.emotion)
 
 @dataclass
 class ConversationSession:
@@ -44,12 +55,26 @@ class ConversationLogger:
         self.logs_dir = logs_directory
         self._ensure_logs_directory()
         self.active_sessions: Dict[str, ConversationSession] = {}
+        # Speakers seen per active session, so logging doesn't rescan entries
+        self._participants: Dict[str, Set[str]] = {}
+        self.catalog = self._open_catalog()
     
     def _ensure_logs_directory(self):
         """Ensure logs directory exists."""
         if not os.path.exists(self.logs_dir):
             os.makedirs(self.logs_dir)
     
+    def _open_catalog(self) -> SessionCatalog:
+        """Open the session catalog, backfilling it from existing logs on first use."""
+        catalog_path = os.path.join(self.logs_dir, "catalog.db")
+        is_new = not os.path.exists(catalog_path)
+        
+        catalog = SessionCatalog(catalog_path)
+        if is_new:
+            catalog.rebuild_from_logs(self.logs_dir)
+        
+        return catalog
+    
     def start_session(self, 
                      session_id: str, 
                      source_language: str = "auto", 
@@ -77,6 +102,8 @@ class ConversationLogger:
         )
         
         self.active_sessions[session_id] = session
+        self._participants[session_id] = set()
+        self._catalog_session(session)
         return session
     
     def log_conversation(self,
@@ -104,35 +131,71 @@ class ConversationLogger:
         Returns:
             True if logged successfully, False otherwise
         """
+        return self.log_conversations(session_id, [{
+            "speaker_id": speaker_id,
+            "speaker_label": speaker_label,
+            "original_text": original_text,
+            "emotion": emotion,
+            "emotion_confidence": emotion_confidence,
+            "translated_text": translated_text,
+            "audio_file_path": audio_file_path
+        }])
+    
+    def log_conversations(self, session_id: str, entries: List[Dict]) -> bool:
+        """
+        Log several conversation entries with a single append.
+        
+        The entries are written to the NDJSON file in one write, and the
+        session metadata and catalog row are refreshed once for the batch.
+        
+        Args:
+            session_id: Session identifier
+            entries: Dicts with the log_conversation fields (speaker_id,
+                speaker_label, original_text, emotion, emotion_confidence and
+                optionally translated_text and audio_file_path)
+            
+        Returns:
+            True if logged successfully, False otherwise
+        """
+        if not entries:
+            return True
+        
         if session_id not in self.active_sessions:
             # Try to load existing session or create new one
             session = self._load_or_create_session(session_id)
         else:
             session = self.active_sessions[session_id]
         
-        entry = ConversationEntry(
-            timestamp=datetime.now().isoformat(),
-            session_id=session_id,
-            speaker_id=speaker_id,
-            speaker_label=speaker_label,
-            original_text=original_text,
-            translated_text=translated_text,
-            source_language=session.source_language,
-            target_language=session.target_language,
-            emotion=emotion,
-            emotion_confidence=emotion_confidence,
-            audio_file_path=audio_file_path
-        )
+        timestamp = datetime.now().isoformat()
+        new_entries = [
+            ConversationEntry(
+                timestamp=timestamp,
+                session_id=session_id,
+                speaker_id=entry["speaker_id"],
+                speaker_label=entry["speaker_label"],
+                original_text=entry["original_text"],
+                translated_text=entry.get("translated_text"),
+                source_language=session.source_language,
+                target_language=session.target_language,
+                emotion=entry["emotion"],
+                emotion_confidence=entry["emotion_confidence"],
+                audio_file_path=entry.get("audio_file_path")
+            )
+            for entry in entries
+        ]
         
-        session.entries.append(entry)
-        session.total_entries += 1
+        session.entries.extend(new_entries)
+        session.total_entries += len(new_entries)
         
         # Update participant count if new speaker
-        existing_speakers = {e.speaker_id for e in session.entries}
-        session.participant_count = len(existing_speakers)
+        speakers = self._participants.setdefault(session_id, set())
+        speakers.update(entry.speaker_id for entry in new_entries)
+        session.participant_count = len(speakers)
         
-        # Save to file immediately for persistence
+        # Append the entries and refresh metadata immediately for persistence
+        self._append_entries_to_file(session_id, new_entries)
         self._save_session_to_file(session)
+        self._catalog_session(session)
         
         return True
     
@@ -154,9 +217,11 @@ class ConversationLogger:
         
         # Final save
         self._save_session_to_file(session)
+        self._catalog_session(session)
         
         # Remove from active sessions
         del self.active_sessions[session_id]
+        self._participants.pop(session_id, None)
         
         return True
     
@@ -187,44 +252,110 @@ class ConversationLogger:
         Returns:
             List of session IDs, most recent first
         """
-        log_files = []
+        return [row["session_id"] for row in self.catalog.recent(limit)]
+    
+    def get_recent_session_summaries(self, limit: int = 10) -> List[Dict]:
+        """
+        Get metadata for recent sessions without loading session bodies.
         
-        for filename in os.listdir(self.logs_dir):
-            if filename.endswith('.json') and filename.startswith('session_'):
-                file_path = os.path.join(self.logs_dir, filename)
-                session_id = filename.replace('session_', '').replace('.json', '')
-                modified_time = os.path.getmtime(file_path)
-                log_files.append((session_id, modified_time))
+        Args:
+            limit: Maximum number of sessions to return
+            
+        Returns:
+            List of catalog rows, most recent first
+        """
+        return self.catalog.recent(limit)
+    
+    def get_sessions_by_language(self, language: str, limit: int = 10) -> List[Dict]:
+        """
+        Get metadata for recent sessions using a language as source or target.
         
-        # Sort by modification time, most recent first
-        log_files.sort(key=lambda x: x[1], reverse=True)
+        Args:
+            language: Language code
+            limit: Maximum number of sessions to return
+            
+        Returns:
+            List of catalog rows, most recent first
+        """
+        return self.catalog.by_language(language, limit)
+    
+    def get_sessions_by_participant_count(self,
+                                          min_participants: int = 0,
+                                          max_participants: Optional[int] = None,
+                                          limit: int = 10) -> List[Dict]:
+        """
+        Get metadata for recent sessions within a participant count range.
         
-        return [session_id for session_id, _ in log_files[:limit]]
+        Args:
+            min_participants: Minimum participant count (inclusive)
+            max_participants: Maximum participant count (inclusive), None for no limit
+            limit: Maximum number of sessions to return
+            
+        Returns:
+            List of catalog rows, most recent first
+        """
+        return self.catalog.by_participant_count(min_participants, max_participants, limit)
     
     def _load_or_create_session(self, session_id: str) -> ConversationSession:
         """Load existing session or create new one."""
         existing_session = self._load_session_from_file(session_id)
         if existing_session:
             self.active_sessions[session_id] = existing_session
+            self._participants[session_id] = {entry.speaker_id for entry in existing_session.entries}
             return existing_session
         
         return self.start_session(session_id)
     
+    def _catalog_session(self, session: ConversationSession):
+        """Update the catalog row for a session."""
+        try:
+            self.catalog.upsert_session(
+                session_id=session.session_id,
+                start_time=session.start_time,
+                end_time=session.end_time,
+                source_language=session.source_language,
+                target_language=session.target_language,
+                participant_count=session.participant_count,
+                total_entries=session.total_entries
+            )
+        except Exception as e:
+            print(f"Error cataloguing session {session.session_id}: {e}")
+    
+    def _session_file_path(self, session_id: str) -> str:
+        """Path of the session metadata JSON file."""
+        return os.path.join(self.logs_dir, f"session_{session_id}.json")
+    
+    def _entries_file_path(self, session_id: str) -> str:
+        """Path of the append-only NDJSON entries file for a session."""
+        return os.path.join(self.logs_dir, f"session_{session_id}.entries.jsonl")
+    
     def _save_session_to_file(self, session: ConversationSession):
-        """Save session to JSON file."""
-        filename = f"session_{session.session_id}.json"
-        file_path = os.path.join(self.logs_dir, filename)
+        """Save session metadata to JSON file (entries live in the NDJSON file)."""
+        file_path = self._session_file_path(session.session_id)
         
         try:
+            # Metadata fields only; copying the entries here would make every
+            # log call cost O(session length)
+            data = {field.name: getattr(session, field.name) for field in fields(session) if field.name != 'entries'}
+            data['entries'] = []
             with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(asdict(session), f, indent=2, ensure_ascii=False)
+                json.dump(data, f, indent=2, ensure_ascii=False)
         except Exception as e:
             print(f"Error saving session {session.session_id}: {e}")
     
+    def _append_entries_to_file(self, session_id: str, entries: List[ConversationEntry]):
+        """Append entries to the session's NDJSON entries file."""
+        try:
+            with open(self._entries_file_path(session_id), 'a', encoding='utf-8') as f:
+                f.writelines(
+                    json.dumps(asdict(entry), ensure_ascii=False) + "\n" for entry in entries
+                )
+        except Exception as e:
+            print(f"Error appending entries for session {session_id}: {e}")
+    
     def _load_session_from_file(self, session_id: str) -> Optional[ConversationSession]:
         """Load session from JSON file."""
-        filename = f"session_{session_id}.json"
-        file_path = os.path.join(self.logs_dir, filename)
+        file_path = self._session_file_path(session_id)
         
         if not os.path.exists(file_path):
             return None
@@ -232,64 +363,154 @@ class ConversationLogger:
         try:
             with open(file_path, 'r', encoding='utf-8') as f:
                 data = json.load(f)
-                
-            # Convert entries back to ConversationEntry objects
-            entries = [ConversationEntry(**entry) for entry in data['entries']]
-            data['entries'] = entries
+            
+            # Older logs keep entries inline; move them to the NDJSON file
+            # so new entries can be appended after them.
+            if data['entries'] and not os.path.exists(self._entries_file_path(session_id)):
+                self._append_entries_to_file(
+                    session_id, [ConversationEntry(**entry) for entry in data['entries']]
+                )
+            
+            data['entries'] = list(self._iter_stored_entries(session_id))
             
             return ConversationSession(**data)
         except Exception as e:
             print(f"Error loading session {session_id}: {e}")
             return None
     
+    def _iter_stored_entries(self, session_id: str) -> Iterator[ConversationEntry]:
+        """Lazily read entries from the session's NDJSON entries file."""
+        entries_path = self._entries_file_path(session_id)
+        
+        if os.path.exists(entries_path):
+            with open(entries_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        yield ConversationEntry(**json.loads(line))
+            return
+        
+        # Legacy session file with inline entries
+        file_path = self._session_file_path(session_id)
+        if os.path.exists(file_path):
+            with open(file_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            for entry in data.get('entries', []):
+                yield ConversationEntry(**entry)
+    
+    def iter_session_entries(self, session_id: str) -> Iterator[ConversationEntry]:
+        """
+        Iterate over a session's entries without materializing the session.
+        
+        Args:
+            session_id: Session identifier
+            
+        Returns:
+            Iterator of ConversationEntry objects in logged order
+        """
+        if session_id in self.active_sessions:
+            return iter(list(self.active_sessions[session_id].entries))
+        
+        return self._iter_stored_entries(session_id)
+    
+    def get_session_metadata(self, session_id: str) -> Optional[Dict]:
+        """
+        Get session metadata without loading entries.
+        
+        Args:
+            session_id: Session identifier
+            
+        Returns:
+            Metadata dict or None if not found
+        """
+        if session_id in self.active_sessions:
+            session = self.active_sessions[session_id]
+            return {
+                "session_id": session.session_id,
+                "start_time": session.start_time,
+                "end_time": session.end_time,
+                "source_language": session.source_language,
+                "target_language": session.target_language,
+                "participant_count": session.participant_count,
+                "total_entries": session.total_entries
+            }
+        
+        return self.catalog.get_session(session_id)
+    
     def export_session(self, session_id: str, format: str = "json") -> str:
         """
         Export session in specified format.
         
         Args:
             session_id: Session to export
-            format: Export format ("json", "txt", "csv")
+            format: Export format ("json", "ndjson", "txt", "csv")
             
         Returns:
             Exported content as string
         """
-        session = self.get_session_history(session_id)
-        if not session:
-            return ""
+        return "".join(self.stream_export(session_id, format))
+    
+    def stream_export(self,
+                      session_id: str,
+                      format: str = "json",
+                      compress: bool = False) -> Iterator:
+        """
+        Stream a session export chunk by chunk.
+        
+        Entries are read lazily from storage, so memory use does not grow
+        with session length.
+        
+        Args:
+            session_id: Session to export
+            format: Export format ("json", "ndjson", "txt", "csv")
+            compress: Gzip the stream on the fly (yields bytes)
+            
+        Returns:
+            Iterator of str chunks, or bytes chunks when compress is True
+        """
+        metadata = self.get_session_metadata(session_id)
+        if not metadata:
+            return iter(())
+        
+        entries = self.iter_session_entries(session_id)
         
         if format == "txt":
-            return self._export_as_text(session)
+            chunks = self._export_as_text(metadata, entries)
         elif format == "csv":
-            return self._export_as_csv(session)
+            chunks = self._export_as_csv(entries)
+        elif format == "ndjson":
+            chunks = self._export_as_ndjson(entries)
         else:  # default to json
-            return json.dumps(asdict(session), indent=2, ensure_ascii=False)
+            chunks = self._export_as_json(metadata, entries)
+        
+        if compress:
+            return self._gzip_chunks(chunks)
+        return chunks
     
-    def _export_as_text(self, session: ConversationSession) -> str:
+    def _export_as_text(self, metadata: Dict, entries: Iterable[ConversationEntry]) -> Iterator[str]:
         """Export session as readable text."""
-        lines = [
-            f"Conversation Session: {session.session_id}",
-            f"Started: {session.start_time}",
-            f"Languages: {session.source_language} → {session.target_language}",
-            f"Participants: {session.participant_count}",
-            f"Total Entries: {session.total_entries}",
+        yield "\n".join([
+            f"Conversation Session: {metadata['session_id']}",
+            f"Started: {metadata['start_time']}",
+            f"Languages: {metadata['source_language']} → {metadata['target_language']}",
+            f"Participants: {metadata['participant_count']}",
+            f"Total Entries: {metadata['total_entries']}",
             "=" * 50,
             ""
-        ]
+        ])
         
-        for entry in session.entries:
-            lines.extend([
+        for entry in entries:
+            lines = [
+                "",
                 f"[{entry.timestamp}] {entry.speaker_label}:",
                 f"  Original: {entry.original_text}",
                 f"  Emotion: {entry.emotion} ({entry.emotion_confidence:.2f})",
-                ""
-            ])
-            
+            ]
             if entry.translated_text:
-                lines.insert(-1, f"  Translation: {entry.translated_text}")
-        
-        return "\n".join(lines)
+                lines.append(f"  Translation: {entry.translated_text}")
+            lines.append("")
+            yield "\n".join(lines)
     
-    def _export_as_csv(self, session: ConversationSession) -> str:
+    def _export_as_csv(self, entries: Iterable[ConversationEntry]) -> Iterator[str]:
         """Export session as CSV."""
         import csv
         import io
@@ -303,8 +524,8 @@ class ConversationLogger:
             "translated_text", "emotion", "emotion_confidence"
         ])
         
-        # Data rows
-        for entry in session.entries:
+        # Data rows, flushed in batches to keep chunks reasonably sized
+        for index, entry in enumerate(entries, start=1):
             writer.writerow([
                 entry.timestamp,
                 entry.speaker_label,
@@ -313,8 +534,46 @@ class ConversationLogger:
                 entry.emotion,
                 entry.emotion_confidence
             ])
+            
+            if index % EXPORT_BATCH_SIZE == 0:
+                yield output.getvalue()
+                output.seek(0)
+                output.truncate(0)
+        
+        if output.tell():
+            yield output.getvalue()
+    
+    def _export_as_ndjson(self, entries: Iterable[ConversationEntry]) -> Iterator[str]:
+        """Export session entries as newline-delimited JSON."""
+        for entry in entries:
+            yield json.dumps(asdict(entry), ensure_ascii=False) + "\n"
+    
+    def _export_as_json(self, metadata: Dict, entries: Iterable[ConversationEntry]) -> Iterator[str]:
+        """Export session as a single JSON document, streaming the entries array."""
+        header = {key: metadata[key] for key in (
+            "session_id", "start_time", "end_time", "source_language",
+            "target_language", "participant_count", "total_entries"
+        )}
+        # Open the document and leave the entries array for streaming
+        yield json.dumps(header, ensure_ascii=False)[:-1] + ', "entries": ['
+        
+        separator = ""
+        for entry in entries:
+            yield separator + json.dumps(asdict(entry), ensure_ascii=False)
+            separator = ", "
+        
+        yield "]}"
+    
+    def _gzip_chunks(self, chunks: Iterable[str]) -> Iterator[bytes]:
+        """Gzip a stream of text chunks on the fly."""
+        compressor = zlib.compressobj(wbits=31)  # 31 = gzip container
+        
+        for chunk in chunks:
+            data = compressor.compress(chunk.encode('utf-8'))
+            if data:
+                yield data
         
-        return output.getvalue()
+        yield compressor.flush()
 
 # Global conversation logger instance
 conversation_logger = ConversationLogger("logs")
@@ -0,0 +1,277 @@
+"""
+Online Speaker Diarization - Phase 5B
+Splits a shared microphone stream into per-speaker segments in real time
+"""
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Any
+
+import numpy as np
+
+from modules.speaker_id.embeddings import SAMPLE_RATE, compute_embeddings
+
+@dataclass
+class DiarizedSegment:
+    """A stretch of audio attributed to one speaker"""
+    speaker_id: str
+    start_time: float
+    end_time: float
+    confidence: float
+    audio: np.ndarray = field(repr=False)
+
+    def to_pcm16(self) -> bytes:
+        """Segment audio as 16-bit little-endian PCM"""
+        return (np.clip(self.audio, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "speaker_id": self.speaker_id,
+            "start_time": round(self.start_time, 3),
+            "end_time": round(self.end_time, 3),
+            "duration": round(self.end_time - self.start_time, 3),
+            "confidence": round(self.confidence, 3)
+        }
+
+class OnlineDiarizer:
+    """
+    Incremental diarizer for one session's audio stream.
+
+    Audio is cut into overlapping windows; every window that becomes
+    available in a chunk is embedded in one batch. Windows are assigned
+    to the closest speaker centroid (cosine similarity), a new speaker is
+    opened when two consecutive windows match nothing and the speaker
+    limit allows, and centroids are updated as a running mean, so speaker
+    ids stay stable for the whole session. Consecutive hops with the same speaker are
+    merged into segments, which are emitted once the speaker changes, a
+    pause is detected, or the segment reaches max_segment_seconds, so a
+    long monologue is still delivered in pieces and the retained audio
+    stays bounded.
+    """
+
+    def __init__(self,
+                 max_speakers: int = 4,
+                 window_seconds: float = 1.5,
+                 hop_seconds: float = 0.75,
+                 similarity_threshold: float = 0.8,
+                 silence_rms: float = 0.01,
+                 min_segment_seconds: float = 0.5,
+                 max_segment_seconds: float = 15.0):
+        self.max_speakers = max_speakers
+        self.window = int(window_seconds * SAMPLE_RATE)
+        self.hop = int(hop_seconds * SAMPLE_RATE)
+        self.similarity_threshold = similarity_threshold
+        self.silence_rms = silence_rms
+        self.min_segment = int(min_segment_seconds * SAMPLE_RATE)
+        self.max_segment = max(int(max_segment_seconds * SAMPLE_RATE), self.hop)
+
+        self.speaker_ids: List[str] = []
+        self._centroid_sums = np.zeros((max_speakers, 0), dtype=np.float32)
+        self._centroids = np.zeros((max_speakers, 0), dtype=np.float32)
+
+        # Samples not yet dropped live in _storage[_head:_tail]; _buffer_start
+        # is the stream offset of _storage[_head]
+        self._storage = np.zeros(0, dtype=np.float32)
+        self._head = 0
+        self._tail = 0
+        self._buffer_start = 0
+        self._next_window = 0
+
+        # Open segment: speaker, start offset, end offset, similarity sum, hop count
+        self._current: Optional[List[Any]] = None
+        # Window that matched no speaker, waiting for the next one: (start, embedding)
+        self._pending: Optional[tuple] = None
+
+    def process_chunk(self, audio: np.ndarray) -> List[DiarizedSegment]:
+        """
+        Feed mono 16 kHz samples and return segments that were closed by them.
+
+        Args:
+            audio: Float samples in [-1, 1]
+
+        Returns:
+            Finished segments, in stream order
+        """
+        self._append(np.asarray(audio, dtype=np.float32))
+        stream_end = self._buffer_start + len(self._buffer)
+
+        starts = np.arange(self._next_window, stream_end - self.window + 1, self.hop)
+        if len(starts) == 0:
+            return []
+        self._next_window = int(starts[-1]) + self.hop
+
+        offsets = starts - self._buffer_start
+        windows = [self._buffer[offset:offset + self.window] for offset in offsets]
+        rms = np.sqrt(np.mean(np.square(np.stack(windows)), axis=1))
+        voiced = rms >= self.silence_rms
+
+        embeddings = compute_embeddings([w for w, v in zip(windows, voiced) if v])
+        segments = []
+        embedding_index = 0
+
+        for start, is_voiced in zip(starts, voiced):
+            start = int(start)
+            if not is_voiced:
+                segments.extend(self._resolve_pending())
+                segments.extend(self._close_segment())
+                continue
+
+            embedding = embeddings[embedding_index]
+            embedding_index += 1
+            segments.extend(self._process_window(start, embedding))
+
+        self._trim_buffer()
+        return segments
+
+    @property
+    def _buffer(self) -> np.ndarray:
+        """View of the retained samples."""
+        return self._storage[self._head:self._tail]
+
+    def _append(self, audio: np.ndarray):
+        """
+        Append samples without copying the retained audio on every chunk.
+
+        Storage is only compacted (and grown to twice the live size when
+        needed) once it runs out of room, so appends are amortized O(chunk).
+        """
+        if self._tail + len(audio) > len(self._storage):
+            live = self._tail - self._head
+            needed = live + len(audio)
+            if 2 * needed > len(self._storage):
+                storage = np.empty(2 * needed, dtype=np.float32)
+            else:
+                storage = self._storage
+            storage[:live] = self._storage[self._head:self._tail]
+            self._storage, self._head, self._tail = storage, 0, live
+
+        self._storage[self._tail:self._tail + len(audio)] = audio
+        self._tail += len(audio)
+
+    def flush(self) -> List[DiarizedSegment]:
+        """Close the open segment at the end of the stream."""
+        segments = self._resolve_pending()
+        if self._current:
+            # Extend through the tail that no later window will cover
+            self._current[2] = self._buffer_start + len(self._buffer)
+        return segments + self._close_segment()
+
+    def _process_window(self, start: int, embedding: np.ndarray) -> List[DiarizedSegment]:
+        """
+        Attribute a window's first hop to a speaker.
+
+        A window that matches no speaker is held back: windows straddling
+        a speaker change mix two voices, so a new speaker is only opened
+        when the next window agrees with it. Otherwise the held hop stays
+        with the current speaker.
+        """
+        best, similarity = self._match(embedding)
+        can_open = len(self.speaker_ids) < self.max_speakers
+
+        if similarity >= self.similarity_threshold or not can_open:
+            segments = self._resolve_pending()
+            self._update_centroid(best, embedding, similarity)
+            return segments + self._extend(self.speaker_ids[best], start, similarity)
+
+        if self._pending is None:
+            self._pending = (start, embedding)
+            return []
+
+        pending_start, pending_embedding = self._pending
+        if float(pending_embedding @ embedding) >= self.similarity_threshold:
+            self._pending = None
+            speaker = self._open_speaker(pending_embedding + embedding)
+            return self._extend(speaker, pending_start, 1.0) + self._extend(speaker, start, 1.0)
+
+        segments = self._resolve_pending()
+        self._pending = (start, embedding)
+        return segments
+
+    def _resolve_pending(self) -> List[DiarizedSegment]:
+        """Give a held-back hop to the current speaker (or its closest match)."""
+        if self._pending is None:
+            return []
+
+        start, embedding = self._pending
+        self._pending = None
+        if self._current:
+            position = self.speaker_ids.index(self._current[0])
+            return self._extend(self._current[0], start, float(self._centroids[position] @ embedding))
+
+        best, similarity = self._match(embedding)
+        if best < 0:
+            return self._extend(self._open_speaker(embedding), start, 1.0)
+        return self._extend(self.speaker_ids[best], start, similarity)
+
+    def _extend(self, speaker_id: str, start: int, similarity: float) -> List[DiarizedSegment]:
+        """Append one hop to the open segment, closing it on a speaker change or at max length."""
+        hop_end = start + self.hop
+        if self._current and self._current[0] == speaker_id and hop_end - self._current[1] <= self.max_segment:
+            self._current[2] = hop_end
+            self._current[3] += similarity
+            self._current[4] += 1
+            return []
+
+        segments = self._close_segment()
+        self._current = [speaker_id, start, hop_end, similarity, 1]
+        return segments
+
+    def _match(self, embedding: np.ndarray) -> tuple:
+        """Closest speaker index and cosine similarity (-1, 0.0 if none)."""
+        count = len(self.speaker_ids)
+        if not count:
+            return -1, 0.0
+
+        similarities = self._centroids[:count] @ embedding
+        best = int(similarities.argmax())
+        return best, float(similarities[best])
+
+    def _open_speaker(self, embedding: np.ndarray) -> str:
+        """Start a new speaker cluster."""
+        if self._centroids.shape[1] == 0:
+            self._centroid_sums = np.zeros((self.max_speakers, len(embedding)), dtype=np.float32)
+            self._centroids = np.zeros_like(self._centroid_sums)
+
+        position = len(self.speaker_ids)
+        self.speaker_ids.append(f"speaker_{position + 1}")
+        self._update_centroid(position, embedding, 1.0)
+        return self.speaker_ids[position]
+
+    def _update_centroid(self, position: int, embedding: np.ndarray, similarity: float):
+        """Fold a confidently matched embedding into a speaker's running mean."""
+        if similarity < self.similarity_threshold:
+            return
+
+        self._centroid_sums[position] += embedding
+        total = self._centroid_sums[position]
+        self._centroids[position] = total / max(float(np.linalg.norm(total)), 1e-9)
+
+    def _close_segment(self) -> List[DiarizedSegment]:
+        """Emit the open segment if it is long enough."""
+        if not self._current:
+            return []
+
+        speaker_id, start, end, similarity_sum, hops = self._current
+        self._current = None
+        if end - start < self.min_segment:
+            return []
+
+        audio = self._buffer[start - self._buffer_start:end - self._buffer_start].copy()
+        return [DiarizedSegment(
+            speaker_id=speaker_id,
+            start_time=start / SAMPLE_RATE,
+            end_time=end / SAMPLE_RATE,
+            confidence=similarity_sum / hops,
+            audio=audio
+        )]
+
+    def _trim_buffer(self):
+        """Drop samples that neither the open segment nor a future window needs."""
+        keep_from = self._next_window
+        if self._current:
+            keep_from = min(keep_from, self._current[1])
+        if self._pending:
+            keep_from = min(keep_from, self._pending[0])
+
+        drop = keep_from - self._buffer_start
+        if drop > 0:
+            self._head = min(self._head + drop, self._tail)
+            self._buffer_start = keep_from
@@ -0,0 +1,144 @@
+"""
+Expiry scheduler
+One min-heap of deadlines for every kind of idle state (streaming
+sessions, audio buffers, auth sessions, multiparty sessions, rooms),
+drained by a single background task.
+"""
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+ExpiryKey = Tuple[str, str]   # (kind, item_id)
+
+class ExpiryScheduler:
+    """
+    Deadline heap with lazy rescheduling.
+
+    Each tracked item has one live heap entry. touch() only records the
+    new deadline (O(1)), so activity on hot paths like audio chunks costs
+    no heap operation; when the old entry comes due and the item has been
+    touched since, it is pushed back with its current deadline. cancel()
+    just forgets the deadline and the entry is dropped when it surfaces.
+    Evicting k items therefore costs O(k log n) rather than a scan of
+    everything.
+
+    An expiry callback may return False to keep the item (for example a
+    room that still has live connections); it is then rescheduled for
+    another full TTL.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[float, int, ExpiryKey]] = []
+        self._deadlines: Dict[ExpiryKey, float] = {}
+        self._queued: Dict[ExpiryKey, Tuple[int, float]] = {}   # item -> (sequence, deadline) of its live entry
+        self._sequence = itertools.count()
+        self._kinds: Dict[str, Tuple[float, Callable[[str], Optional[bool]]]] = {}
+        self.evictions: Dict[str, int] = {}
+        self.kept: Dict[str, int] = {}
+        self.last_run: Dict[str, float] = {"evicted": 0, "duration_ms": 0.0}
+
+    def register(self, kind: str, ttl: float, on_expire: Callable[[str], Optional[bool]]):
+        """
+        Declare a kind of expiring item.
+
+        Args:
+            kind: Name used in touch()/cancel() and in the metrics
+            ttl: Seconds of inactivity before an item expires
+            on_expire: Called with the item ID; return False to keep it
+        """
+        self._kinds[kind] = (ttl, on_expire)
+        self.evictions.setdefault(kind, 0)
+        self.kept.setdefault(kind, 0)
+
+    def touch(self, kind: str, item_id: str, ttl: Optional[float] = None):
+        """Start tracking an item, or push its deadline back after activity."""
+        key = (kind, item_id)
+        deadline = time.monotonic() + (ttl if ttl is not None else self._kinds[kind][0])
+        self._deadlines[key] = deadline
+        queued = self._queued.get(key)
+        if queued is None or deadline < queued[1]:
+            self._push(key, deadline)
+
+    def cancel(self, kind: str, item_id: str):
+        """Stop tracking an item (it was removed by other means)."""
+        self._deadlines.pop((kind, item_id), None)
+
+    def _push(self, key: ExpiryKey, deadline: float):
+        sequence = next(self._sequence)
+        self._queued[key] = (sequence, deadline)
+        heapq.heappush(self._heap, (deadline, sequence, key))
+
+    def run_due(self) -> int:
+        """
+        Expire every item whose deadline has passed.
+
+        Returns:
+            Number of items evicted
+        """
+        started = time.perf_counter()
+        now = time.monotonic()
+        evicted = 0
+
+        while self._heap and self._heap[0][0] <= now:
+            _, sequence, key = heapq.heappop(self._heap)
+            if self._queued.get(key, (None,))[0] != sequence:
+                continue  # superseded entry
+            del self._queued[key]
+
+            deadline = self._deadlines.get(key)
+            if deadline is None:
+                continue  # cancelled
+            if deadline > now:
+                self._push(key, deadline)  # touched since it was queued
+                continue
+
+            del self._deadlines[key]
+            kind, item_id = key
+            try:
+                result = self._kinds[kind][1](item_id)
+            except Exception as e:
+                print(f"⚠️ Expiry of {kind} {item_id} failed: {e}")
+                continue
+
+            if result is False:
+                self.kept[kind] += 1
+                self.touch(kind, item_id)
+            else:
+                self.evictions[kind] += 1
+                evicted += 1
+
+        self.last_run = {"evicted": evicted, "duration_ms": round((time.perf_counter() - started) * 1000, 3)}
+        if evicted:
+            print(f"🧹 Expired {evicted} idle item(s)")
+        return evicted
+
+    def next_deadline(self) -> Optional[float]:
+        """Seconds until the earliest queued entry, or None if nothing is tracked."""
+        if not self._heap:
+            return None
+        return max(0.0, self._heap[0][0] - time.monotonic())
+
+    async def run(self, max_interval: float = 5.0):
+        """Background task: sleep until the next deadline (at most max_interval) and expire."""
+        while True:
+            delay = self.next_deadline()
+            await asyncio.sleep(max_interval if delay is None else min(max(delay, 0.05), max_interval))
+            self.run_due()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        tracked: Dict[str, int] = {kind: 0 for kind in self._kinds}
+        for kind, _ in self._deadlines:
+            tracked[kind] = tracked.get(kind, 0) + 1
+
+        return {
+            "tracked": tracked,
+            "evictions": dict(self.evictions),
+            "kept_alive": dict(self.kept),
+            "heap_size": len(self._heap),
+            "last_run": self.last_run
+        }
+
+# Global expiry scheduler
+expiry_scheduler = ExpiryScheduler()
@@ -0,0 +1,298 @@
+"""
+Provider Failover - Phase 5B
+Per-backend circuit breakers, health probing, automatic failover and
+hedged requests for the cloud/local ASR and TTS backends
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from enum import Enum
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+class BreakerState(Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+class CircuitBreaker:
+    """
+    Circuit breaker over a sliding window of recent calls.
+
+    The breaker opens when, over at least min_calls calls, the share of
+    failed calls or of calls slower than slow_call_seconds reaches its
+    threshold. After open_seconds it goes half-open and lets
+    half_open_calls trial requests through (or a health probe decides):
+    a success closes it, a failure opens it again.
+    """
+
+    def __init__(self,
+                 name: str,
+                 window_size: int = 20,
+                 min_calls: int = 5,
+                 failure_rate_threshold: float = 0.5,
+                 slow_call_seconds: float = 10.0,
+                 slow_call_rate_threshold: float = 0.8,
+                 open_seconds: float = 30.0,
+                 half_open_calls: int = 1):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+
+        self.state = BreakerState.CLOSED
+        self.opened_at = 0.0
+        self._outcomes: deque = deque(maxlen=window_size)    # (ok, slow)
+        self._latencies: deque = deque(maxlen=200)           # successful call durations
+        self._half_open_in_flight = 0
+        self._lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        """Whether a call may go to this backend now."""
+        with self._lock:
+            if self.state == BreakerState.OPEN:
+                if time.monotonic() - self.opened_at < self.open_seconds:
+                    return False
+                self._transition(BreakerState.HALF_OPEN)
+
+            if self.state == BreakerState.HALF_OPEN:
+                if self._half_open_in_flight >= self.half_open_calls:
+                    return False
+                self._half_open_in_flight += 1
+
+            return True
+
+    def record_success(self, duration: float):
+        with self._lock:
+            self._latencies.append(duration)
+            if self.state == BreakerState.HALF_OPEN:
+                self._half_open_in_flight = max(0, self._half_open_in_flight - 1)
+                self._transition(BreakerState.CLOSED)
+                return
+            self._outcomes.append((True, duration >= self.slow_call_seconds))
+            self._evaluate()
+
+    def record_failure(self, duration: float):
+        with self._lock:
+            if self.state == BreakerState.HALF_OPEN:
+                self._half_open_in_flight = max(0, self._half_open_in_flight - 1)
+                self._transition(BreakerState.OPEN)
+                return
+            self._outcomes.append((False, duration >= self.slow_call_seconds))
+            self._evaluate()
+
+    def record_probe(self, healthy: bool):
+        """Result of an out-of-band health probe while open."""
+        with self._lock:
+            if self.state == BreakerState.CLOSED:
+                return
+            if healthy:
+                # Let real traffic confirm recovery
+                self.opened_at = 0.0
+                self._transition(BreakerState.HALF_OPEN)
+            else:
+                self._transition(BreakerState.OPEN)
+
+    def latency_percentile(self, percentile: float, min_samples: int = 10) -> Optional[float]:
+        """Percentile of recent successful call durations, or None without enough data."""
+        with self._lock:
+            if len(self._latencies) < min_samples:
+                return None
+            return float(np.percentile(self._latencies, percentile))
+
+    def _evaluate(self):
+        """Open the breaker if the window breaches a threshold (lock held)."""
+        calls = len(self._outcomes)
+        if calls < self.min_calls:
+            return
+
+        failure_rate = sum(1 for ok, _ in self._outcomes if not ok) / calls
+        slow_rate = sum(1 for _, slow in self._outcomes if slow) / calls
+        if failure_rate >= self.failure_rate_threshold or slow_rate >= self.slow_call_rate_threshold:
+            self._transition(BreakerState.OPEN)
+
+    def _transition(self, state: BreakerState):
+        """Change state (lock held)."""
+        if state == self.state and state != BreakerState.OPEN:
+            return
+
+        if state == BreakerState.OPEN:
+            self.opened_at = time.monotonic()
+            self._half_open_in_flight = 0
+        elif state == BreakerState.CLOSED:
+            self._outcomes.clear()
+
+        if state != self.state:
+            icon = {"open": "🔴", "half_open": "🟡", "closed": "🟢"}[state.value]
+            print(f"{icon} Circuit {self.name}: {self.state.value} -> {state.value}")
+        self.state = state
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            calls = len(self._outcomes)
+            failures = sum(1 for ok, _ in self._outcomes if not ok)
+            latencies = list(self._latencies)
+
+        return {
+            "state": self.state.value,
+            "window_calls": calls,
+            "failure_rate": round(failures / calls, 3) if calls else 0.0,
+            "p95_latency": round(float(np.percentile(latencies, 95)), 3) if latencies else None,
+            "retry_in": round(max(0.0, self.open_seconds - (time.monotonic() - self.opened_at)), 1)
+            if self.state == BreakerState.OPEN else 0.0
+        }
+
+class FailoverRouter:
+    """
+    Routes calls for one service (ASR or TTS) across backends.
+
+    Backends are tried in preference order, skipping those whose breaker
+    is open. When hedging is on, the next healthy backend is started if
+    the first hasn't answered within its p95 latency budget, and the
+    first successful answer wins. A failed backend is followed by the
+    next one immediately. Calls are blocking; run them from a worker
+    thread.
+    """
+
+    def __init__(self,
+                 service: str,
+                 backends: Dict[str, Callable[..., Dict[str, Any]]],
+                 probes: Optional[Dict[str, Callable[[], bool]]] = None,
+                 hedging: bool = True,
+                 hedge_percentile: float = 95.0,
+                 default_hedge_delay: float = 3.0,
+                 max_workers: int = 8,
+                 **breaker_options):
+        self.service = service
+        self.backends = backends
+        self.probes = probes or {}
+        self.hedging = hedging
+        self.hedge_percentile = hedge_percentile
+        self.default_hedge_delay = default_hedge_delay
+        self.breakers = {
+            name: CircuitBreaker(f"{service}:{name}", **breaker_options) for name in backends
+        }
+        self.stats = {"calls": 0, "failovers": 0, "hedged": 0, "hedge_wins": 0, "failures": 0}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{service}-failover")
+
+    def hedge_delay(self, backend: str) -> float:
+        """How long to wait for a backend before hedging to the next one."""
+        budget = self.breakers[backend].latency_percentile(self.hedge_percentile)
+        return budget if budget is not None else self.default_hedge_delay
+
+    def call(self, preferred: List[str], *args, **kwargs) -> Dict[str, Any]:
+        """
+        Run the call on the best available backend.
+
+        Args:
+            preferred: Backend names in preference order
+            *args, **kwargs: Passed to the backend function
+
+        Returns:
+            The winning backend's result, with "backend", "failover" and
+            "hedged" fields added
+
+        Raises:
+            RuntimeError: If every backend failed or is unavailable
+        """
+        self.stats["calls"] += 1
+        order = [name for name in preferred if name in self.backends]
+        candidates = iter(order)
+        running: Dict[Future, str] = {}
+        errors: List[str] = []
+        hedged = False
+        can_hedge = self.hedging
+
+        def launch() -> bool:
+            for name in candidates:
+                if self.breakers[name].allow_request():
+                    running[self._executor.submit(self._timed, name, args, kwargs)] = name
+                    return True
+                errors.append(f"{name}: circuit open")
+            return False
+
+        if not launch():
+            self.stats["failures"] += 1
+            raise RuntimeError(f"No {self.service} backend available ({'; '.join(errors)})")
+
+        while running:
+            # Hedge only while the first backend is the sole one in flight
+            timeout = None
+            if can_hedge and len(running) == 1:
+                timeout = self.hedge_delay(next(iter(running.values())))
+
+            done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                can_hedge = False
+                if launch():
+                    hedged = True
+                    self.stats["hedged"] += 1
+                    print(f"⏱️ {self.service}: hedging to {list(running.values())[-1]}")
+                continue
+
+            for future in done:
+                name = running.pop(future)
+                ok, value = future.result()
+                if ok:
+                    winner_index = order.index(name)
+                    if winner_index > 0:
+                        self.stats["failovers"] += 1
+                        if hedged:
+                            self.stats["hedge_wins"] += 1
+                    # Any loser keeps running in the pool and still feeds its breaker
+                    return {**value, "backend": name, "failover": winner_index > 0, "hedged": hedged}
+
+                errors.append(f"{name}: {value}")
+                print(f"⚠️ {self.service} backend {name} failed: {value}")
+
+            if not running:
+                launch()
+
+        self.stats["failures"] += 1
+        raise RuntimeError(f"All {self.service} backends failed ({'; '.join(errors)})")
+
+    def _timed(self, name: str, args: tuple, kwargs: dict) -> tuple:
+        """Run one backend call and feed its breaker; returns (ok, result_or_error)."""
+        started = time.perf_counter()
+        try:
+            result = self.backends[name](*args, **kwargs)
+        except Exception as e:
+            self.breakers[name].record_failure(time.perf_counter() - started)
+            return False, str(e)
+
+        self.breakers[name].record_success(time.perf_counter() - started)
+        return True, result
+
+    def probe(self):
+        """Health-probe backends whose breaker is open and due for a retry."""
+        for name, breaker in self.breakers.items():
+            probe = self.probes.get(name)
+            if probe is None or breaker.state == BreakerState.CLOSED:
+                continue
+            if breaker.state == BreakerState.OPEN and time.monotonic() - breaker.opened_at < breaker.open_seconds:
+                continue
+
+            try:
+                healthy = bool(probe())
+            except Exception:
+                healthy = False
+            breaker.record_probe(healthy)
+
+    def is_available(self, backend: str) -> bool:
+        """Whether the backend's circuit currently lets traffic through."""
+        return self.breakers[backend].state != BreakerState.OPEN
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "hedging": self.hedging,
+            "backends": {
+                name: {**breaker.snapshot(), "hedge_delay": round(self.hedge_delay(name), 3)}
+                for name, breaker in self.breakers.items()
+            },
+            "stats": dict(self.stats)
+        }
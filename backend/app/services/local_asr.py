@@ -0,0 +1,256 @@
+"""
+Local ASR Backend - Phase 5B
+Offline speech recognition with a warm pool of CPU model instances
+"""
+import io
+import os
+import queue
+import threading
+import time
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+from modules.speaker_id.embeddings import SAMPLE_RATE, decode_utterance
+
+# Engines in order of preference and the module each needs; all optional
+ENGINE_MODULES = {
+    "faster_whisper": "faster_whisper",
+    "whispercpp": "pywhispercpp.model"
+}
+
+def available_engines() -> List[str]:
+    """Installed local ASR engines, in order of preference."""
+    found = []
+    for engine, module in ENGINE_MODULES.items():
+        try:
+            __import__(module)
+            found.append(engine)
+        except ImportError:
+            continue
+    return found
+
+def detect_engine() -> Optional[str]:
+    """Name of the first installed local ASR engine, or None."""
+    engines = available_engines()
+    return engines[0] if engines else None
+
+# Leading bytes of encoded audio formats: WAV, FLAC, Ogg, MP3 (ID3 tag or
+# frame sync), AAC (ADTS) and WebM/Matroska
+ENCODED_AUDIO_MAGIC = (b"RIFF", b"fLaC", b"OggS", b"ID3", b"\xff\xfb", b"\xff\xf3",
+                       b"\xff\xf1", b"\xff\xf9", b"\x1aE\xdf\xa3")
+
+def is_encoded_audio(audio_data: bytes) -> bool:
+    """Whether bytes look like an audio container rather than raw PCM."""
+    # MP4/M4A start with a box size, then "ftyp"
+    return audio_data.startswith(ENCODED_AUDIO_MAGIC) or audio_data[4:8] == b"ftyp"
+
+def pcm_to_samples(audio_data: bytes) -> Optional[np.ndarray]:
+    """
+    Turn request audio into mono 16 kHz float samples.
+
+    Raw 16 kHz 16-bit PCM (what the streaming and diarization paths send)
+    is converted directly and libsndfile formats are decoded.
+
+    Returns:
+        Samples, or None for a container libsndfile can't decode
+        (WebM/Opus, M4A, ...)
+    """
+    if not is_encoded_audio(audio_data):
+        pcm = np.frombuffer(audio_data[:len(audio_data) - len(audio_data) % 2], dtype="<i2")
+        return pcm.astype(np.float32) / 32768.0
+    return decode_utterance(audio_data)
+
+class LocalASRPool:
+    """
+    Pool of warm local speech models.
+
+    All instances are loaded once (at startup) and handed out through a
+    queue, so concurrent requests each get their own model and further
+    requests wait in line instead of loading or sharing one. Weights are
+    loaded int8-quantized where the engine supports it: faster-whisper
+    (CTranslate2) with compute_type="int8", whisper.cpp through a
+    quantized ggml model such as "base.en-q8_0".
+    """
+
+    def __init__(self,
+                 model_size: str = "base",
+                 pool_size: Optional[int] = None,
+                 compute_type: str = "int8",
+                 model_dir: Optional[str] = None,
+                 max_queue: int = 32,
+                 queue_timeout: float = 30.0):
+        cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+        self.model_size = model_size
+        self.pool_size = pool_size or cores
+        # Split the cores between instances so they don't oversubscribe the CPU
+        self.threads_per_instance = max(1, cores // self.pool_size)
+        self.compute_type = compute_type
+        self.model_dir = model_dir
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self.engine: Optional[str] = None
+        self.load_error: Optional[str] = None
+        self._instances: "queue.Queue" = queue.Queue()
+        self._loaded = 0
+        self._waiting = 0
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._loaded > 0
+
+    def load(self) -> bool:
+        """
+        Load every pool instance. Safe to call more than once.
+
+        Returns:
+            True if at least one instance is ready
+        """
+        with self._load_lock:
+            if self.is_loaded:
+                return True
+
+            self.engine = detect_engine()
+            if self.engine is None:
+                self.load_error = "No local ASR engine installed (pip install faster-whisper or pywhispercpp)"
+                print(f"⚠️ Local ASR unavailable: {self.load_error}")
+                return False
+
+            started = time.perf_counter()
+            try:
+                for _ in range(self.pool_size):
+                    self._instances.put(self._create_instance())
+                    self._loaded += 1
+            except Exception as e:
+                self.load_error = str(e)
+                print(f"❌ Failed to load local ASR model: {e}")
+                return self.is_loaded
+
+            self.load_error = None
+            print(f"🏠 Local ASR ready: {self.engine} {self.model_size} ({self.compute_type}), "
+                  f"{self._loaded} instance(s) in {time.perf_counter() - started:.1f}s")
+            return True
+
+    def _create_instance(self):
+        """Load one model instance with the detected engine."""
+        if self.engine == "faster_whisper":
+            from faster_whisper import WhisperModel
+
+            return WhisperModel(
+                self.model_size,
+                device="cpu",
+                compute_type=self.compute_type,
+                cpu_threads=self.threads_per_instance,
+                download_root=self.model_dir
+            )
+
+        from pywhispercpp.model import Model
+
+        model = self.model_size
+        if self.compute_type == "int8" and "-q" not in model:
+            model = f"{model}-q8_0"
+        kwargs = {"models_dir": self.model_dir} if self.model_dir else {}
+        return Model(model, n_threads=self.threads_per_instance, print_progress=False, **kwargs)
+
+    def transcribe(self, audio_data: bytes, language: str = "en") -> Dict[str, Any]:
+        """
+        Transcribe audio on the next free instance.
+
+        Blocking; call it from a worker thread.
+
+        Args:
+            audio_data: Encoded audio file or raw 16 kHz 16-bit PCM
+            language: Language code, or "auto" to detect
+
+        Returns:
+            Transcript, confidence, language, timing and queue wait
+
+        Raises:
+            RuntimeError: If no engine is loaded, the audio can't be decoded,
+                the queue is full or the wait for a free instance times out
+        """
+        if not self.is_loaded and not self.load():
+            raise RuntimeError(self.load_error or "Local ASR not loaded")
+
+        samples = pcm_to_samples(audio_data)
+        if samples is None:
+            if self.engine != "faster_whisper":
+                raise RuntimeError("Local ASR cannot decode this audio format")
+            # faster-whisper decodes other containers itself through PyAV
+            samples = io.BytesIO(audio_data)
+
+        with self._lock:
+            if self._waiting >= self.max_queue:
+                raise RuntimeError("Local ASR queue is full")
+            self._waiting += 1
+
+        queued_at = time.perf_counter()
+        try:
+            instance = self._instances.get(timeout=self.queue_timeout)
+        except queue.Empty:
+            raise RuntimeError("Timed out waiting for a local ASR instance")
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+        started = time.perf_counter()
+        try:
+            text, confidence, detected_language = self._run(instance, samples, language)
+        finally:
+            self._instances.put(instance)
+
+        return {
+            "transcript": text,
+            "confidence": round(confidence, 3),
+            "language": detected_language,
+            "processing_mode": "local",
+            "processing_time": round(time.perf_counter() - started, 3),
+            "queue_wait": round(started - queued_at, 3),
+            "model": f"{self.engine}:{self.model_size}"
+        }
+
+    def _run(self, instance, samples, language: str) -> tuple:
+        """Engine-specific inference; returns (text, confidence, language)."""
+        language = None if language in (None, "", "auto") else language
+
+        if self.engine == "faster_whisper":
+            segments, info = instance.transcribe(samples, language=language, beam_size=1, vad_filter=True)
+            segments = list(segments)
+            text = "".join(segment.text for segment in segments).strip()
+            if segments:
+                avg_logprob = float(np.mean([segment.avg_logprob for segment in segments]))
+                confidence = float(np.exp(avg_logprob))
+            else:
+                confidence = 0.0
+            return text, confidence, info.language
+
+        segments = instance.transcribe(samples, language=language or "auto")
+        text = " ".join(segment.text.strip() for segment in segments).strip()
+        return text, 0.9 if text else 0.0, language or "auto"
+
+    def get_status(self) -> Dict[str, Any]:
+        """Pool status for the local mode status endpoint."""
+        return {
+            "engine": self.engine,
+            "installed_engines": available_engines(),
+            "model": self.model_size,
+            "compute_type": self.compute_type,
+            "pool_size": self.pool_size,
+            "loaded_instances": self._loaded,
+            "idle_instances": self._instances.qsize(),
+            "queued_requests": self._waiting,
+            "sample_rate": SAMPLE_RATE,
+            "error": self.load_error
+        }
+
+# Global local ASR pool
+local_asr_pool = LocalASRPool(
+    model_size=os.getenv("LOCAL_ASR_MODEL", "base"),
+    pool_size=int(os.getenv("LOCAL_ASR_POOL_SIZE", "0")) or None,
+    compute_type=os.getenv("LOCAL_ASR_COMPUTE_TYPE", "int8"),
+    model_dir=os.getenv("LOCAL_ASR_MODEL_DIR") or None,
+    max_queue=int(os.getenv("LOCAL_ASR_MAX_QUEUE", "32"))
+)
@@ -2,10 +2,23 @@
 Local Mode Service - Phase 5B
 Handles local vs cloud mode toggle for ASR and TTS
 """
+import asyncio
+import importlib.util
+import io
 import os
-from typing import Dict, Any, Optional
+import shutil
+import time
+import wave
+from typing import Dict, Any, List, Optional
 from enum import Enum
 
+from app.services.failover import FailoverRouter
+from app.services.local_asr import available_engines, is_encoded_audio, local_asr_pool
+from app.services.provider_router import provider_router, estimate_audio_minutes
+
+def _env_flag(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
 class ProcessingMode(Enum):
     CLOUD = "cloud"
     LOCAL = "local"
@@ -18,9 +31,39 @@ class LocalModeService:
         self.asr_mode = ProcessingMode(os.getenv("ASR_MODE", "cloud").lower())
         self.tts_mode = ProcessingMode(os.getenv("TTS_MODE", "cloud").lower())
         
+        # Fall over to the other mode automatically when the preferred one fails
+        self.auto_failover = _env_flag("AUTO_FAILOVER", "true")
+        breaker_options = {
+            "failure_rate_threshold": float(os.getenv("BREAKER_FAILURE_RATE", "0.5")),
+            "slow_call_seconds": float(os.getenv("BREAKER_SLOW_CALL_SECONDS", "10")),
+            "open_seconds": float(os.getenv("BREAKER_OPEN_SECONDS", "30"))
+        }
+        
+        self.asr_router = FailoverRouter(
+            "asr",
+            backends={"cloud": self._cloud_asr_processing, "local": self._local_asr_processing},
+            probes={"cloud": self._probe_cloud_asr, "local": local_asr_pool.load},
+            hedging=_env_flag("ASR_HEDGING", "true"),
+            **breaker_options
+        )
+        # No hedging for TTS by default: the backends speak with different voices
+        self.tts_router = FailoverRouter(
+            "tts",
+            backends={"cloud": self._cloud_tts_processing, "local": self._local_tts_processing},
+            hedging=_env_flag("TTS_HEDGING", "false"),
+            **breaker_options
+        )
+        
         print(f"🎯 Initialized Local Mode Service:")
         print(f"   ASR Mode: {self.asr_mode.value}")
         print(f"   TTS Mode: {self.tts_mode.value}")
+        print(f"   Auto failover: {self.auto_failover}")
+    
+    @staticmethod
+    def _backend_order(preferred: ProcessingMode, auto_failover: bool) -> List[str]:
+        """Backend names to try, preferred mode first."""
+        fallback = ProcessingMode.LOCAL if preferred == ProcessingMode.CLOUD else ProcessingMode.CLOUD
+        return [preferred.value, fallback.value] if auto_failover else [preferred.value]
     
     def set_asr_mode(self, mode: str) -> bool:
         """Set ASR processing mode"""
@@ -43,56 +86,87 @@ class LocalModeService:
             return False
     
     def process_audio_transcription(self, audio_data: bytes, language: str = "en") -> Dict[str, Any]:
-        """Process audio transcription based on current mode"""
-        if self.asr_mode == ProcessingMode.LOCAL:
-            return self._local_asr_processing(audio_data, language)
-        else:
-            return self._cloud_asr_processing(audio_data, language)
+        """
+        Transcribe audio, preferring the current mode.
+        
+        Blocking; call it from a worker thread. Backends with an open
+        circuit are skipped, a failing backend falls over to the other
+        mode, and with hedging on the other mode is also started when the
+        preferred one runs past its p95 latency.
+        
+        Raises:
+            RuntimeError: If no backend could transcribe the audio
+        """
+        return self.asr_router.call(
+            self._backend_order(self.asr_mode, self.auto_failover), audio_data, language
+        )
     
     def _local_asr_processing(self, audio_data: bytes, language: str) -> Dict[str, Any]:
-        """Local ASR processing (stub implementation)"""
+        """Local ASR processing on the warm model pool (blocking)"""
         print(f"🏠 LOCAL ASR: Processing {len(audio_data)} bytes of audio in {language}")
-        
-        # Stub implementation - in real scenario this would use:
-        # - Whisper local model
-        # - wav2vec2
-        # - SpeechRecognition library
-        # - Other local ASR solutions
-        
-        return {
-            "transcript": f"[LOCAL ASR] Mock transcription of audio ({len(audio_data)} bytes)",
-            "confidence": 0.95,
-            "language": language,
-            "processing_mode": "local",
-            "processing_time": 0.5,
-            "model": "local_whisper_stub"
-        }
+        return local_asr_pool.transcribe(audio_data, language)
     
     def _cloud_asr_processing(self, audio_data: bytes, language: str) -> Dict[str, Any]:
-        """Cloud ASR processing (placeholder)"""
+        """Cloud ASR processing on the model the provider router picks (blocking)"""
         print(f"☁️ CLOUD ASR: Processing {len(audio_data)} bytes of audio in {language}")
+        started = time.perf_counter()
+        encoded = self._as_encoded_audio(audio_data)
         
-        # This would integrate with:
-        # - Groq Whisper API
-        # - Google Speech-to-Text
-        # - Azure Speech Services
-        # - AWS Transcribe
+        def invoke(spec, client):
+            audio_file = io.BytesIO(encoded)
+            audio_file.name = "audio.wav"
+            return provider_router.create(
+                spec,
+                client.audio.transcriptions,
+                file=audio_file,
+                model=spec.model,
+                language=language if language not in (None, "", "auto") else None
+            )
+        
+        transcription, spec = provider_router.call_sync(
+            "asr", invoke, language=language, units=estimate_audio_minutes(encoded)
+        )
         
         return {
-            "transcript": f"[CLOUD ASR] Mock transcription of audio ({len(audio_data)} bytes)",
-            "confidence": 0.98,
+            "transcript": transcription.text.strip(),
+            "confidence": 0.95,  # Whisper APIs report no confidence
             "language": language,
             "processing_mode": "cloud",
-            "processing_time": 0.3,
-            "model": "groq_whisper"
+            "processing_time": round(time.perf_counter() - started, 3),
+            "model": spec.key
         }
     
+    @staticmethod
+    def _as_encoded_audio(audio_data: bytes) -> bytes:
+        """Wrap raw 16 kHz 16-bit mono PCM in a WAV container; encoded audio passes through."""
+        if is_encoded_audio(audio_data):
+            return audio_data
+        
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(16000)
+            wav.writeframes(audio_data[:len(audio_data) - len(audio_data) % 2])
+        return buffer.getvalue()
+    
+    def _probe_cloud_asr(self) -> bool:
+        """Health probe: the Groq API answers with our key."""
+        from app.services.groq_client import groq_client
+        
+        groq_client.models.list()
+        return True
+    
     def generate_speech(self, text: str, voice_id: str = "default", language: str = "en") -> Dict[str, Any]:
-        """Generate speech based on current mode"""
-        if self.tts_mode == ProcessingMode.LOCAL:
-            return self._local_tts_processing(text, voice_id, language)
-        else:
-            return self._cloud_tts_processing(text, voice_id, language)
+        """
+        Generate speech, preferring the current mode and failing over like ASR.
+        
+        Raises:
+            RuntimeError: If no backend could generate the speech
+        """
+        return self.tts_router.call(
+            self._backend_order(self.tts_mode, self.auto_failover), text, voice_id, language
+        )
     
     def _local_tts_processing(self, text: str, voice_id: str, language: str) -> Dict[str, Any]:
         """Local TTS processing (stub implementation)"""
@@ -142,42 +216,51 @@ class LocalModeService:
             "asr_mode": self.asr_mode.value,
             "tts_mode": self.tts_mode.value,
             "available_modes": [mode.value for mode in ProcessingMode],
+            "auto_failover": self.auto_failover,
+            "failover": {
+                "asr": self.asr_router.get_status(),
+                "tts": self.tts_router.get_status()
+            },
             "local_models_status": self._check_local_models(),
             "cloud_services_status": self._check_cloud_services()
         }
     
-    def _check_local_models(self) -> Dict[str, bool]:
+    def _check_local_models(self) -> Dict[str, Any]:
         """Check availability of local models"""
-        # In real implementation, this would check:
-        # - If Whisper is installed
-        # - If TTS engines are available
-        # - Model files exist
-        # - GPU availability
+        engines = available_engines()
         
         return {
-            "whisper_available": False,  # Would check: whisper package
-            "tts_engine_available": False,  # Would check: pyttsx3, espeak
-            "gpu_available": False,  # Would check: CUDA, torch
-            "models_downloaded": False  # Would check: model files
+            "whisper_available": bool(engines),
+            "tts_engine_available": bool(shutil.which("espeak") or shutil.which("espeak-ng")
+                                         or importlib.util.find_spec("pyttsx3")),
+            "gpu_available": False,  # Local ASR runs on CPU with int8 weights
+            "models_downloaded": local_asr_pool.is_loaded,
+            "asr_pool": local_asr_pool.get_status()
         }
     
-    def _check_cloud_services(self) -> Dict[str, bool]:
+    def _check_cloud_services(self) -> Dict[str, Any]:
         """Check availability of cloud services"""
-        # In real implementation, this would check:
-        # - API keys are set
-        # - Services are reachable
-        # - Rate limits
-        
+        # Reachability comes from the circuit breakers, which see real
+        # traffic and health probes; the rest only checks configuration
         return {
-            "groq_available": bool(os.getenv("GROQ_API_KEY")),
+            "groq_available": bool(os.getenv("GROQ_API_KEY")) and self.asr_router.is_available("cloud"),
+            "cloud_asr_circuit": self.asr_router.breakers["cloud"].state.value,
+            "cloud_tts_circuit": self.tts_router.breakers["cloud"].state.value,
             "elevenlabs_available": bool(os.getenv("ELEVENLABS_API_KEY")),
             "openai_available": bool(os.getenv("OPENAI_API_KEY")),
             "google_available": bool(os.getenv("GOOGLE_CLOUD_KEY")),
             "azure_available": bool(os.getenv("AZURE_SPEECH_KEY"))
         }
     
+    async def run_health_probes(self, interval: float = 10.0):
+        """Probe backends with open circuits so recovered ones come back quickly."""
+        while True:
+            await asyncio.sleep(interval)
+            await asyncio.to_thread(self.asr_router.probe)
+            await asyncio.to_thread(self.tts_router.probe)
+    
     def switch_to_fallback_mode(self, service: str) -> bool:
-        """Switch to fallback mode if primary fails"""
+        """Manually swap the preferred mode of a service (failover still applies)"""
         if service == "asr":
             fallback = ProcessingMode.LOCAL if self.asr_mode == ProcessingMode.CLOUD else ProcessingMode.CLOUD
             self.asr_mode = fallback
@@ -2,22 +2,61 @@
 Multiparty Conversation Service - Phase 5B
 Handles up to 4 speakers in the same session
 """
-from typing import Dict, List, Set, Optional, Any
+from typing import Deque, Dict, List, Set, Optional, Any, Callable
+from collections import deque
 from datetime import datetime
 import asyncio
 import json
+import os
+
+import numpy as np
+
+from app.services.diarization import OnlineDiarizer
+from app.services.expiry import expiry_scheduler
+
+# Spill callback: (session_id, entries) -> bool, called from a worker thread
+HistoryStore = Callable[[str, List[Dict[str, Any]]], bool]
+# Page loader for spilled entries: (session_id, first_seq, end_seq) -> entries
+# with first_seq <= seq < end_seq, in seq order
+HistoryLoader = Callable[[str, int, int], List[Dict[str, Any]]]
+
+# Participant IDs of speakers found by shared-microphone diarization;
+# reserved so they can't collide with websocket participants
+DIARIZED_PREFIX = "mic:"
 
 class MultipartySession:
-    """Represents a multiparty conversation session"""
+    """
+    Represents a multiparty conversation session
+
+    Only the most recent history_limit messages (and at most
+    history_max_bytes of message content) are kept in memory. Older
+    messages move to a spill buffer that the manager writes to the
+    persistent store in the background; if no store is configured, or it
+    falls behind by more than a full ring, the oldest buffered messages
+    are dropped so memory stays bounded.
+    """
     
-    def __init__(self, session_id: str, max_participants: int = 4):
+    def __init__(self, session_id: str, max_participants: int = 4,
+                 history_limit: int = 200, history_max_bytes: int = 256 * 1024):
         self.session_id = session_id
         self.max_participants = max_participants
         self.participants: Dict[str, Dict[str, Any]] = {}
         self.websockets: Dict[str, Any] = {}  # speaker_id -> websocket
         self.created_at = datetime.utcnow()
         self.last_activity = datetime.utcnow()
-        self.conversation_history: List[Dict[str, Any]] = []
+        self.history_limit = history_limit
+        self.history_max_bytes = history_max_bytes
+        self.conversation_history: Deque[Dict[str, Any]] = deque()
+        self.history_bytes = 0
+        self.message_count = 0          # every message ever added
+        self.spill_buffer: List[Dict[str, Any]] = []
+        self.spill_in_flight = 0        # leading spill_buffer entries being written now
+        self.spilled_count = 0          # messages written to the persistent store
+        self.dropped_count = 0          # messages evicted without being stored
+        self.roster_version = 0         # bumped whenever participants change
+        self.broadcast_roster_version = -1
+        self.diarizer: Optional[OnlineDiarizer] = None  # created on first shared-mic audio
+        self.diarizer_lock = asyncio.Lock()
         
     def add_participant(self, speaker_id: str, websocket, participant_info: Dict[str, Any]) -> bool:
         """Add a participant to the session"""
@@ -31,13 +70,16 @@ class MultipartySession:
             "name": participant_info.get("name", f"Speaker {speaker_id}"),
             "metadata": participant_info.get("metadata", {})
         }
-        self.websockets[speaker_id] = websocket
+        if websocket is not None:
+            self.websockets[speaker_id] = websocket
+        self.roster_version += 1
         self.last_activity = datetime.utcnow()
         return True
     
     def remove_participant(self, speaker_id: str):
         """Remove a participant from the session"""
-        self.participants.pop(speaker_id, None)
+        if self.participants.pop(speaker_id, None) is not None:
+            self.roster_version += 1
         self.websockets.pop(speaker_id, None)
         self.last_activity = datetime.utcnow()
     
@@ -63,29 +105,91 @@ class MultipartySession:
                 self.remove_participant(speaker_id)
     
     def add_to_history(self, speaker_id: str, content: str, message_type: str = "transcription"):
-        """Add message to conversation history"""
+        """Add message to conversation history, evicting the oldest past the memory cap"""
         self.conversation_history.append({
+            "seq": self.message_count,
             "speaker_id": speaker_id,
             "content": content,
             "message_type": message_type,
             "timestamp": datetime.utcnow().isoformat()
         })
+        self.message_count += 1
+        self.history_bytes += len(content)
+        
+        while self.conversation_history and (
+            len(self.conversation_history) > self.history_limit
+            or self.history_bytes > self.history_max_bytes
+        ):
+            entry = self.conversation_history.popleft()
+            self.history_bytes -= len(entry["content"])
+            self.spill_buffer.append(entry)
+        
+        # Never hold more than one ring's worth of unwritten messages
+        overflow = min(len(self.spill_buffer) - self.history_limit,
+                       len(self.spill_buffer) - self.spill_in_flight)
+        if overflow > 0:
+            self.drop_spill(self.spill_in_flight, overflow)
+        
         self.last_activity = datetime.utcnow()
+    
+    def drop_spill(self, start: int, count: int):
+        """Discard spill buffer entries that will never reach the store"""
+        del self.spill_buffer[start:start + count]
+        self.dropped_count += count
+    
+    def take_roster_update(self) -> Optional[List[Dict[str, Any]]]:
+        """Participant list if it changed since the last broadcast, else None"""
+        if self.roster_version == self.broadcast_roster_version:
+            return None
+        self.broadcast_roster_version = self.roster_version
+        return self.get_participant_list()
+    
+    def history_stats(self) -> Dict[str, Any]:
+        return {
+            "total": self.message_count,
+            "in_memory": len(self.conversation_history),
+            "pending_spill": len(self.spill_buffer),
+            "spilled": self.spilled_count,
+            "dropped": self.dropped_count,
+            "memory_bytes": self.history_bytes,
+            "limit": self.history_limit,
+            "max_bytes": self.history_max_bytes
+        }
 
 class MultipartyManager:
     """Manages multiple multiparty sessions"""
     
-    def __init__(self):
+    def __init__(self, idle_ttl: float = 1800.0, history_limit: int = 200,
+                 history_max_bytes: int = 256 * 1024, spill_batch: int = 20):
         self.sessions: Dict[str, MultipartySession] = {}
         self.speaker_to_session: Dict[str, str] = {}  # speaker_id -> session_id
+        self.history_limit = history_limit
+        self.history_max_bytes = history_max_bytes
+        self.spill_batch = spill_batch
+        self.history_store: Optional[HistoryStore] = None
+        self.history_loader: Optional[HistoryLoader] = None
+        expiry_scheduler.register("multiparty_session", idle_ttl, self._expire_session)
+    
+    def use_history_store(self, store: HistoryStore, loader: Optional[HistoryLoader] = None):
+        """
+        Persist history evicted from the in-memory ring
+        
+        Args:
+            store: Writes a batch of entries for a session; returns success
+            loader: Reads spilled entries back by seq range for history paging
+        """
+        self.history_store = store
+        self.history_loader = loader
     
     def create_session(self, session_id: str, max_participants: int = 4) -> MultipartySession:
         """Create a new multiparty session"""
         if session_id in self.sessions:
             return self.sessions[session_id]
             
-        session = MultipartySession(session_id, max_participants)
+        session = MultipartySession(session_id, max_participants,
+                                    self.history_limit, self.history_max_bytes)
         self.sessions[session_id] = session
+        expiry_scheduler.touch("multiparty_session", session_id)
         print(f"🎭 Created multiparty session: {session_id}")
         return session
     
@@ -93,9 +197,82 @@ class MultipartyManager:
         """Get an existing session"""
         return self.sessions.get(session_id)
     
+    def touch_session(self, session_id: str):
+        """Record activity so the session's idle expiry is pushed back"""
+        if session_id in self.sessions:
+            expiry_scheduler.touch("multiparty_session", session_id)
+    
+    def remove_session(self, session_id: str):
+        """Drop a session and its speakers' session mapping"""
+        session = self.sessions.pop(session_id, None)
+        expiry_scheduler.cancel("multiparty_session", session_id)
+        if session:
+            for speaker_id in session.participants:
+                if self.speaker_to_session.get(speaker_id) == session_id:
+                    del self.speaker_to_session[speaker_id]
+            
+            # Persist what is still in memory before the session goes away
+            session.spill_buffer.extend(session.conversation_history)
+            session.conversation_history.clear()
+            session.history_bytes = 0
+            self._schedule_spill(session)
+    
+    def _schedule_spill(self, session: MultipartySession):
+        """Write the session's spill buffer in the background if nothing is writing it yet"""
+        if not session.spill_buffer or session.spill_in_flight:
+            return
+        
+        if self.history_store is None:
+            # Nowhere to keep evicted history
+            session.drop_spill(0, len(session.spill_buffer))
+            return
+        
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # No event loop (called from a worker thread or a script); write inline
+            if self.history_store(session.session_id, list(session.spill_buffer)):
+                session.spilled_count += len(session.spill_buffer)
+                session.spill_buffer.clear()
+            return
+        
+        session.spill_in_flight = len(session.spill_buffer)
+        loop.create_task(self._spill(session))
+    
+    async def _spill(self, session: MultipartySession):
+        """Drain the spill buffer to the store, batch by batch"""
+        try:
+            while session.spill_buffer:
+                # Entries in flight are never dropped, so the batch stays at the buffer's head
+                session.spill_in_flight = len(session.spill_buffer)
+                batch = session.spill_buffer[:session.spill_in_flight]
+                try:
+                    stored = await asyncio.to_thread(self.history_store, session.session_id, batch)
+                except Exception as e:
+                    print(f"⚠️ History spill for session {session.session_id} failed: {e}")
+                    stored = False
+                if not stored:
+                    break  # retried on the next eviction; add_to_history caps the buffer meanwhile
+                del session.spill_buffer[:len(batch)]
+                session.spilled_count += len(batch)
+        finally:
+            session.spill_in_flight = 0
+    
+    def _expire_session(self, session_id: str):
+        """Expiry callback: remove a session idle past its TTL, unless a speaker is still connected"""
+        session = self.sessions.get(session_id)
+        if session and session.websockets:
+            return False
+        self.remove_session(session_id)
+        print(f"🗑️ Expired idle session {session_id}")
+    
     def join_session(self, session_id: str, speaker_id: str, websocket, 
                     participant_info: Dict[str, Any]) -> bool:
         """Join a speaker to a session"""
+        if speaker_id.startswith(DIARIZED_PREFIX):
+            print(f"❌ Speaker ID {speaker_id} is reserved for diarized speakers")
+            return False
+        
         session = self.get_session(session_id)
         if not session:
             session = self.create_session(session_id)
@@ -108,6 +285,7 @@ class MultipartyManager:
         success = session.add_participant(speaker_id, websocket, participant_info)
         if success:
             self.speaker_to_session[speaker_id] = session_id
+            self.touch_session(session_id)
             print(f"👤 Speaker {speaker_id} joined session {session_id}")
             return True
         
@@ -124,8 +302,10 @@ class MultipartyManager:
             
             # Clean up empty sessions
             if session.get_participant_count() == 0:
-                self.sessions.pop(session_id, None)
+                self.remove_session(session_id)
                 print(f"🗑️ Cleaned up empty session {session_id}")
+            else:
+                self.touch_session(session_id)
     
     async def process_speaker_message(self, session_id: str, speaker_id: str, 
                                     content: str, message_type: str = "transcription") -> Dict[str, Any]:
@@ -136,8 +316,11 @@ class MultipartyManager:
         
         # Add to session history
         session.add_to_history(speaker_id, content, message_type)
+        self.touch_session(session_id)
+        if len(session.spill_buffer) >= self.spill_batch:
+            self._schedule_spill(session)
         
-        # Create broadcast message
+        # Create broadcast message; the participant list only goes out when it changed
         broadcast_message = {
             "type": "multiparty_message",
             "session_id": session_id,
@@ -145,8 +328,11 @@ class MultipartyManager:
             "content": content,
             "message_type": message_type,
             "timestamp": datetime.utcnow().isoformat(),
-            "participants": session.get_participant_list()
+            "roster_version": session.roster_version
         }
+        roster = session.take_roster_update()
+        if roster is not None:
+            broadcast_message["participants"] = roster
         
         # Broadcast to other participants
         await session.broadcast_message(broadcast_message, exclude_speaker=speaker_id)
@@ -157,10 +343,89 @@ class MultipartyManager:
             "session_info": {
                 "session_id": session_id,
                 "participant_count": session.get_participant_count(),
-                "participants": session.get_participant_list()
+                "roster_version": session.roster_version
             }
         }
     
+    async def process_shared_audio(self, session_id: str, audio_chunk: bytes,
+                                   transcriber: Callable[[bytes, str], Dict[str, Any]],
+                                   language: str = "en", final: bool = False) -> Dict[str, Any]:
+        """
+        Diarize audio from a shared microphone and route each speaker's segments
+        
+        Args:
+            session_id: Multiparty session
+            audio_chunk: 16 kHz mono 16-bit PCM
+            transcriber: Transcription function taking (pcm_bytes, language)
+            language: Spoken language
+            final: End of stream; flush the open segment
+            
+        Returns:
+            Segments with their transcriptions, speakers named
+            "<DIARIZED_PREFIX>speaker_N". A segment that could not be
+            transcribed (ASR down, or no room for a new speaker) carries
+            "error" instead; if ASR failed for every segment, the result
+            also has "unavailable" with the last error.
+        """
+        session = self.get_session(session_id)
+        if not session:
+            return {"error": "Session not found"}
+        
+        if session.diarizer is None:
+            session.diarizer = OnlineDiarizer(max_speakers=session.max_participants)
+        self.touch_session(session_id)
+        
+        samples = np.frombuffer(audio_chunk[:len(audio_chunk) - len(audio_chunk) % 2], dtype="<i2")
+        samples = samples.astype(np.float32) / 32768.0
+        
+        # The diarizer keeps stream state; one chunk at a time per session.
+        # Embedding is CPU-bound, so it runs off the event loop.
+        async with session.diarizer_lock:
+            segments = await asyncio.to_thread(session.diarizer.process_chunk, samples)
+            if final:
+                segments += await asyncio.to_thread(session.diarizer.flush)
+        
+        results = []
+        unavailable = []
+        for segment in segments:
+            speaker_id = DIARIZED_PREFIX + segment.speaker_id
+            result = {**segment.to_dict(), "speaker_id": speaker_id}
+            
+            # Diarized speakers join as participants without their own websocket
+            if speaker_id not in session.participants:
+                label = segment.speaker_id.split("_")[-1]
+                joined = session.add_participant(speaker_id, None, {
+                    "language": language,
+                    "name": f"Speaker {label}",
+                    "metadata": {"diarized": True}
+                })
+                if not joined:
+                    results.append({**result, "transcription": None, "error": "Session is full"})
+                    continue
+            
+            try:
+                transcription = await asyncio.to_thread(transcriber, segment.to_pcm16(), language)
+            except RuntimeError as e:
+                # Every ASR backend failed or has an open circuit; keep the segment
+                unavailable.append(str(e))
+                results.append({**result, "transcription": None, "error": str(e)})
+                continue
+            await self.process_speaker_message(session_id, speaker_id, transcription.get("transcript", ""))
+            
+            results.append({**result, "transcription": transcription})
+        
+        if segments:
+            print(f"🎙️ Diarized {len(segments)} segment(s) in session {session_id}")
+        
+        response = {
+            "session_id": session_id,
+            "segments": results,
+            "speakers": [DIARIZED_PREFIX + speaker for speaker in session.diarizer.speaker_ids]
+        }
+        if unavailable and len(unavailable) == len(results):
+            response["unavailable"] = unavailable[-1]
+        return response
+    
     def get_session_info(self, session_id: str) -> Optional[Dict[str, Any]]:
         """Get information about a session"""
         session = self.get_session(session_id)
@@ -174,7 +439,50 @@ class MultipartyManager:
             "participants": session.get_participant_list(),
             "created_at": session.created_at.isoformat(),
             "last_activity": session.last_activity.isoformat(),
-            "conversation_length": len(session.conversation_history)
+            "conversation_length": session.message_count,
+            "roster_version": session.roster_version,
+            "history": session.history_stats()
+        }
+    
+    def get_history_page(self, session_id: str, offset: int = 0, limit: int = 50) -> Optional[Dict[str, Any]]:
+        """
+        Read a page of a session's history, oldest first
+        
+        Recent messages come from memory; older ones are loaded from the
+        persistent store. Blocking when it has to hit the store, so call it
+        from a worker thread.
+        
+        Args:
+            session_id: Multiparty session
+            offset: Sequence number of the first message
+            limit: Maximum number of messages
+            
+        Returns:
+            Page with "messages", "offset", "next_offset" and "total", or None
+            if the session is unknown
+        """
+        session = self.get_session(session_id)
+        if not session:
+            return None
+        
+        offset = max(0, offset)
+        end = min(offset + max(0, limit), session.message_count)
+        # Snapshot: memory holds the newest messages in seq order
+        recent = list(session.spill_buffer) + list(session.conversation_history)
+        first_recent = recent[0]["seq"] if recent else session.message_count
+        
+        messages: List[Dict[str, Any]] = []
+        if offset < min(end, first_recent) and self.history_loader and session.spilled_count:
+            # Spilled rows carry their seq; dropped messages are simply missing
+            messages.extend(self.history_loader(session_id, offset, min(end, first_recent)))
+        messages.extend(entry for entry in recent if offset <= entry["seq"] < end)
+        
+        return {
+            "session_id": session_id,
+            "messages": messages,
+            "offset": offset,
+            "next_offset": end if end < session.message_count else None,
+            "total": session.message_count
         }
     
     def get_all_sessions(self) -> List[Dict[str, Any]]:
@@ -185,4 +493,9 @@ class MultipartyManager:
         ]
 
 # Global multiparty manager instance
-multiparty_manager = MultipartyManager()
+multiparty_manager = MultipartyManager(
+    idle_ttl=float(os.getenv("MULTIPARTY_SESSION_TTL", "1800")),
+    history_limit=int(os.getenv("MULTIPARTY_HISTORY_LIMIT", "200")),
+    history_max_bytes=int(os.getenv("MULTIPARTY_HISTORY_MAX_BYTES", str(256 * 1024))),
+    spill_batch=int(os.getenv("MULTIPARTY_HISTORY_SPILL_BATCH", "20"))
+)
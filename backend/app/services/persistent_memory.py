@@ -2,40 +2,114 @@
 Persistent Memory Service - Phase 5B
 Stores and retrieves session summaries from database
 """
+import asyncio
+import hashlib
+import os
+import re
+import threading
 from typing import Dict, List, Optional, Any
 from datetime import datetime
 
 try:
     from sqlalchemy.orm import Session
     from app.db import DatabaseService, get_db
+    from app.db.database import SessionLocal
     HAS_DATABASE = True
 except ImportError:
     Session = None
     DatabaseService = None
     get_db = None
+    SessionLocal = None
     HAS_DATABASE = False
 
+from app.services.expiry import expiry_scheduler
 from app.services.multiparty import multiparty_manager
 
+# Words ignored when scoring sentences for the extractive summary
+STOPWORDS = frozenset("""
+a an the and or but if then so of to in on at by for with from as is are was were be been being
+it its this that these those i you he she we they me him her us them my your our their
+do does did have has had not no yes ok okay just very really can could would should will
+what which who how when where there here about into out up down over than too also um uh
+""".split())
+
 class PersistentMemoryService:
-    """Service for managing persistent conversation memory"""
+    """
+    Service for managing persistent conversation memory
+    
+    Each session keeps a rolling summary in ConversationSession.summary,
+    with the id of the last message folded into it stored as a checkpoint
+    in session_metadata. Updating the summary only reads and folds the
+    messages after the checkpoint, in batches, so its cost follows the
+    new messages rather than the whole history. Folding uses the
+    provider router's LLMs and falls back to a local extractive summary.
+    GETs serve the stored summary.
+    """
     
-    def __init__(self):
+    def __init__(self, summary_batch: int = 50, summary_every: int = 20,
+                 summary_max_chars: int = 2000, use_llm: bool = True,
+                 state_ttl: float = 3600.0):
         self.db_service = DatabaseService() if HAS_DATABASE else None
+        self.summary_batch = summary_batch
+        self.summary_every = summary_every
+        self.summary_max_chars = summary_max_chars
+        self.use_llm = use_llm
+        self._pending: Dict[str, int] = {}          # session_id -> messages stored since the last fold
+        self._summary_locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        
+        # Per-session counters and locks are dropped once a session has been idle for state_ttl
+        expiry_scheduler.register("summary_state", state_ttl, self._expire_summary_state)
     
     def store_session_summary(self, db, session_id: str, participants: List[Dict[str, Any]],
                             messages: List[Dict[str, Any]]) -> bool:
-        """Store session summary in database"""
+        """
+        Fold a client-provided conversation into the session's stored summary
+        
+        Clients post the whole conversation each time. The checkpoint
+        remembers how many posted messages are already folded in and a
+        fingerprint of the last one: if the new post extends that history,
+        only the messages after it are folded; otherwise (edited or
+        different history) the summary is rebuilt from the posted messages.
+        """
         if not self.db_service:
             print(f"📝 Mock: Stored summary for session {session_id}")
             return True
         
         try:
-            # Generate summary from messages
-            summary = self._generate_session_summary(messages, participants)
-            
-            # Store in database
-            success = self.db_service.update_session_summary(db, session_id, summary)
+            with self._summary_lock(session_id):
+                checkpoint = self.db_service.get_summary_checkpoint(db, session_id) or {}
+                folded = checkpoint.get("client_messages", 0)
+                extends = (
+                    0 < folded <= len(messages)
+                    and checkpoint.get("client_tail") == self._message_fingerprint(messages[folded - 1])
+                )
+                if extends and folded == len(messages):
+                    return True
+                
+                if extends:
+                    summary = checkpoint.get("summary")
+                    count = checkpoint.get("summarized_messages", 0)
+                    new_messages = messages[folded:]
+                else:
+                    summary, count, new_messages = None, 0, messages
+                
+                for start in range(0, len(new_messages), self.summary_batch):
+                    batch = new_messages[start:start + self.summary_batch]
+                    summary = self._fold_summary(summary, batch, participants)
+                    count += len(batch)
+                if summary is None:
+                    summary = self._fold_summary(None, [], participants)
+                
+                success = self.db_service.save_summary_checkpoint(
+                    db, session_id, summary,
+                    checkpoint.get("last_message_id", 0),
+                    count,
+                    client_state={
+                        "client_messages": len(messages),
+                        "client_tail": self._message_fingerprint(messages[-1]) if messages else None
+                    }
+                )
             
             if success:
                 print(f"💾 Stored session summary: {session_id}")
@@ -48,31 +122,178 @@ class PersistentMemoryService:
             print(f"Error storing session summary: {e}")
             return False
     
-    def _generate_session_summary(self, messages: List[Dict[str, Any]], 
-                                participants: List[Dict[str, Any]]) -> str:
-        """Generate a simple summary from conversation messages"""
+    def update_rolling_summary(self, db, session_id: str,
+                               participants: Optional[List[Dict[str, Any]]] = None) -> Optional[str]:
+        """
+        Fold messages stored since the last checkpoint into the session's summary
+        
+        Blocking (database and LLM calls); run it from a worker thread.
+        
+        Returns:
+            The updated summary, or None if the session has no messages
+        """
+        if not self.db_service:
+            return None
+        
+        with self._summary_lock(session_id):
+            self._pending.pop(session_id, None)
+            checkpoint = self.db_service.get_summary_checkpoint(db, session_id) or {}
+            summary = checkpoint.get("summary")
+            last_id = checkpoint.get("last_message_id", 0)
+            count = checkpoint.get("summarized_messages", 0)
+            
+            while True:
+                messages = self.db_service.get_messages_after(db, session_id, last_id, self.summary_batch)
+                if not messages:
+                    break
+                summary = self._fold_summary(summary, messages, participants)
+                last_id = messages[-1]["id"]
+                count += len(messages)
+                # Checkpoint each batch so an interrupted update resumes where it stopped
+                self.db_service.save_summary_checkpoint(db, session_id, summary, last_id, count)
+                if len(messages) < self.summary_batch:
+                    break
+            
+            return summary
+    
+    @staticmethod
+    def _message_fingerprint(message: Dict[str, Any]) -> str:
+        """Short hash identifying a client-posted message"""
+        key = "\x1f".join(str(message.get(field, "")) for field in ("speaker_id", "timestamp", "content"))
+        return hashlib.sha256(key.encode()).hexdigest()[:16]
+    
+    def _summary_lock(self, session_id: str) -> threading.Lock:
+        with self._locks_guard:
+            lock = self._summary_locks.setdefault(session_id, threading.Lock())
+        expiry_scheduler.touch("summary_state", session_id)
+        return lock
+    
+    def _note_new_messages(self, session_id: str, count: int) -> bool:
+        """Count stored messages; True once enough have arrived to fold them in"""
+        self._pending[session_id] = self._pending.get(session_id, 0) + count
+        expiry_scheduler.touch("summary_state", session_id)
+        return self._pending[session_id] >= self.summary_every
+    
+    def _expire_summary_state(self, session_id: str):
+        """
+        Expiry callback: forget an idle session's message counter and lock
+        
+        Messages still waiting to be folded are folded first; the state is
+        kept until that is done and dropped on the next expiry.
+        """
+        with self._locks_guard:
+            lock = self._summary_locks.get(session_id)
+            if lock and lock.locked():
+                return False
+            if not (self._pending.get(session_id) and SessionLocal is not None):
+                self._summary_locks.pop(session_id, None)
+                self._pending.pop(session_id, None)
+                return None
+        
+        self._refresh_in_background(session_id)
+        return False
+    
+    def _refresh_in_background(self, session_id: str):
+        """Fold pending messages off the request path, on the running event loop if any"""
+        def refresh():
+            db = SessionLocal()
+            try:
+                self.update_rolling_summary(db, session_id)
+            except Exception as e:
+                print(f"⚠️ Summary update for {session_id} failed: {e}")
+            finally:
+                db.close()
+        
+        if SessionLocal is None or self._summary_lock(session_id).locked():
+            return
+        try:
+            asyncio.get_running_loop().run_in_executor(None, refresh)
+        except RuntimeError:
+            refresh()
+    
+    def _fold_summary(self, previous: Optional[str], messages: List[Dict[str, Any]],
+                      participants: Optional[List[Dict[str, Any]]] = None) -> str:
+        """Merge new messages into a running summary (LLM, else extractive)"""
         if not messages:
-            return "Empty conversation session"
+            return previous or "Empty conversation session"
         
-        participant_names = [p.get("name", p.get("speaker_id")) for p in participants]
-        message_count = len(messages)
+        if self.use_llm:
+            try:
+                return self._llm_fold(previous, messages, participants)
+            except Exception as e:
+                print(f"⚠️ LLM summary failed, using extractive summary: {e}")
         
-        # Simple summary generation
-        summary_parts = [
-            f"Conversation with {len(participants)} participants: {', '.join(participant_names)}",
-            f"Total messages: {message_count}",
-            f"Duration: {self._calculate_duration(messages)}",
-        ]
+        return self._extractive_fold(previous, messages)
+    
+    def _llm_fold(self, previous: Optional[str], messages: List[Dict[str, Any]],
+                  participants: Optional[List[Dict[str, Any]]]) -> str:
+        from app.services.provider_router import provider_router, estimate_translation_tokens
+        
+        transcript = "\n".join(f"{m.get('speaker_id', 'Unknown')}: {m.get('content', '')}" for m in messages)
+        names = ", ".join(p.get("name", p.get("speaker_id", "")) for p in participants or [])
+        prompt = (
+            f"Running summary of a conversation{f' between {names}' if names else ''}:\n"
+            f"{previous or '(none yet)'}\n\n"
+            f"New messages:\n{transcript}\n\n"
+            f"Rewrite the running summary so it also covers the new messages. Keep names, decisions, "
+            f"open questions and facts worth remembering. Stay under {self.summary_max_chars} characters. "
+            f"Return only the summary."
+        )
         
-        # Add sample of conversation
-        if messages:
-            summary_parts.append("Key points:")
-            for i, msg in enumerate(messages[:3]):  # First 3 messages
-                speaker = msg.get("speaker_id", "Unknown")
-                content = msg.get("content", "")[:100]  # First 100 chars
-                summary_parts.append(f"- {speaker}: {content}...")
+        def invoke(spec, client):
+            return provider_router.create(
+                spec,
+                client.chat.completions,
+                model=spec.model,
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=max(64, self.summary_max_chars // 4),
+                temperature=0.2
+            )
         
-        return "\n".join(summary_parts)
+        # The router's "translation" models are its general text-generation models
+        response, _ = provider_router.call_sync("translation", invoke, units=estimate_translation_tokens(prompt))
+        summary = (response.choices[0].message.content or "").strip()
+        if not summary:
+            raise ValueError("empty summary")
+        return summary[:self.summary_max_chars]
+    
+    def summarize_locally(self, messages: List[Dict[str, Any]], previous: Optional[str] = None,
+                          sentences: int = 3) -> str:
+        """Extractive summary of messages (no LLM call, deterministic)"""
+        return self._extractive_fold(previous, messages, sentences)
+    
+    def _extractive_fold(self, previous: Optional[str], messages: List[Dict[str, Any]],
+                         sentences_per_batch: int = 3) -> str:
+        """
+        Append the most representative sentences of the new messages
+        
+        Sentences are scored by the frequency of their content words within
+        the batch; the oldest lines are dropped past summary_max_chars.
+        """
+        candidates = []
+        frequencies: Dict[str, int] = {}
+        for message in messages:
+            speaker = message.get("speaker_id", "Unknown")
+            for sentence in re.split(r"(?<=[.!?])\s+", message.get("content", "").strip()):
+                words = [w for w in re.findall(r"[\w']+", sentence.lower()) if w not in STOPWORDS]
+                if not words:
+                    continue
+                candidates.append((speaker, sentence, words))
+                for word in words:
+                    frequencies[word] = frequencies.get(word, 0) + 1
+        
+        scored = sorted(
+            range(len(candidates)),
+            key=lambda i: sum(frequencies[w] for w in candidates[i][2]) / len(candidates[i][2]) ** 0.5,
+            reverse=True
+        )[:sentences_per_batch]
+        lines = (previous.splitlines() if previous else []) + [
+            f"- {candidates[i][0]}: {candidates[i][1][:200]}" for i in sorted(scored)
+        ]
+        
+        while len(lines) > 1 and sum(len(line) + 1 for line in lines) > self.summary_max_chars:
+            lines.pop(0)
+        return "\n".join(lines) if lines else (previous or "Empty conversation session")
     
     def _calculate_duration(self, messages: List[Dict[str, Any]]) -> str:
         """Calculate conversation duration"""
@@ -90,23 +311,21 @@ class PersistentMemoryService:
             return "Unknown duration"
     
     def get_session_summary(self, db, session_id: str) -> Optional[str]:
-        """Retrieve session summary from database"""
+        """Retrieve the stored rolling summary; pending messages are folded in the background"""
         if not self.db_service:
             return f"Mock summary for session {session_id}"
         
         try:
-            # Get session messages to generate/update summary
-            messages = self.db_service.get_session_messages(db, session_id)
-            
-            if messages:
-                # Get session info from multiparty manager
+            checkpoint = self.db_service.get_summary_checkpoint(db, session_id)
+            if not checkpoint or not checkpoint.get("summary"):
+                # First request for this session: build the summary once
                 session_info = multiparty_manager.get_session_info(session_id)
                 participants = session_info.get("participants", []) if session_info else []
-                
-                # Generate fresh summary
-                return self._generate_session_summary(messages, participants)
+                return self.update_rolling_summary(db, session_id, participants)
             
-            return None
+            if self._pending.get(session_id):
+                self._refresh_in_background(session_id)
+            return checkpoint["summary"]
         except Exception as e:
             print(f"Error getting session summary: {e}")
             return None
@@ -165,11 +384,40 @@ class PersistentMemoryService:
                 message_type, language, emotions
             )
             
+            if success and self._note_new_messages(session_id, 1):
+                self._refresh_in_background(session_id)
             return success
         except Exception as e:
             print(f"Error adding message to history: {e}")
             return False
     
+    def spill_history(self, session_id: str, messages: List[Dict[str, Any]]) -> bool:
+        """
+        Store history entries evicted from a live session's in-memory ring
+        
+        Runs on a worker thread with its own database session.
+        
+        Returns:
+            True if the batch was written
+        """
+        db = SessionLocal()
+        try:
+            stored = self.db_service.add_messages(db, session_id, messages)
+            # Already on a worker thread, so fold right here once enough has arrived
+            if stored and self._note_new_messages(session_id, len(messages)):
+                self.update_rolling_summary(db, session_id)
+            return stored
+        finally:
+            db.close()
+    
+    def load_history(self, session_id: str, first_seq: int, end_seq: int) -> List[Dict[str, Any]]:
+        """Read spilled history entries with first_seq <= seq < end_seq back for paging"""
+        db = SessionLocal()
+        try:
+            return self.db_service.get_spilled_messages(db, session_id, first_seq, end_seq)
+        finally:
+            db.close()
+    
     def get_session_analytics(self, db, session_id: str) -> Dict[str, Any]:
         """Get analytics for a session"""
         try:
@@ -207,4 +455,17 @@ class PersistentMemoryService:
         return 0
 
 # Global persistent memory service instance
-persistent_memory_service = PersistentMemoryService()
+persistent_memory_service = PersistentMemoryService(
+    summary_batch=int(os.getenv("SUMMARY_BATCH_SIZE", "50")),
+    summary_every=int(os.getenv("SUMMARY_UPDATE_EVERY", "20")),
+    summary_max_chars=int(os.getenv("SUMMARY_MAX_CHARS", "2000")),
+    use_llm=os.getenv("SUMMARY_USE_LLM", "true").lower() == "true",
+    state_ttl=float(os.getenv("SUMMARY_STATE_TTL", "3600"))
+)
+
+# Multiparty sessions spill history older than their in-memory ring here
+if persistent_memory_service.db_service and SessionLocal is not None:
+    multiparty_manager.use_history_store(
+        persistent_memory_service.spill_history,
+        persistent_memory_service.load_history
+    )
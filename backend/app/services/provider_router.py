@@ -0,0 +1,361 @@
+"""
+Provider Router
+Registry of cloud ASR and translation models, and a router that picks a
+model per request from live latency, error rate, language support, cost
+and provider rate limits.
+"""
+import asyncio
+import io
+import os
+import re
+import threading
+import time
+from collections import Counter, deque
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+@dataclass
+class ModelSpec:
+    """One routable model of one provider."""
+    provider: str
+    model: str
+    task: str                                   # "asr" or "translation"
+    cost: float                                 # USD per unit
+    unit: str                                   # "minute" (ASR) or "1k_tokens" (translation)
+    expected_latency: float                     # seconds, prior until measured
+    languages: Optional[frozenset] = None       # None means any language
+
+    @property
+    def key(self) -> str:
+        return f"{self.provider}:{self.model}"
+
+    def supports(self, language: Optional[str]) -> bool:
+        if self.languages is None:
+            return True
+        # Language-restricted models can't be trusted with auto-detection
+        return language not in (None, "", "auto") and language in self.languages
+
+@dataclass
+class ModelStats:
+    """Live measurements for one model."""
+    latency_ewma: float
+    error_ewma: float = 0.0
+    error_updated: float = 0.0                  # monotonic time error_ewma was last folded
+    calls: int = 0
+    errors: int = 0
+    rate_limited: int = 0
+    consecutive_429: int = 0
+    backoff_until: float = 0.0
+    remaining_requests: Optional[int] = None
+    last_error: Optional[str] = None
+
+# Default registry; prices are the providers' list prices
+DEFAULT_MODELS = [
+    ModelSpec("groq", "whisper-large-v3-turbo", "asr", cost=0.04 / 60, unit="minute", expected_latency=0.6),
+    ModelSpec("groq", "whisper-large-v3", "asr", cost=0.111 / 60, unit="minute", expected_latency=0.9),
+    ModelSpec("groq", "distil-whisper-large-v3-en", "asr", cost=0.02 / 60, unit="minute", expected_latency=0.5,
+              languages=frozenset({"en"})),
+    ModelSpec("openai", "whisper-1", "asr", cost=0.006, unit="minute", expected_latency=2.5),
+    ModelSpec("groq", "llama-3.1-8b-instant", "translation", cost=0.00008, unit="1k_tokens", expected_latency=0.4),
+    ModelSpec("groq", "llama-3.3-70b-versatile", "translation", cost=0.00079, unit="1k_tokens", expected_latency=1.0),
+]
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_SECONDS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+def parse_reset_duration(value: Optional[str]) -> Optional[float]:
+    """Parse rate-limit reset values like "1m30.5s", "250ms" or "12" into seconds."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_SECONDS[unit] for amount, unit in parts)
+
+def estimate_audio_minutes(audio_data: bytes) -> float:
+    """Audio length in minutes, read from the header when possible, else taken as 16 kHz PCM16."""
+    try:
+        import soundfile as sf
+
+        info = sf.info(io.BytesIO(audio_data))
+        return info.frames / info.samplerate / 60.0
+    except Exception:
+        return len(audio_data) / (16000 * 2 * 60.0)
+
+def estimate_translation_tokens(text: str) -> float:
+    """Prompt plus completion tokens of a translation, in thousands (~4 chars per token)."""
+    return 2 * (len(text) / 4 + 30) / 1000.0
+
+class ProviderRouter:
+    """
+    Chooses a provider and model per request.
+
+    Each candidate that supports the request's language is scored by
+    expected seconds: its latency EWMA plus its estimated cost converted
+    at cost_weight seconds per USD, inflated by its error EWMA (the
+    expected retries). The error EWMA also halves every error_half_life
+    seconds without calls, so a model ranked out after a bad spell gets
+    tried again instead of staying last for good. Models backing off
+    after a 429, or with no requests left in the provider's current
+    window, are skipped until the window resets. On failure the next
+    candidate is tried.
+    """
+
+    def __init__(self,
+                 models: List[ModelSpec],
+                 cost_weight: float = 100.0,
+                 alpha: float = 0.2,
+                 default_backoff: float = 1.0,
+                 max_backoff: float = 60.0,
+                 error_half_life: float = 300.0):
+        self.models: Dict[str, ModelSpec] = {}
+        self.stats: Dict[str, ModelStats] = {}
+        self.cost_weight = cost_weight
+        self.alpha = alpha
+        self.error_half_life = error_half_life
+        self.default_backoff = default_backoff
+        self.max_backoff = max_backoff
+        self.decisions: Counter = Counter()
+        self.fallbacks = 0
+        self.recent_decisions: deque = deque(maxlen=50)
+        self._clients: Dict[str, Callable[[], Any]] = {}
+        self._lock = threading.Lock()
+
+        for spec in models:
+            self.register(spec)
+
+    def register(self, spec: ModelSpec):
+        """Add a model to the registry (replacing one with the same key)."""
+        self.models[spec.key] = spec
+        self.stats[spec.key] = ModelStats(latency_ewma=spec.expected_latency)
+
+    def register_client(self, provider: str, factory: Callable[[], Any]):
+        """Set how to get the SDK client for a provider."""
+        self._clients[provider] = factory
+
+    def get_client(self, provider: str) -> Any:
+        factory = self._clients.get(provider)
+        if factory is None:
+            raise RuntimeError(f"No client registered for provider {provider}")
+        return factory()
+
+    def error_rate(self, stats: ModelStats, now: Optional[float] = None) -> float:
+        """Error EWMA decayed by the time since it was last updated."""
+        if stats.error_ewma <= 0.0 or self.error_half_life <= 0:
+            return stats.error_ewma
+        elapsed = max(0.0, (now if now is not None else time.monotonic()) - stats.error_updated)
+        return stats.error_ewma * 0.5 ** (elapsed / self.error_half_life)
+
+    def _fold_error(self, stats: ModelStats, outcome: float):
+        """Move the decayed error EWMA towards outcome (1 failure, 0 success); call under the lock."""
+        now = time.monotonic()
+        error = self.error_rate(stats, now)
+        stats.error_ewma = error + self.alpha * (outcome - error)
+        stats.error_updated = now
+
+    def score(self, spec: ModelSpec, units: float) -> float:
+        """Expected seconds for a request of the given size (lower is better)."""
+        stats = self.stats[spec.key]
+        expected = stats.latency_ewma + self.cost_weight * spec.cost * units
+        return expected / max(0.05, 1.0 - self.error_rate(stats))
+
+    def rank(self, task: str, language: Optional[str] = None, units: float = 1.0) -> List[ModelSpec]:
+        """
+        Candidates for a request, best first.
+
+        Args:
+            task: "asr" or "translation"
+            language: Spoken language for ASR, target language for translation
+            units: Request size in the task's cost unit
+
+        Returns:
+            Models that support the language and aren't backing off
+        """
+        now = time.monotonic()
+        candidates = [
+            spec for spec in self.models.values()
+            if spec.task == task and spec.supports(language) and self.stats[spec.key].backoff_until <= now
+        ]
+        return sorted(candidates, key=lambda spec: self.score(spec, units))
+
+    async def call(self,
+                   task: str,
+                   invoke: Callable[[ModelSpec, Any], Any],
+                   language: Optional[str] = None,
+                   units: float = 1.0) -> Tuple[Any, ModelSpec]:
+        """
+        Run a request on the best model, falling back down the ranking.
+
+        Args:
+            task: "asr" or "translation"
+            invoke: Blocking function (spec, client) -> result; run in a thread
+            language: Language used for model eligibility
+            units: Request size in the task's cost unit (minutes, 1k tokens)
+
+        Returns:
+            (result, the model that produced it)
+
+        Raises:
+            RuntimeError: If no model is available or all of them failed
+        """
+        return await asyncio.to_thread(self.call_sync, task, invoke, language, units)
+
+    def call_sync(self,
+                  task: str,
+                  invoke: Callable[[ModelSpec, Any], Any],
+                  language: Optional[str] = None,
+                  units: float = 1.0) -> Tuple[Any, ModelSpec]:
+        """Blocking version of call()."""
+        ranked = self.rank(task, language, units)
+        if not ranked:
+            raise RuntimeError(f"No {task} model available for language {language!r} (all rate limited or unsupported)")
+
+        errors = []
+        for attempt, spec in enumerate(ranked):
+            with self._lock:
+                self.decisions[(task, spec.key)] += 1
+                if attempt:
+                    self.fallbacks += 1
+                self.recent_decisions.append({
+                    "task": task,
+                    "model": spec.key,
+                    "language": language,
+                    "attempt": attempt,
+                    "score": round(self.score(spec, units), 3),
+                    "alternatives": [other.key for other in ranked if other is not spec],
+                    "at": time.time()
+                })
+
+            started = time.perf_counter()
+            try:
+                result = invoke(spec, self.get_client(spec.provider))
+            except Exception as e:
+                self._record_failure(spec, e, time.perf_counter() - started)
+                errors.append(f"{spec.key}: {e}")
+                continue
+
+            self._record_success(spec, time.perf_counter() - started)
+            return result, spec
+
+        raise RuntimeError(f"All {task} models failed ({'; '.join(errors)})")
+
+    def create(self, spec: ModelSpec, resource: Any, **kwargs) -> Any:
+        """
+        Call resource.create(**kwargs) and read the provider's rate-limit headers.
+
+        For use inside invoke functions, e.g.
+        router.create(spec, client.audio.transcriptions, file=f, model=spec.model).
+        """
+        raw_resource = getattr(resource, "with_raw_response", None)
+        if raw_resource is None:
+            return resource.create(**kwargs)
+
+        raw = raw_resource.create(**kwargs)
+        self.observe_headers(spec, raw.headers)
+        return raw.parse()
+
+    def observe_headers(self, spec: ModelSpec, headers: Any):
+        """Back off when the provider says this window's requests are used up."""
+        remaining = headers.get("x-ratelimit-remaining-requests")
+        if remaining is None:
+            return
+        try:
+            remaining = int(remaining)
+        except ValueError:
+            return
+
+        stats = self.stats[spec.key]
+        with self._lock:
+            stats.remaining_requests = remaining
+            if remaining <= 0:
+                reset = parse_reset_duration(headers.get("x-ratelimit-reset-requests")) or self.default_backoff
+                stats.backoff_until = max(stats.backoff_until, time.monotonic() + min(reset, self.max_backoff))
+                print(f"⏳ {spec.key}: request quota used up, pausing for {reset:.1f}s")
+
+    def _record_success(self, spec: ModelSpec, duration: float):
+        stats = self.stats[spec.key]
+        with self._lock:
+            stats.calls += 1
+            stats.consecutive_429 = 0
+            stats.latency_ewma += self.alpha * (duration - stats.latency_ewma)
+            self._fold_error(stats, 0.0)
+
+    def _record_failure(self, spec: ModelSpec, error: Exception, duration: float):
+        stats = self.stats[spec.key]
+        status = getattr(error, "status_code", None)
+        with self._lock:
+            stats.calls += 1
+            stats.errors += 1
+            stats.last_error = str(error)[:200]
+
+            if status == 429:
+                # Rate limiting says nothing about model health; wait out the window instead
+                stats.rate_limited += 1
+                stats.consecutive_429 += 1
+                headers = getattr(getattr(error, "response", None), "headers", None) or {}
+                delay = (parse_reset_duration(headers.get("retry-after"))
+                         or parse_reset_duration(headers.get("x-ratelimit-reset-requests"))
+                         or self.default_backoff * 2 ** (stats.consecutive_429 - 1))
+                stats.backoff_until = time.monotonic() + min(delay, self.max_backoff)
+                print(f"⏳ {spec.key}: rate limited, backing off {min(delay, self.max_backoff):.1f}s")
+                return
+
+            self._fold_error(stats, 1.0)
+            stats.latency_ewma += self.alpha * (max(duration, stats.latency_ewma) - stats.latency_ewma)
+        print(f"⚠️ {spec.key} failed: {error}")
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Routing decisions and per-model health, for the metrics endpoint."""
+        now = time.monotonic()
+        with self._lock:
+            decisions: Dict[str, Dict[str, int]] = {}
+            for (task, key), count in self.decisions.items():
+                decisions.setdefault(task, {})[key] = count
+
+            models = {
+                key: {
+                    "task": spec.task,
+                    "cost_per_unit": spec.cost,
+                    "unit": spec.unit,
+                    "languages": sorted(spec.languages) if spec.languages else "any",
+                    "latency_ewma": round(self.stats[key].latency_ewma, 3),
+                    "error_rate": round(self.error_rate(self.stats[key], now), 3),
+                    "calls": self.stats[key].calls,
+                    "errors": self.stats[key].errors,
+                    "rate_limited": self.stats[key].rate_limited,
+                    "remaining_requests": self.stats[key].remaining_requests,
+                    "backoff_remaining": round(max(0.0, self.stats[key].backoff_until - now), 1)
+                }
+                for key, spec in self.models.items()
+            }
+
+            return {
+                "decisions": decisions,
+                "fallbacks": self.fallbacks,
+                "cost_weight": self.cost_weight,
+                "models": models,
+                "recent_decisions": list(self.recent_decisions)
+            }
+
+def _groq_client():
+    from app.services.groq_client import groq_client
+    return groq_client
+
+def _openai_client():
+    from app.services.stt_service import get_openai_client
+    return get_openai_client()
+
+# Global provider router; ROUTER_DISABLED_MODELS takes comma-separated provider:model keys
+_disabled = {key.strip() for key in os.getenv("ROUTER_DISABLED_MODELS", "").split(",") if key.strip()}
+provider_router = ProviderRouter(
+    [spec for spec in DEFAULT_MODELS if spec.key not in _disabled],
+    cost_weight=float(os.getenv("ROUTER_COST_WEIGHT", "100")),
+    error_half_life=float(os.getenv("ROUTER_ERROR_HALF_LIFE", "300"))
+)
+provider_router.register_client("groq", _groq_client)
+provider_router.register_client("openai", _openai_client)
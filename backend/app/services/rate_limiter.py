@@ -0,0 +1,486 @@
+"""
+Rate limiting
+Token-bucket and sliding-window-log limits per API key and route class,
+and per WebSocket message type, with an in-memory backend for a single
+process and an atomic Redis (Lua) backend shared by all workers.
+"""
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import unquote
+
+PERIOD_SECONDS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+PERIOD_UNITS = {
+    "s": "second", "sec": "second", "secs": "second", "second": "second", "seconds": "second",
+    "m": "minute", "min": "minute", "mins": "minute", "minute": "minute", "minutes": "minute",
+    "h": "hour", "hr": "hour", "hrs": "hour", "hour": "hour", "hours": "hour",
+    "d": "day", "day": "day", "days": "day",
+}
+_PERIOD = re.compile(r"^(\d+(?:\.\d+)?)?\s*([a-z]*)$")
+
+@dataclass
+class RateLimit:
+    """A limit of `limit` requests per `period` seconds."""
+    limit: int
+    period: float
+
+    @classmethod
+    def parse(cls, value: str) -> "RateLimit":
+        """Parse "30/minute", "100/hour", "1/s", "5/10s" or "20/5m" style limits."""
+        count, _, period = value.strip().partition("/")
+        match = _PERIOD.match(period.strip().lower())
+        if not match or match.group(2) not in PERIOD_UNITS or not (match.group(1) or match.group(2)):
+            raise ValueError(f"Invalid rate limit {value!r}")
+        multiple = float(match.group(1) or 1)
+        seconds = multiple * PERIOD_SECONDS[PERIOD_UNITS[match.group(2) or "s"]]
+        if seconds <= 0:
+            raise ValueError(f"Invalid rate limit {value!r}")
+        return cls(limit=int(count), period=seconds)
+
+    @property
+    def rate(self) -> float:
+        """Token refill rate per second."""
+        return self.limit / self.period
+
+@dataclass
+class RateLimitResult:
+    allowed: bool
+    limit: int
+    remaining: int
+    retry_after: float = 0.0
+
+    def headers(self) -> Dict[str, str]:
+        headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining)
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(1, int(self.retry_after + 0.999)))
+        return headers
+
+class RateLimitBackend(ABC):
+    """
+    Interface shared by the rate-limit backends.
+
+    token_bucket allows bursts up to the limit and refills continuously;
+    sliding_window counts the requests of the last period exactly, so
+    there is no window boundary to burst across.
+    """
+
+    @abstractmethod
+    async def hit(self, key: str, rule: RateLimit, algorithm: str) -> RateLimitResult:
+        """Count one request against key and say whether it is allowed."""
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """Per-process limits; fine for a single worker."""
+
+    def __init__(self, sweep_every: int = 10000):
+        self._buckets: Dict[str, List[float]] = {}     # key -> [tokens, updated, period]
+        self._logs: Dict[str, Tuple[deque, float]] = {}  # key -> (timestamps, period)
+        self._lock = threading.Lock()
+        self._sweep_every = sweep_every
+        self._hits = 0
+
+    async def hit(self, key: str, rule: RateLimit, algorithm: str) -> RateLimitResult:
+        now = time.monotonic()
+        with self._lock:
+            self._hits += 1
+            if self._hits % self._sweep_every == 0:
+                self._sweep(now)
+
+            if algorithm == "sliding_window":
+                return self._sliding_window(key, rule, now)
+            return self._token_bucket(key, rule, now)
+
+    def _token_bucket(self, key: str, rule: RateLimit, now: float) -> RateLimitResult:
+        state = self._buckets.get(key)
+        if state is None:
+            state = self._buckets[key] = [float(rule.limit), now, rule.period]
+
+        tokens = min(float(rule.limit), state[0] + (now - state[1]) * rule.rate)
+        state[1] = now
+        if tokens >= 1.0:
+            state[0] = tokens - 1.0
+            return RateLimitResult(True, rule.limit, int(state[0]))
+
+        state[0] = tokens
+        return RateLimitResult(False, rule.limit, 0, (1.0 - tokens) / rule.rate)
+
+    def _sliding_window(self, key: str, rule: RateLimit, now: float) -> RateLimitResult:
+        entry = self._logs.get(key)
+        if entry is None:
+            entry = self._logs[key] = (deque(), rule.period)
+        log = entry[0]
+
+        cutoff = now - rule.period
+        while log and log[0] <= cutoff:
+            log.popleft()
+
+        if len(log) < rule.limit:
+            log.append(now)
+            return RateLimitResult(True, rule.limit, rule.limit - len(log))
+        return RateLimitResult(False, rule.limit, 0, log[0] + rule.period - now)
+
+    def _sweep(self, now: float):
+        """Drop state that has fully recovered, so idle keys don't accumulate."""
+        for key in [key for key, (_, updated, period) in self._buckets.items() if now - updated > period]:
+            del self._buckets[key]
+        for key in [key for key, (log, period) in self._logs.items() if not log or now - log[-1] > period]:
+            del self._logs[key]
+
+# Both scripts read the clock from Redis so all workers agree on time
+TOKEN_BUCKET_LUA = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    retry = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+return {allowed, math.floor(tokens), tostring(retry)}
+"""
+
+SLIDING_WINDOW_LUA = """
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2]) * 1000
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+local count = redis.call('ZCARD', KEYS[1])
+if count < limit then
+    redis.call('ZADD', KEYS[1], now, ARGV[3])
+    redis.call('PEXPIRE', KEYS[1], math.ceil(window))
+    return {1, limit - count - 1, '0'}
+end
+local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+return {0, 0, tostring((tonumber(oldest[2]) + window - now) / 1000)}
+"""
+
+class RedisRateLimitBackend(RateLimitBackend):
+    """
+    Limits shared by every worker through Redis.
+
+    Each check is one Lua script run, so the read-modify-write is atomic
+    without locks or round trips. If Redis is unreachable requests are
+    let through rather than failing the API.
+    """
+
+    def __init__(self, redis_url: str, prefix: str = "ratelimit"):
+        import redis.asyncio as redis
+
+        self.redis = redis.Redis.from_url(redis_url)
+        self.prefix = prefix
+        self._token_bucket = self.redis.register_script(TOKEN_BUCKET_LUA)
+        self._sliding_window = self.redis.register_script(SLIDING_WINDOW_LUA)
+
+    async def hit(self, key: str, rule: RateLimit, algorithm: str) -> RateLimitResult:
+        redis_key = f"{self.prefix}:{algorithm}:{key}"
+        try:
+            if algorithm == "sliding_window":
+                allowed, remaining, retry = await self._sliding_window(
+                    keys=[redis_key], args=[rule.limit, rule.period, uuid.uuid4().hex]
+                )
+            else:
+                allowed, remaining, retry = await self._token_bucket(
+                    keys=[redis_key], args=[rule.limit, rule.rate]
+                )
+        except Exception as e:
+            print(f"⚠️ Rate limit check failed, allowing request: {e}")
+            return RateLimitResult(True, rule.limit, rule.limit)
+
+        return RateLimitResult(bool(allowed), rule.limit, int(remaining), float(retry))
+
+# Route classes in match order. Each entry is (methods or None for any,
+# route template); templates match the whole path, with an optional
+# /api/vN prefix, and {param} matching one path segment.
+ROUTE_CLASSES = [
+    ("exempt", [
+        (None, "/health"),
+        (None, "/docs"),
+        (None, "/docs/oauth2-redirect"),
+        (None, "/redoc"),
+        (None, "/openapi.json"),
+        (None, "/static/{path:path}"),
+    ]),
+    ("batch", [
+        ({"POST"}, "/analyze-text/batch"),
+    ]),
+    ("session", [
+        ({"POST"}, "/session/start"),
+    ]),
+    ("audio", [
+        ({"POST"}, "/transcribe"),
+        ({"POST"}, "/transcribe-and-chat"),
+        ({"POST"}, "/voice-analyze"),
+        ({"POST"}, "/voice/profiles/{profile_id}/samples"),
+        ({"POST"}, "/voice/profiles/{profile_id}/synthesize"),
+        ({"POST"}, "/local-mode/process-audio"),
+        ({"POST"}, "/local-mode/generate-speech"),
+        ({"POST"}, "/sessions/multiparty/{session_id}/audio"),
+    ]),
+]
+
+def _compile_route(template: str) -> "re.Pattern":
+    """Whole-path regex for a route template like /voice/profiles/{profile_id}."""
+    pattern = ""
+    for part in re.split(r"(\{[^}]+\})", template):
+        if part.startswith("{"):
+            pattern += ".*" if part.endswith(":path}") else "[^/]+"
+        else:
+            pattern += re.escape(part)
+    return re.compile(r"^(?:/api/v\d+)?" + pattern + "/?$")
+
+_ROUTE_PATTERNS = [
+    (route_class, [(methods, _compile_route(template)) for methods, template in routes])
+    for route_class, routes in ROUTE_CLASSES
+]
+
+# WebSocket message types grouped into limit classes
+WS_MESSAGE_CLASSES = {
+    "voice_message": "ws_audio",
+    "audio": "ws_audio",
+    "audio_chunk": "ws_audio",
+    "binary": "ws_audio",
+    "text": "ws_text",
+    "text_message": "ws_text",
+    "chat": "ws_text",
+}
+
+DEFAULT_RULES = {
+    "default": "120/minute",
+    "audio": "30/minute",
+    "batch": "10/minute",
+    "session": "100/hour",
+    "websocket": "30/minute",       # connection handshakes
+    "ws_audio": "60/minute",
+    "ws_text": "60/minute",
+    "ws_default": "120/minute",
+}
+
+_MESSAGE_TYPE = re.compile(r'"type"\s*:\s*"([^"]{1,64})"')
+
+class RateLimiter:
+    """
+    Applies the configured limits.
+
+    Requests are keyed by API key (X-API-Key header or api_key query
+    parameter), falling back to the client address, so each key gets its
+    own budget in every route class and WebSocket message class. A key
+    only counts once key_resolver accepts it, and its bucket is named
+    after the resolved key ID; unknown keys share their address's bucket,
+    so sending random keys gains nothing.
+    """
+
+    def __init__(self, backend: RateLimitBackend, rules: Dict[str, RateLimit],
+                 algorithm: str = "token_bucket", enabled: bool = True,
+                 key_resolver: Optional[Callable[[str], Optional[str]]] = None):
+        """
+        Args:
+            key_resolver: Maps a presented API key to a stable key ID, or
+                None if the key is not valid
+        """
+        if algorithm not in ("token_bucket", "sliding_window"):
+            raise ValueError(f"Unknown rate limit algorithm: {algorithm}")
+        self.backend = backend
+        self.key_resolver = key_resolver
+        self.rules = rules
+        self.algorithm = algorithm
+        self.enabled = enabled
+        self.rejected: Dict[str, int] = {}
+
+    @staticmethod
+    def classify(path: str, method: str = "GET") -> str:
+        """Route class of a request."""
+        for route_class, routes in _ROUTE_PATTERNS:
+            for methods, pattern in routes:
+                if (methods is None or method in methods) and pattern.match(path):
+                    return route_class
+        return "default"
+
+    def client_key(self, scope: Dict[str, Any]) -> str:
+        """Who a request counts against: its verified API key, else its address."""
+        presented = None
+        for name, value in scope.get("headers", []):
+            if name == b"x-api-key" and value:
+                presented = value.decode("latin-1")
+                break
+
+        if presented is None:
+            query = scope.get("query_string", b"").decode("latin-1")
+            for part in query.split("&"):
+                name, _, value = part.partition("=")
+                if name == "api_key" and value:
+                    presented = unquote(value)
+                    break
+
+        if presented and self.key_resolver:
+            # Key IDs, never raw keys, end up in bucket (and Redis key) names
+            key_id = self.key_resolver(presented)
+            if key_id:
+                return f"key:{key_id}"
+
+        client = scope.get("client")
+        return f"ip:{client[0]}" if client else "ip:unknown"
+
+    @staticmethod
+    def message_class(message: Dict[str, Any]) -> str:
+        """Limit class of an incoming WebSocket frame."""
+        text = message.get("text")
+        if text is None:
+            return WS_MESSAGE_CLASSES["binary"] if message.get("bytes") is not None else "ws_default"
+        # A regex finds the type without parsing large (base64 audio) payloads
+        match = _MESSAGE_TYPE.search(text)
+        return WS_MESSAGE_CLASSES.get(match.group(1), "ws_default") if match else "ws_default"
+
+    async def check(self, client_key: str, limit_class: str) -> Optional[RateLimitResult]:
+        """
+        Count a request in a limit class.
+
+        Returns:
+            The result, or None if the class is unlimited
+        """
+        rule = self.rules.get(limit_class)
+        if not self.enabled or rule is None:
+            return None
+
+        result = await self.backend.hit(f"{limit_class}:{client_key}", rule, self.algorithm)
+        if not result.allowed:
+            self.rejected[limit_class] = self.rejected.get(limit_class, 0) + 1
+        return result
+
+class RateLimitMiddleware:
+    """
+    ASGI middleware enforcing a RateLimiter.
+
+    HTTP requests over their limit get a 429 JSON response with
+    Retry-After; allowed responses carry X-RateLimit-* headers. A
+    WebSocket handshake over the limit is refused, and a frame over its
+    message-type limit is dropped and answered with an error frame, so
+    the handlers never see it.
+    """
+
+    def __init__(self, app, limiter: "RateLimiter"):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            await self._http(scope, receive, send)
+        elif scope["type"] == "websocket":
+            await self._websocket(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
+
+    async def _http(self, scope, receive, send):
+        client_key = self.limiter.client_key(scope)
+        result = await self.limiter.check(client_key, self.limiter.classify(scope["path"], scope.get("method", "GET")))
+        if result is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not result.allowed:
+            body = json.dumps({
+                "detail": "Rate limit exceeded",
+                "retry_after": round(result.retry_after, 2)
+            }).encode()
+            headers = [(name.lower().encode(), value.encode()) for name, value in result.headers().items()]
+            await send({
+                "type": "http.response.start",
+                "status": 429,
+                "headers": headers + [(b"content-type", b"application/json"),
+                                      (b"content-length", str(len(body)).encode())]
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        limit_headers = [(name.lower().encode(), value.encode()) for name, value in result.headers().items()]
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": list(message.get("headers", [])) + limit_headers}
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+    async def _websocket(self, scope, receive, send):
+        client_key = self.limiter.client_key(scope)
+        result = await self.limiter.check(client_key, "websocket")
+        if result is not None and not result.allowed:
+            # Refuse the handshake (HTTP 403 to the client)
+            await receive()
+            await send({"type": "websocket.close", "code": 1008})
+            return
+
+        async def limited_receive():
+            while True:
+                message = await receive()
+                if message["type"] != "websocket.receive":
+                    return message
+
+                frame_result = await self.limiter.check(client_key, self.limiter.message_class(message))
+                if frame_result is None or frame_result.allowed:
+                    return message
+
+                await send({"type": "websocket.send", "text": json.dumps({
+                    "type": "error",
+                    "message": "Rate limit exceeded",
+                    "retry_after": round(frame_result.retry_after, 2)
+                })})
+
+        await self.app(scope, limited_receive, send)
+
+def create_rate_limiter() -> RateLimiter:
+    """
+    Build the configured limiter.
+
+    RATE_LIMIT_BACKEND selects "memory" (default) or "redis" (REDIS_URL);
+    RATE_LIMIT_ALGORITHM selects "token_bucket" (default) or
+    "sliding_window". Each class's limit can be overridden with
+    RATE_LIMIT_<CLASS>, e.g. RATE_LIMIT_AUDIO="20/minute", or set to
+    "off". RATE_LIMIT_ENABLED=false disables limiting.
+    """
+    rules = {}
+    for limit_class, default in DEFAULT_RULES.items():
+        value = os.getenv(f"RATE_LIMIT_{limit_class.upper()}", default)
+        if value.lower() != "off":
+            rules[limit_class] = RateLimit.parse(value)
+
+    if os.getenv("RATE_LIMIT_BACKEND", "memory").lower() == "redis":
+        backend = RedisRateLimitBackend(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+    else:
+        backend = MemoryRateLimitBackend()
+
+    return RateLimiter(
+        backend,
+        rules,
+        algorithm=os.getenv("RATE_LIMIT_ALGORITHM", "token_bucket").lower(),
+        enabled=os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true",
+        key_resolver=_resolve_key_id
+    )
+
+def _resolve_key_id(raw_key: str) -> Optional[str]:
+    """Key store ID of a valid API key (cached by the store after the first check)."""
+    from modules.auth.key_store import api_key_store
+    record = api_key_store.verify(raw_key)
+    return record.key_id if record else None
+
+# Global rate limiter
+rate_limiter = create_rate_limiter()
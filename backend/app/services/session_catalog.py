@@ -0,0 +1,181 @@
+"""
+Conversation Session Catalog
+Persistent SQLite index of session metadata so listings never read session bodies.
+"""
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Any
+
+class SessionCatalog:
+    """
+    Small SQLite index of conversation session metadata.
+
+    Rows are upserted by ConversationLogger on session start, on every
+    logged entry and on session end, so "recent", "by language" and
+    "by participant count" listings are answered from indexed columns.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._create_schema()
+
+    def _create_schema(self):
+        """Create catalog table and indexes if missing."""
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS sessions (
+                    session_id TEXT PRIMARY KEY,
+                    start_time TEXT NOT NULL,
+                    end_time TEXT,
+                    source_language TEXT NOT NULL,
+                    target_language TEXT NOT NULL,
+                    participant_count INTEGER NOT NULL DEFAULT 0,
+                    total_entries INTEGER NOT NULL DEFAULT 0,
+                    updated_at TEXT NOT NULL
+                )
+            """)
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_sessions_updated ON sessions (updated_at DESC)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_sessions_source_lang ON sessions (source_language, updated_at DESC)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_sessions_target_lang ON sessions (target_language, updated_at DESC)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_sessions_participants ON sessions (participant_count, updated_at DESC)"
+            )
+
+    def upsert_session(self,
+                       session_id: str,
+                       start_time: str,
+                       end_time: Optional[str],
+                       source_language: str,
+                       target_language: str,
+                       participant_count: int,
+                       total_entries: int,
+                       updated_at: Optional[str] = None):
+        """
+        Insert or update the metadata row for a session.
+
+        Args:
+            session_id: Session identifier
+            start_time: ISO start timestamp
+            end_time: ISO end timestamp (None while active)
+            source_language: Source language code
+            target_language: Target language code
+            participant_count: Number of distinct speakers
+            total_entries: Number of logged entries
+            updated_at: ISO timestamp of the change (defaults to now)
+        """
+        row = (
+            session_id, start_time, end_time, source_language, target_language,
+            participant_count, total_entries, updated_at or datetime.now().isoformat()
+        )
+        with self._lock, self._conn:
+            self._conn.execute("""
+                INSERT INTO sessions (session_id, start_time, end_time, source_language,
+                                      target_language, participant_count, total_entries, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(session_id) DO UPDATE SET
+                    end_time = excluded.end_time,
+                    source_language = excluded.source_language,
+                    target_language = excluded.target_language,
+                    participant_count = excluded.participant_count,
+                    total_entries = excluded.total_entries,
+                    updated_at = excluded.updated_at
+            """, row)
+
+    def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Get catalog metadata for a single session."""
+        rows = self._query("SELECT * FROM sessions WHERE session_id = ?", (session_id,))
+        return rows[0] if rows else None
+
+    def recent(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """Sessions ordered by last activity, most recent first."""
+        return self._query(
+            "SELECT * FROM sessions ORDER BY updated_at DESC LIMIT ?", (limit,)
+        )
+
+    def by_language(self, language: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Recent sessions whose source or target language matches."""
+        return self._query("""
+            SELECT * FROM sessions WHERE source_language = ?
+            UNION
+            SELECT * FROM sessions WHERE target_language = ?
+            ORDER BY updated_at DESC LIMIT ?
+        """, (language, language, limit))
+
+    def by_participant_count(self,
+                             min_participants: int = 0,
+                             max_participants: Optional[int] = None,
+                             limit: int = 10) -> List[Dict[str, Any]]:
+        """Recent sessions with a participant count inside the given range."""
+        if max_participants is None:
+            return self._query("""
+                SELECT * FROM sessions WHERE participant_count >= ?
+                ORDER BY updated_at DESC LIMIT ?
+            """, (min_participants, limit))
+
+        return self._query("""
+            SELECT * FROM sessions WHERE participant_count BETWEEN ? AND ?
+            ORDER BY updated_at DESC LIMIT ?
+        """, (min_participants, max_participants, limit))
+
+    def count(self) -> int:
+        """Number of catalogued sessions."""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def rebuild_from_logs(self, logs_dir: str) -> int:
+        """
+        One-off backfill of the catalog from existing session JSON files.
+
+        Only used when the catalog is created next to pre-existing logs.
+
+        Args:
+            logs_dir: Directory containing session_*.json files
+
+        Returns:
+            Number of sessions catalogued
+        """
+        rows = []
+        for filename in os.listdir(logs_dir):
+            if not (filename.endswith('.json') and filename.startswith('session_')):
+                continue
+
+            file_path = os.path.join(logs_dir, filename)
+            try:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                updated_at = datetime.fromtimestamp(os.path.getmtime(file_path)).isoformat()
+                rows.append((
+                    data['session_id'], data['start_time'], data.get('end_time'),
+                    data['source_language'], data['target_language'],
+                    data.get('participant_count', 0), data.get('total_entries', 0),
+                    updated_at
+                ))
+            except Exception as e:
+                print(f"Error cataloguing {filename}: {e}")
+
+        with self._lock, self._conn:
+            self._conn.executemany("""
+                INSERT OR REPLACE INTO sessions (session_id, start_time, end_time, source_language,
+                                                 target_language, participant_count, total_entries, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+
+        return len(rows)
+
+    def _query(self, sql: str, params: tuple) -> List[Dict[str, Any]]:
+        """Run a read query and return rows as dicts."""
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            return [dict(row) for row in cursor.fetchall()]
@@ -4,12 +4,16 @@ Handles WebSocket connections for bi-directional audio/text streaming.
 """
 import asyncio
 import json
+import os
 import time
 from typing import Dict, Optional, List, Any
 from dataclasses import dataclass, asdict
 from enum import Enum
 import numpy as np
 
+from app.services.compact import intern_code
+from app.services.expiry import expiry_scheduler
+
 class MessageType(Enum):
     """WebSocket message types."""
     START = "start"
@@ -23,7 +27,7 @@ class MessageType(Enum):
     TTS_AUDIO_CHUNK = "tts_audio_chunk"
     ERROR = "error"
 
-@dataclass
+@dataclass(slots=True)
 class AudioChunk:
     """Audio chunk with metadata."""
     data: bytes
@@ -32,9 +36,9 @@ class AudioChunk:
     sample_rate: int = 16000
     channels: int = 1
 
-@dataclass
+@dataclass(slots=True)
 class StreamSession:
-    """Active streaming session."""
+    """Active streaming session. Audio chunks live in the manager's AudioBuffer."""
     session_id: str
     user_id: Optional[str]
     source_lang: str
@@ -43,10 +47,13 @@ class StreamSession:
     voice_profile_id: Optional[str]
     created_at: float
     last_activity: float
-    audio_buffer: List[AudioChunk]
     partial_text: str
     final_text: str
     sequence_counter: int
+    
+    def __post_init__(self):
+        self.source_lang = intern_code(self.source_lang)
+        self.target_lang = intern_code(self.target_lang)
 
 class AudioBuffer:
     """Buffer for managing audio chunks with VAD and reordering."""
@@ -58,7 +65,10 @@ class AudioBuffer:
         self.vad_threshold = 0.01  # Voice Activity Detection threshold
         
     def add_chunk(self, chunk: AudioChunk) -> bool:
-        """Add audio chunk to buffer."""
+        """Add audio chunk to buffer; chunks at or behind the processed sequence are dropped."""
+        if chunk.sequence <= self.last_processed_seq:
+            return False
+        
         if len(self.chunks) >= self.max_size:
             # Remove oldest chunks
             old_seqs = sorted(self.chunks.keys())[:10]
@@ -80,6 +90,14 @@ class AudioBuffer:
             
         return chunks
     
+    def skip_gap(self) -> bool:
+        """Give up on the missing sequence numbers before the lowest buffered chunk."""
+        if not self.chunks:
+            return False
+        
+        self.last_processed_seq = min(self.chunks) - 1
+        return True
+    
     def detect_voice_activity(self, audio_data: bytes) -> bool:
         """Simple VAD based on audio energy."""
         try:
@@ -228,6 +246,11 @@ class StreamingManager:
         self.translator = TranslationRouter()
         self.tts_streamer = TTSStreamer()
         
+        # Idle sessions end after STREAM_SESSION_TTL; a missing sequence number
+        # is skipped once buffered chunks have waited STREAM_BUFFER_TTL for it
+        expiry_scheduler.register("stream_session", float(os.getenv("STREAM_SESSION_TTL", "3600")), self._expire_session)
+        expiry_scheduler.register("audio_buffer", float(os.getenv("STREAM_BUFFER_TTL", "120")), self._expire_buffer)
+        
     def create_session(self, 
                       session_id: str,
                       user_id: Optional[str] = None,
@@ -245,7 +268,6 @@ class StreamingManager:
             voice_profile_id=voice_profile_id,
             created_at=time.time(),
             last_activity=time.time(),
-            audio_buffer=[],
             partial_text="",
             final_text="",
             sequence_counter=0
@@ -253,6 +275,7 @@ class StreamingManager:
         
         self.active_sessions[session_id] = session
         self.audio_buffers[session_id] = AudioBuffer()
+        expiry_scheduler.touch("stream_session", session_id)
         
         return session
     
@@ -264,6 +287,7 @@ class StreamingManager:
         """Update session last activity timestamp."""
         if session_id in self.active_sessions:
             self.active_sessions[session_id].last_activity = time.time()
+            expiry_scheduler.touch("stream_session", session_id)
     
     async def process_audio_chunk(self, 
                                 session_id: str, 
@@ -282,10 +306,19 @@ class StreamingManager:
         )
         
         buffer = self.audio_buffers[session_id]
+        had_gap = bool(buffer.chunks)
         buffer.add_chunk(chunk)
         
         # Process available chunks
         ready_chunks = buffer.get_next_chunks()
+        
+        # The buffer deadline is the age of the gap at the head of the
+        # buffer: armed when a gap opens or moves, never by more chunks
+        # arriving behind the same gap
+        if not buffer.chunks:
+            expiry_scheduler.cancel("audio_buffer", session_id)
+        elif ready_chunks or not had_gap:
+            expiry_scheduler.touch("audio_buffer", session_id)
         results = []
         
         for chunk in ready_chunks:
@@ -364,19 +397,25 @@ class StreamingManager:
             
         if session_id in self.audio_buffers:
             del self.audio_buffers[session_id]
-            
+        
+        expiry_scheduler.cancel("stream_session", session_id)
+        expiry_scheduler.cancel("audio_buffer", session_id)
         return True
     
-    def cleanup_expired_sessions(self, timeout_seconds: int = 3600):
-        """Clean up expired sessions."""
-        current_time = time.time()
-        expired_sessions = [
-            sid for sid, session in self.active_sessions.items()
-            if current_time - session.last_activity > timeout_seconds
-        ]
-        
-        for session_id in expired_sessions:
-            self.end_session(session_id)
+    def _expire_session(self, session_id: str):
+        """Expiry callback: end a session that has been idle for its TTL."""
+        self.end_session(session_id)
+    
+    def _expire_buffer(self, session_id: str):
+        """
+        Expiry callback: skip a sequence number that never arrived.
+
+        The buffered chunks after the gap are processed with the next
+        chunk the client sends.
+        """
+        buffer = self.audio_buffers.get(session_id)
+        if buffer:
+            buffer.skip_gap()
 
 # Global streaming manager instance
 streaming_manager = StreamingManager()
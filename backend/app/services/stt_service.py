@@ -1,13 +1,16 @@
 """
-Speech-to-Text service using OpenAI Whisper model.
+Speech-to-Text service using cloud Whisper models.
+The model and provider are picked per request by the provider router.
 Handles audio file transcription with proper error handling.
 """
 import asyncio
+import io
 import logging
 from typing import Optional
 from fastapi import UploadFile
 from openai import OpenAI
 from app.config import settings
+from app.services.provider_router import provider_router, estimate_audio_minutes
 
 # Initialize OpenAI client
 openai_client = None
@@ -21,6 +24,17 @@ def get_openai_client():
         openai_client = OpenAI(api_key=settings.OPENAI_API_KEY)
     return openai_client
 
+def _whisper_invoke(file_content: bytes, filename: str, language: Optional[str] = None):
+    """Build the router invoke function for one Whisper transcription."""
+    def invoke(spec, client):
+        file_obj = io.BytesIO(file_content)
+        file_obj.name = filename
+        params = {"file": file_obj, "model": spec.model, "response_format": "json"}
+        if language and language != "auto":
+            params["language"] = language
+        return provider_router.create(spec, client.audio.transcriptions, **params)
+    return invoke
+
 def is_audio_file(filename: str) -> bool:
     """
     Validate if uploaded file is an audio file.
@@ -37,7 +51,7 @@ def is_audio_file(filename: str) -> bool:
 
 async def transcribe_audio(file: UploadFile) -> dict:
     """
-    Transcribe audio file using OpenAI Whisper model.
+    Transcribe audio file with the best available Whisper model.
     
     Args:
         file: Uploaded audio file
@@ -49,12 +63,6 @@ async def transcribe_audio(file: UploadFile) -> dict:
         ValueError: If file type is not supported
         Exception: For other transcription errors
     """
-    # Get OpenAI client
-    try:
-        client = get_openai_client()
-    except Exception as e:
-        raise Exception(f"OpenAI client initialization failed: {str(e)}")
-    
     # Validate file type
     if not is_audio_file(file.filename):
         raise ValueError(
@@ -72,41 +80,31 @@ async def transcribe_audio(file: UploadFile) -> dict:
         # Reset file pointer again after reading
         await file.seek(0)
         
-        # Use OpenAI Whisper API for transcription
-        print(f"Transcribing audio using OpenAI Whisper model: {settings.DEFAULT_WHISPER_MODEL}")
-        
-        # Create a temporary file-like object for OpenAI API
-        file.file.seek(0)
-        
         # Ensure the file has proper content
         if len(file_content) < 100:  # Very small files might be invalid
             raise Exception(f"Audio file too small ({len(file_content)} bytes). Please ensure you're recording actual audio.")
         
-        print(f"Calling OpenAI Whisper API with {len(file_content)} bytes of audio data...")
-        
-        # Create a proper file object for OpenAI API
-        import io
-        file_obj = io.BytesIO(file_content)
-        file_obj.name = file.filename
+        print(f"Transcribing {len(file_content)} bytes of audio data...")
         
-        # Call OpenAI Whisper API
-        transcription = client.audio.transcriptions.create(
-            file=file_obj,
-            model=settings.DEFAULT_WHISPER_MODEL,
-            response_format="text"
+        # The router picks the model and runs the call off the event loop
+        transcription, spec = await provider_router.call(
+            "asr",
+            _whisper_invoke(file_content, file.filename),
+            units=estimate_audio_minutes(file_content)
         )
         
         # Extract text from response
-        text = str(transcription).strip()
+        text = transcription.text.strip()
         
         if not text:
-            raise Exception("No transcription text received from OpenAI Whisper")
+            raise Exception(f"No transcription text received from {spec.key}")
         
         print(f"Transcription successful: '{text[:100]}{'...' if len(text) > 100 else ''}'")
         
         return {
             "status": "success",
-            "model": settings.DEFAULT_WHISPER_MODEL,
+            "model": spec.model,
+            "provider": spec.provider,
             "transcription": text
         }
         
@@ -125,12 +123,6 @@ async def transcribe_audio_with_language(file: UploadFile, language: str = "auto
     Returns:
         dict: Transcription result with language info
     """
-    # Get OpenAI client
-    try:
-        client = get_openai_client()
-    except Exception as e:
-        raise Exception(f"OpenAI client initialization failed: {str(e)}")
-    
     # Validate file type
     if not is_audio_file(file.filename):
         raise ValueError(
@@ -152,30 +144,20 @@ async def transcribe_audio_with_language(file: UploadFile, language: str = "auto
         if len(file_content) < 100:  # Very small files might be invalid
             raise Exception(f"Audio file too small ({len(file_content)} bytes). Please ensure you're recording actual audio.")
         
-        print(f"Calling OpenAI Whisper API with {len(file_content)} bytes of audio data...")
-        
-        # Prepare parameters for OpenAI Whisper API
-        params = {
-            "file": file.file,
-            "model": settings.DEFAULT_WHISPER_MODEL,
-            "response_format": "json"
-        }
+        print(f"Transcribing {len(file_content)} bytes of audio data...")
         
-        # Add language parameter if specified and not auto
         if language and language != "auto":
-            params["language"] = language
             print(f"Transcribing with language: {language}")
         else:
             print("Transcribing with auto language detection")
         
-        # Create a proper file object for OpenAI API
-        import io
-        file_obj = io.BytesIO(file_content)
-        file_obj.name = file.filename
-        params["file"] = file_obj
-        
-        # Call OpenAI Whisper API
-        transcription = client.audio.transcriptions.create(**params)
+        # The router picks a model that supports the language and runs the call off the event loop
+        transcription, spec = await provider_router.call(
+            "asr",
+            _whisper_invoke(file_content, file.filename, language),
+            language=language,
+            units=estimate_audio_minutes(file_content)
+        )
         
         # Extract text and language from response
         if hasattr(transcription, 'text'):
@@ -187,13 +169,14 @@ async def transcribe_audio_with_language(file: UploadFile, language: str = "auto
             detected_language = language if language != "auto" else "unknown"
         
         if not text:
-            raise Exception("No transcription text received from OpenAI Whisper")
+            raise Exception(f"No transcription text received from {spec.key}")
         
         print(f"Transcription successful: '{text[:100]}{'...' if len(text) > 100 else ''}' (Language: {detected_language})")
         
         return {
             "status": "success",
-            "model": settings.DEFAULT_WHISPER_MODEL,
+            "model": spec.model,
+            "provider": spec.provider,
             "transcription": text,
             "language": detected_language,
             "requested_language": language
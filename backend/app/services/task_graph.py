@@ -0,0 +1,93 @@
+"""
+Task graph executor
+Runs a small DAG of async steps concurrently, each step starting as soon
+as its dependencies finish, and records per-step timings.
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+@dataclass
+class GraphNode:
+    """One step of a TaskGraph."""
+    name: str
+    func: Callable[..., Awaitable[Any]]
+    deps: Tuple[str, ...] = field(default_factory=tuple)
+
+class TaskGraph:
+    """
+    Minimal DAG executor for request-scoped pipelines.
+
+    Each node is an async function called with its dependencies' results
+    as positional arguments, in the order the dependencies were declared.
+    Nodes are started together and each awaits only its own dependencies,
+    so independent branches overlap. CPU-bound steps should hand their
+    work to a thread or process pool inside the node.
+    """
+
+    def __init__(self):
+        self.nodes: Dict[str, GraphNode] = {}
+
+    def add(self, name: str, func: Callable[..., Awaitable[Any]], deps: List[str] = ()) -> "TaskGraph":
+        """
+        Add a node.
+
+        Args:
+            name: Unique node name
+            func: Async function taking the dependency results
+            deps: Names of nodes that must finish first (already added)
+
+        Returns:
+            The graph, for chaining
+        """
+        if name in self.nodes:
+            raise ValueError(f"Duplicate graph node: {name}")
+        missing = [dep for dep in deps if dep not in self.nodes]
+        if missing:
+            raise ValueError(f"Unknown dependencies for {name}: {missing}")
+
+        self.nodes[name] = GraphNode(name=name, func=func, deps=tuple(deps))
+        return self
+
+    async def run(self) -> Tuple[Dict[str, Any], Dict[str, Dict[str, float]]]:
+        """
+        Execute the graph.
+
+        If a node raises, every unfinished node is cancelled and the
+        exception propagates.
+
+        Returns:
+            (results by node name, timings by node name with start_ms and
+            duration_ms measured from the start of the run)
+        """
+        started = time.perf_counter()
+        tasks: Dict[str, asyncio.Task] = {}
+        timings: Dict[str, Dict[str, float]] = {}
+
+        async def run_node(node: GraphNode) -> Any:
+            args = [await tasks[dep] for dep in node.deps]
+            node_started = time.perf_counter()
+            try:
+                return await node.func(*args)
+            finally:
+                timings[node.name] = {
+                    "start_ms": round((node_started - started) * 1000, 2),
+                    "duration_ms": round((time.perf_counter() - node_started) * 1000, 2)
+                }
+
+        # Nodes can only depend on earlier nodes, so insertion order is a topological order
+        for node in self.nodes.values():
+            tasks[node.name] = asyncio.create_task(run_node(node))
+
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+
+        results = {name: task.result() for name, task in tasks.items()}
+        timings["total"] = {"start_ms": 0.0, "duration_ms": round((time.perf_counter() - started) * 1000, 2)}
+        return results, timings
@@ -0,0 +1,209 @@
+"""
+Voice sample analysis for Phase 5A
+Decodes uploaded samples and measures duration, SNR, clipping and pitch,
+and computes a fixed-length speaker embedding.
+"""
+import asyncio
+import hashlib
+import io
+import json
+import os
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, Any, Optional
+
+import numpy as np
+
+ANALYSIS_SAMPLE_RATE = 16000
+N_MFCC = 20
+FRAME_LENGTH = 2048
+HOP_LENGTH = 512
+# MFCC mean + std + delta mean, then pitch/voicing statistics
+EMBEDDING_DIM = 3 * N_MFCC + 4
+
+def decode_audio(file_content: bytes) -> tuple:
+    """
+    Decode audio bytes to mono float32.
+
+    soundfile handles WAV/FLAC/OGG (and MP3 with libsndfile >= 1.1);
+    other containers such as M4A fall back to librosa's audioread loader.
+    audioread's ffmpeg and GStreamer backends only open files, so the
+    bytes are written to a temporary file for that path.
+
+    Returns:
+        (samples, sample_rate, clipping_ratio)
+    """
+    try:
+        import soundfile as sf
+
+        audio, sample_rate = sf.read(io.BytesIO(file_content), dtype="float32", always_2d=True)
+    except Exception:
+        import librosa
+
+        with tempfile.NamedTemporaryFile(suffix=".audio", delete=False) as handle:
+            handle.write(file_content)
+            temp_path = handle.name
+        try:
+            audio, sample_rate = librosa.load(temp_path, sr=None, mono=False)
+        finally:
+            os.unlink(temp_path)
+        audio = np.atleast_2d(audio).T
+
+    clipping_ratio = float(np.mean(np.abs(audio) >= 0.999)) if audio.size else 0.0
+    return audio.mean(axis=1), int(sample_rate), clipping_ratio
+
+def analyze_audio(file_content: bytes) -> Dict[str, Any]:
+    """
+    Full analysis of one sample. CPU-bound; run it in SampleAnalyzer's pool.
+
+    Args:
+        file_content: Raw uploaded file bytes
+
+    Returns:
+        Measurements, quality score and the L2-normalized speaker embedding
+    """
+    import librosa
+    import soxr
+
+    audio, sample_rate, clipping_ratio = decode_audio(file_content)
+    if sample_rate != ANALYSIS_SAMPLE_RATE:
+        audio = soxr.resample(audio, sample_rate, ANALYSIS_SAMPLE_RATE)
+    audio = np.ascontiguousarray(audio, dtype=np.float32)
+
+    if len(audio) < FRAME_LENGTH:
+        raise ValueError("Audio sample is too short to analyze")
+
+    # Frame energy: noise floor and speech level from the quiet and loud ends
+    rms = librosa.feature.rms(y=audio, frame_length=FRAME_LENGTH, hop_length=HOP_LENGTH)[0]
+    noise_level = max(float(np.percentile(rms, 10)), 1e-6)
+    speech_level = max(float(np.percentile(rms, 90)), 1e-6)
+    snr_db = 20 * np.log10(speech_level / noise_level)
+    voiced = rms > max(2 * noise_level, 0.01 * speech_level)
+
+    mfcc = librosa.feature.mfcc(y=audio, sr=ANALYSIS_SAMPLE_RATE, n_mfcc=N_MFCC,
+                                n_fft=FRAME_LENGTH, hop_length=HOP_LENGTH)
+    delta = librosa.feature.delta(mfcc)
+
+    f0 = librosa.yin(audio, fmin=65, fmax=400, sr=ANALYSIS_SAMPLE_RATE,
+                     frame_length=FRAME_LENGTH, hop_length=HOP_LENGTH)
+    frame_count = min(len(f0), len(voiced), mfcc.shape[1])
+    voiced = voiced[:frame_count]
+    voiced_f0 = f0[:frame_count][voiced]
+
+    voiced_ratio = float(voiced.mean())
+    pitch_mean = float(voiced_f0.mean()) if len(voiced_f0) else 0.0
+    pitch_std = float(voiced_f0.std()) if len(voiced_f0) else 0.0
+
+    # Speaker embedding from voiced frames only
+    frames = mfcc[:, :frame_count][:, voiced] if voiced.any() else mfcc
+    frame_deltas = delta[:, :frame_count][:, voiced] if voiced.any() else delta
+    embedding = np.concatenate([
+        frames.mean(axis=1),
+        frames.std(axis=1),
+        frame_deltas.mean(axis=1),
+        [np.log1p(pitch_mean), np.log1p(pitch_std), voiced_ratio, snr_db / 60.0]
+    ]).astype(np.float32)
+    embedding /= max(float(np.linalg.norm(embedding)), 1e-9)
+
+    quality_score = (
+        0.6 * float(np.clip((snr_db - 5) / 25, 0, 1))
+        + 0.2 * (1 - min(clipping_ratio * 100, 1.0))
+        + 0.2 * float(np.clip(voiced_ratio / 0.5, 0, 1))
+    )
+
+    return {
+        "duration": len(audio) / ANALYSIS_SAMPLE_RATE,
+        "sample_rate": sample_rate,
+        "snr_db": round(float(snr_db), 2),
+        "clipping_ratio": round(clipping_ratio, 5),
+        "voiced_ratio": round(voiced_ratio, 3),
+        "pitch_mean_hz": round(pitch_mean, 1),
+        "pitch_std_hz": round(pitch_std, 1),
+        "quality_score": round(quality_score, 3),
+        "embedding": embedding
+    }
+
+class SampleAnalyzer:
+    """
+    Runs analyze_audio off the event loop and caches results by content hash.
+
+    Results are kept in a small in-memory LRU and on disk as
+    <hash>.analysis.json plus a <hash>.embedding.npy embedding, so an
+    identical upload is never analyzed twice.
+    """
+
+    def __init__(self, cache_dir: str, use_processes: bool = True, max_workers: int = 2,
+                 memory_cache_size: int = 256):
+        self.cache_dir = cache_dir
+        self.use_processes = use_processes
+        self.max_workers = max_workers
+        self.memory_cache_size = memory_cache_size
+        self._cache: OrderedDict = OrderedDict()
+        self._executor: Optional[Executor] = None
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _get_executor(self) -> Executor:
+        """Lazily create the analysis pool."""
+        if self._executor is None:
+            pool_class = ProcessPoolExecutor if self.use_processes else ThreadPoolExecutor
+            self._executor = pool_class(max_workers=self.max_workers)
+        return self._executor
+
+    def embedding_path(self, content_hash: str) -> str:
+        """Path of the stored embedding for a sample hash."""
+        return os.path.join(self.cache_dir, f"{content_hash}.embedding.npy")
+
+    def _load_cached(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        """Look up a previous analysis in memory, then on disk."""
+        if content_hash in self._cache:
+            self._cache.move_to_end(content_hash)
+            return self._cache[content_hash]
+
+        analysis_path = os.path.join(self.cache_dir, f"{content_hash}.analysis.json")
+        if not os.path.exists(analysis_path) or not os.path.exists(self.embedding_path(content_hash)):
+            return None
+
+        with open(analysis_path, 'r') as f:
+            analysis = json.load(f)
+        self._remember(content_hash, analysis)
+        return analysis
+
+    def _remember(self, content_hash: str, analysis: Dict[str, Any]):
+        """Add to the in-memory LRU."""
+        self._cache[content_hash] = analysis
+        self._cache.move_to_end(content_hash)
+        while len(self._cache) > self.memory_cache_size:
+            self._cache.popitem(last=False)
+
+    async def analyze(self, file_content: bytes) -> Dict[str, Any]:
+        """
+        Analyze a sample, reusing the cached result for identical content.
+
+        Returns:
+            Analysis dict with "content_hash" and "embedding_path" instead of
+            the raw embedding
+        """
+        content_hash = hashlib.sha256(file_content).hexdigest()
+        cached = self._load_cached(content_hash)
+        if cached:
+            return cached
+
+        loop = asyncio.get_running_loop()
+        analysis = await loop.run_in_executor(self._get_executor(), analyze_audio, file_content)
+
+        np.save(self.embedding_path(content_hash), analysis.pop("embedding"))
+        analysis["content_hash"] = content_hash
+        analysis["embedding_path"] = self.embedding_path(content_hash)
+
+        with open(os.path.join(self.cache_dir, f"{content_hash}.analysis.json"), 'w') as f:
+            json.dump(analysis, f)
+
+        self._remember(content_hash, analysis)
+        return analysis
+
+    def shutdown(self):
+        """Stop the analysis pool."""
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
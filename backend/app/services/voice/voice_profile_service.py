@@ -11,6 +11,14 @@ from dataclasses import dataclass, asdict
 from datetime import datetime
 import asyncio
 
+from .sample_analysis import SampleAnalyzer
+from ...workers.job_queue import job_queue
+from ...workers.voice_training_worker import voice_training_worker, training_progress
+
+MIN_SAMPLE_SECONDS = 30
+MAX_SAMPLE_SECONDS = 300
+MAX_SAMPLE_BYTES = 50 * 1024 * 1024
+
 @dataclass
 class VoiceProfile:
     """Voice profile data structure."""
@@ -37,6 +45,8 @@ class VoiceSample:
     sample_rate: int
     quality_score: float
     uploaded_at: str
+    snr_db: Optional[float] = None
+    embedding_path: Optional[str] = None
 
 class VoiceProfileManager:
     """Manages voice profiles and training pipeline."""
@@ -45,7 +55,14 @@ class VoiceProfileManager:
         self.storage_path = storage_path
         self.profiles: Dict[str, VoiceProfile] = {}
         self.samples: Dict[str, VoiceSample] = {}
+        # Secondary indexes: user_id -> profile ids, profile_id -> sample ids
+        self._user_profiles: Dict[str, List[str]] = {}
+        self._profile_samples: Dict[str, List[str]] = {}
         self._ensure_storage_directory()
+        self.analyzer = SampleAnalyzer(
+            os.path.join(storage_path, "samples"),
+            max_workers=int(os.getenv("SAMPLE_ANALYSIS_PROCESSES", "2"))
+        )
         self._load_existing_profiles()
     
     def _ensure_storage_directory(self):
@@ -64,6 +81,7 @@ class VoiceProfileManager:
                     for profile_data in data.get("profiles", []):
                         profile = VoiceProfile(**profile_data)
                         self.profiles[profile.profile_id] = profile
+                        self._user_profiles.setdefault(profile.user_id, []).append(profile.profile_id)
             except Exception as e:
                 print(f"Error loading voice profiles: {e}")
     
@@ -101,6 +119,7 @@ class VoiceProfileManager:
         )
         
         self.profiles[profile_id] = profile
+        self._user_profiles.setdefault(user_id, []).append(profile_id)
         self._save_profiles()
         
         return profile_id
@@ -120,31 +139,30 @@ class VoiceProfileManager:
                     "error": f"Unsupported file format. Supported: {valid_extensions}"
                 }
             
-            # Check file size (30-60 seconds worth of audio)
-            min_size = 480000  # ~30 seconds of 16kHz 16-bit mono
-            max_size = 4800000  # ~5 minutes max
+            if len(file_content) > MAX_SAMPLE_BYTES:
+                return {
+                    "valid": False,
+                    "error": "Audio file too large. Maximum 50 MB allowed."
+                }
+            
+            # Decode and analyze in the analysis pool (cached by content hash)
+            analysis = await self.analyzer.analyze(file_content)
             
-            if len(file_content) < min_size:
+            if analysis["duration"] < MIN_SAMPLE_SECONDS:
                 return {
                     "valid": False,
                     "error": "Audio sample too short. Minimum 30 seconds required."
                 }
             
-            if len(file_content) > max_size:
+            if analysis["duration"] > MAX_SAMPLE_SECONDS:
                 return {
                     "valid": False,
                     "error": "Audio sample too long. Maximum 5 minutes allowed."
                 }
             
-            # Mock audio analysis (replace with actual audio processing)
-            estimated_duration = len(file_content) / 16000 / 2  # Rough estimate
-            quality_score = 0.85  # Mock quality score
-            
             return {
                 "valid": True,
-                "duration": estimated_duration,
-                "quality_score": quality_score,
-                "sample_rate": 16000,  # Mock sample rate
+                **analysis,
                 "format": file_ext
             }
             
@@ -190,10 +208,13 @@ class VoiceProfileManager:
                 duration_seconds=validation_result["duration"],
                 sample_rate=validation_result["sample_rate"],
                 quality_score=validation_result["quality_score"],
-                uploaded_at=datetime.now().isoformat()
+                uploaded_at=datetime.now().isoformat(),
+                snr_db=validation_result["snr_db"],
+                embedding_path=validation_result["embedding_path"]
             )
             
             self.samples[sample_id] = sample
+            self._profile_samples.setdefault(profile_id, []).append(sample_id)
             
             # Update profile
             profile = self.profiles[profile_id]
@@ -218,50 +239,89 @@ class VoiceProfileManager:
             return {"success": False, "error": f"Error saving sample: {str(e)}"}
     
     async def _queue_training_job(self, profile_id: str):
-        """Queue voice training job (stub for Phase 5A)."""
+        """Queue a durable training job for the voice training worker pool."""
         if profile_id not in self.profiles:
             return
         
         profile = self.profiles[profile_id]
+        sample_paths = [
+            os.path.abspath(sample.file_path) for sample in self.get_profile_samples(profile_id)
+        ]
+        model_path = os.path.abspath(
+            os.path.join(self.storage_path, "models", f"{profile_id}_voice_model.npy")
+        )
+        
+        job_id = await voice_training_worker.queue_training_job(profile_id, sample_paths, model_path)
+        
         profile.status = "processing"
         profile.training_progress = 0.1
         profile.updated_at = datetime.now().isoformat()
-        
-        # In Phase 5B, this would integrate with actual training workers
-        # For now, just simulate training progress
-        import asyncio
-        asyncio.create_task(self._simulate_training(profile_id))
+        profile.metadata = {**(profile.metadata or {}), "training_job_id": job_id}
     
-    async def _simulate_training(self, profile_id: str):
-        """Simulate voice training progress."""
-        if profile_id not in self.profiles:
+    def _sync_training_job(self, profile: VoiceProfile):
+        """Apply the durable training job's progress and outcome to a processing profile."""
+        job_id = (profile.metadata or {}).get("training_job_id")
+        if profile.status != "processing" or not job_id:
             return
         
-        profile = self.profiles[profile_id]
+        job = job_queue.get(job_id)
+        if not job:
+            return
         
-        # Simulate training progress over time
-        progress_steps = [0.1, 0.3, 0.5, 0.7, 0.9, 1.0]
+        if job["status"] == "completed":
+            self._apply_training_event(profile, {"status": "ready", "progress": 1.0})
+        elif job["status"] in ["dead", "cancelled"]:
+            self._apply_training_event(profile, {
+                "status": "failed", "progress": profile.training_progress, "error": job.get("error")
+            })
+        elif job["progress"] > profile.training_progress:
+            profile.training_progress = job["progress"]
+    
+    def _apply_training_event(self, profile: VoiceProfile, event: Dict[str, Any]):
+        """Update a profile from a training progress event."""
+        profile.training_progress = event["progress"]
+        profile.updated_at = datetime.now().isoformat()
         
-        for progress in progress_steps:
-            await asyncio.sleep(10)  # Wait 10 seconds between updates
-            
-            if profile_id not in self.profiles:  # Profile might be deleted
-                return
-            
-            profile.training_progress = progress
-            profile.updated_at = datetime.now().isoformat()
-            
-            if progress >= 1.0:
-                profile.status = "ready"
-                profile.model_path = f"models/{profile_id}_voice_model.bin"
-                
-                # Create mock model file
-                model_path = os.path.join(self.storage_path, "models", f"{profile_id}_voice_model.bin")
-                with open(model_path, 'wb') as f:
-                    f.write(b"Mock voice model data")
-            
+        if event["status"] == "ready":
+            profile.status = "ready"
+            profile.model_path = f"models/{profile.profile_id}_voice_model.npy"
+            self._save_profiles()
+        elif event["status"] == "failed":
+            profile.status = "failed"
+            profile.metadata = {**(profile.metadata or {}), "training_error": event.get("error")}
             self._save_profiles()
     
+    async def watch_training(self, profile_id: str, poll_interval: float = 2.0):
+        """
+        Yield training status updates for a profile until training finishes.
+        
+        Progress from training in this process is pushed immediately; jobs
+        running in a separate worker process are picked up from the durable
+        queue every poll_interval seconds.
+        """
+        events = training_progress.subscribe(profile_id)
+        last_status = None
+        
+        try:
+            while True:
+                status = self.get_training_status(profile_id)
+                if status != last_status:
+                    yield status
+                    last_status = status
+                
+                if "error" in status or status["status"] in ["ready", "failed"]:
+                    return
+                
+                try:
+                    event = await asyncio.wait_for(events.get(), timeout=poll_interval)
+                    profile = self.get_voice_profile(profile_id)
+                    if profile:
+                        self._apply_training_event(profile, event)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            training_progress.unsubscribe(profile_id, events)
+    
     def get_voice_profile(self, profile_id: str) -> Optional[VoiceProfile]:
         """Get voice profile by ID."""
         return self.profiles.get(profile_id)
@@ -269,15 +329,15 @@ class VoiceProfileManager:
     def get_user_profiles(self, user_id: str) -> List[VoiceProfile]:
         """Get all voice profiles for a user."""
         return [
-            profile for profile in self.profiles.values()
-            if profile.user_id == user_id
+            self.profiles[profile_id]
+            for profile_id in self._user_profiles.get(user_id, [])
         ]
     
     def get_profile_samples(self, profile_id: str) -> List[VoiceSample]:
         """Get all samples for a voice profile."""
         return [
-            sample for sample in self.samples.values()
-            if sample.profile_id == profile_id
+            self.samples[sample_id]
+            for sample_id in self._profile_samples.get(profile_id, [])
         ]
     
     async def delete_voice_profile(self, profile_id: str, user_id: str) -> bool:
@@ -298,6 +358,12 @@ class VoiceProfileManager:
                 if os.path.exists(sample.file_path):
                     os.remove(sample.file_path)
                 del self.samples[sample.sample_id]
+            self._profile_samples.pop(profile_id, None)
+            
+            # Stop any queued or running training job
+            training_job_id = (profile.metadata or {}).get("training_job_id")
+            if training_job_id:
+                job_queue.cancel(training_job_id)
             
             # Delete model file if exists
             if profile.model_path:
@@ -307,6 +373,10 @@ class VoiceProfileManager:
             
             # Remove profile
             del self.profiles[profile_id]
+            user_profile_ids = self._user_profiles.get(user_id, [])
+            user_profile_ids.remove(profile_id)
+            if not user_profile_ids:
+                self._user_profiles.pop(user_id, None)
             self._save_profiles()
             
             return True
@@ -321,6 +391,8 @@ class VoiceProfileManager:
         if not profile:
             return {"error": "Profile not found"}
         
+        self._sync_training_job(profile)
+        
         return {
             "profile_id": profile_id,
             "status": profile.status,
@@ -3,160 +3,370 @@ Background task worker for Phase 5B
 Handles various background processing tasks.
 """
 import asyncio
-from typing import Dict, List, Any, Callable
+import heapq
+import itertools
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Any, Callable, Optional
 from datetime import datetime
 import json
 
+from .job_queue import job_queue
+from .job_runner import DurableJobRunner
+
+FINISHED_STATUSES = ("completed", "failed", "cancelled")
+
+@dataclass
+class TaskHandler:
+    """Registered handler and its dispatch policy."""
+    handler: Callable
+    max_concurrent: int = 5
+    max_retries: int = 0
+    retry_backoff: float = 1.0
+    cpu_bound: bool = False
+
 class BackgroundTaskWorker:
-    """Generic background task worker."""
-    
-    def __init__(self):
+    """
+    Generic background task worker.
+
+    Queued tasks go on an asyncio.PriorityQueue and a dispatcher wakes as
+    soon as one is enqueued. Each task type has its own concurrency limit;
+    tasks over the limit are parked until a slot of that type frees up.
+    Failed tasks are retried with exponential backoff, running tasks can be
+    cancelled, and finished task records are dropped after a retention
+    period. Handlers registered as cpu_bound are plain functions run in a
+    process pool instead of on the event loop.
+
+    Tasks queued with durable=True go to the durable job queue instead and
+    survive restarts; they are consumed by this process's DurableJobRunner
+    (unless consume_durable is off) and by any standalone job_runner.
+    """
+
+    def __init__(self,
+                 max_concurrent_tasks: int = 5,
+                 retention_seconds: float = 3600.0,
+                 max_finished_tasks: int = 1000,
+                 process_workers: int = 2,
+                 consume_durable: bool = True):
         self.tasks = {}
-        self.task_handlers = {}
+        self.task_handlers: Dict[str, TaskHandler] = {}
         self.is_running = False
-        self.max_concurrent_tasks = 5
-        self.running_tasks = set()
-    
-    def register_handler(self, task_type: str, handler: Callable):
-        """Register a task handler for a specific task type."""
-        self.task_handlers[task_type] = handler
+        self.max_concurrent_tasks = max_concurrent_tasks
+        self.retention_seconds = retention_seconds
+        self.max_finished_tasks = max_finished_tasks
+        self.process_workers = process_workers
+        self.running_tasks: Dict[str, asyncio.Task] = {}
+
+        self._queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._sequence = itertools.count()
+        self._running_by_type: Dict[str, int] = {}
+        self._parked: Dict[str, List[tuple]] = {}
+        self._finished: deque = deque()
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self.durable_runner = DurableJobRunner(job_queue) if consume_durable else None
+
+    def register_handler(self,
+                         task_type: str,
+                         handler: Callable,
+                         max_concurrent: Optional[int] = None,
+                         max_retries: int = 0,
+                         retry_backoff: float = 1.0,
+                         cpu_bound: bool = False):
+        """
+        Register a task handler for a specific task type.
+
+        Args:
+            task_type: Task type name
+            handler: async handler(task_data, progress_callback), or for
+                cpu_bound handlers a picklable module-level handler(task_data)
+            max_concurrent: Concurrent tasks of this type (defaults to the worker limit)
+            max_retries: Retries after a failure before the task is marked failed
+            retry_backoff: Base delay in seconds, doubled on each retry
+            cpu_bound: Run the handler in the process pool
+        """
+        self.task_handlers[task_type] = TaskHandler(
+            handler=handler,
+            max_concurrent=max_concurrent or self.max_concurrent_tasks,
+            max_retries=max_retries,
+            retry_backoff=retry_backoff,
+            cpu_bound=cpu_bound
+        )
         print(f"Registered handler for task type: {task_type}")
-    
+
     async def start(self):
         """Start the background worker."""
+        if self.is_running:
+            return
+
         self.is_running = True
+        self._slots = asyncio.Semaphore(self.max_concurrent_tasks)
+        self._dispatcher = asyncio.create_task(self._dispatch_loop())
+
+        if self.durable_runner:
+            for task_type, registration in self.task_handlers.items():
+                if not registration.cpu_bound:
+                    self.durable_runner.register_handler(task_type, registration.handler)
+            await self.durable_runner.start()
+
         print("Background task worker started")
-        
-        # Start background task processing
-        asyncio.create_task(self._process_task_queue())
-    
+
     async def stop(self):
         """Stop the background worker."""
         self.is_running = False
-        
+
+        if self._dispatcher:
+            self._dispatcher.cancel()
+            await asyncio.gather(self._dispatcher, return_exceptions=True)
+            self._dispatcher = None
+
+        if self.durable_runner:
+            await self.durable_runner.stop()
+
         # Wait for running tasks to complete
         if self.running_tasks:
-            await asyncio.gather(*self.running_tasks, return_exceptions=True)
-        
+            await asyncio.gather(*self.running_tasks.values(), return_exceptions=True)
+
+        if self._process_pool:
+            self._process_pool.shutdown(wait=False, cancel_futures=True)
+            self._process_pool = None
+
         print("Background task worker stopped")
-    
-    async def queue_task(self, task_type: str, task_data: Dict[str, Any]) -> str:
-        """Queue a new background task."""
+
+    async def queue_task(self,
+                         task_type: str,
+                         task_data: Dict[str, Any],
+                         priority: int = 5,
+                         durable: bool = False) -> str:
+        """
+        Queue a new background task.
+
+        Args:
+            task_type: Registered task type
+            task_data: Payload passed to the handler (JSON-serializable if durable)
+            priority: Lower values run first
+            durable: Persist the task in the durable job queue
+
+        Returns:
+            Task ID
+        """
+        if durable:
+            registration = self.task_handlers.get(task_type)
+            max_attempts = registration.max_retries + 1 if registration else 1
+            task_id = job_queue.enqueue(task_type, task_data, priority, max_attempts)
+            if self.durable_runner:
+                self.durable_runner.notify()
+
+            print(f"Queued durable task {task_id} of type {task_type}")
+            return task_id
+
         task_id = f"task_{task_type}_{datetime.now().timestamp()}"
-        
+
         self.tasks[task_id] = {
             "task_id": task_id,
             "task_type": task_type,
             "task_data": task_data,
+            "priority": priority,
             "status": "queued",
             "progress": 0.0,
+            "attempts": 0,
             "result": None,
             "error": None,
             "created_at": datetime.now().isoformat(),
             "started_at": None,
             "completed_at": None
         }
-        
+
+        self._enqueue(task_id)
         print(f"Queued task {task_id} of type {task_type}")
         return task_id
-    
+
     async def get_task_status(self, task_id: str) -> Dict[str, Any]:
         """Get status of a background task."""
-        return self.tasks.get(task_id, {"error": "Task not found"})
-    
+        if task_id in self.tasks:
+            return self.tasks[task_id]
+        return job_queue.get(task_id) or {"error": "Task not found"}
+
     async def cancel_task(self, task_id: str) -> bool:
         """Cancel a queued or running task."""
         if task_id not in self.tasks:
-            return False
-        
+            # Durable runners notice the cancellation on their next heartbeat
+            return job_queue.cancel(task_id)
+
         task = self.tasks[task_id]
-        if task["status"] in ["queued", "running"]:
-            task["status"] = "cancelled"
-            task["completed_at"] = datetime.now().isoformat()
-            return True
-        
-        return False
-    
-    async def _process_task_queue(self):
-        """Process tasks in the background."""
+        if task["status"] not in ["queued", "retrying", "running"]:
+            return False
+
+        running = self.running_tasks.get(task_id)
+        if running:
+            # _execute_task records the cancellation when the coroutine unwinds.
+            # Process-pool handlers stop being awaited but finish in their worker.
+            running.cancel()
+        else:
+            self._finish(task, "cancelled")
+
+        return True
+
+    def _enqueue(self, task_id: str):
+        """Put a task on the priority queue, waking the dispatcher."""
+        task = self.tasks.get(task_id)
+        if task and task["status"] in ["queued", "retrying"]:
+            task["status"] = "queued"
+            self._queue.put_nowait((task["priority"], next(self._sequence), task_id))
+
+    async def _dispatch_loop(self):
+        """Start queued tasks as global and per-type slots allow."""
         while self.is_running:
-            # Check if we can run more tasks
-            if len(self.running_tasks) < self.max_concurrent_tasks:
-                # Find next queued task
-                next_task = None
-                for task_id, task in self.tasks.items():
-                    if task["status"] == "queued":
-                        next_task = (task_id, task)
-                        break
-                
-                if next_task:
-                    task_id, task = next_task
-                    # Start the task
-                    task_coroutine = self._execute_task(task_id, task)
-                    task_future = asyncio.create_task(task_coroutine)
-                    self.running_tasks.add(task_future)
-            
-            # Clean up completed tasks
-            completed_tasks = [task for task in self.running_tasks if task.done()]
-            for task in completed_tasks:
-                self.running_tasks.remove(task)
-            
-            await asyncio.sleep(1)  # Check every second
-    
+            await self._slots.acquire()
+
+            try:
+                entry = await self._queue.get()
+            except asyncio.CancelledError:
+                self._slots.release()
+                raise
+
+            task_id = entry[2]
+            task = self.tasks.get(task_id)
+            if not task or task["status"] != "queued":
+                self._slots.release()
+                continue
+
+            task_type = task["task_type"]
+            limit = self.task_handlers[task_type].max_concurrent if task_type in self.task_handlers else 1
+            if self._running_by_type.get(task_type, 0) >= limit:
+                # Park until a task of the same type finishes
+                heapq.heappush(self._parked.setdefault(task_type, []), entry)
+                self._slots.release()
+                continue
+
+            self._running_by_type[task_type] = self._running_by_type.get(task_type, 0) + 1
+            running = asyncio.create_task(self._execute_task(task_id, task))
+            running.add_done_callback(lambda _, task_id=task_id, task_type=task_type: self._release_slot(task_id, task_type))
+            self.running_tasks[task_id] = running
+            self._prune_finished()
+
+    def _release_slot(self, task_id: str, task_type: str):
+        """Free the task's slots and requeue one parked task of its type."""
+        self.running_tasks.pop(task_id, None)
+
+        # A task cancelled before its first step never reaches _execute_task's handlers
+        task = self.tasks.get(task_id)
+        if task and task["status"] not in FINISHED_STATUSES + ("retrying",):
+            self._finish(task, "cancelled")
+
+        self._running_by_type[task_type] -= 1
+        self._slots.release()
+
+        # Skip parked entries that were cancelled while waiting
+        parked = self._parked.get(task_type, [])
+        while parked:
+            priority, sequence, parked_id = heapq.heappop(parked)
+            parked_task = self.tasks.get(parked_id)
+            if parked_task and parked_task["status"] == "queued":
+                self._queue.put_nowait((priority, sequence, parked_id))
+                break
+
     async def _execute_task(self, task_id: str, task: Dict[str, Any]):
         """Execute a single task."""
+        task_type = task["task_type"]
+
         try:
-            task_type = task["task_type"]
-            
             if task_type not in self.task_handlers:
                 raise ValueError(f"No handler registered for task type: {task_type}")
-            
+
+            registration = self.task_handlers[task_type]
             task["status"] = "running"
+            task["attempts"] += 1
             task["started_at"] = datetime.now().isoformat()
-            
+
             print(f"Executing task {task_id} of type {task_type}")
-            
+
             # Execute the task handler
-            handler = self.task_handlers[task_type]
-            result = await handler(task["task_data"], self._progress_callback(task_id))
-            
-            task["status"] = "completed"
+            if registration.cpu_bound:
+                loop = asyncio.get_running_loop()
+                result = await loop.run_in_executor(
+                    self._get_process_pool(), registration.handler, task["task_data"]
+                )
+            else:
+                result = await registration.handler(task["task_data"], self._progress_callback(task_id))
+
             task["result"] = result
             task["progress"] = 1.0
-            task["completed_at"] = datetime.now().isoformat()
-            
+            self._finish(task, "completed")
+
             print(f"Completed task {task_id}")
-            
+
+        except asyncio.CancelledError:
+            self._finish(task, "cancelled")
+            print(f"Cancelled task {task_id}")
+
         except Exception as e:
-            task["status"] = "failed"
             task["error"] = str(e)
-            task["completed_at"] = datetime.now().isoformat()
-            print(f"Task {task_id} failed: {e}")
-    
+            registration = self.task_handlers.get(task_type)
+
+            if registration and task["attempts"] <= registration.max_retries and self.is_running:
+                delay = registration.retry_backoff * (2 ** (task["attempts"] - 1))
+                task["status"] = "retrying"
+                asyncio.get_running_loop().call_later(delay, self._enqueue, task_id)
+                print(f"Task {task_id} failed: {e}, retrying in {delay:.1f}s")
+            else:
+                self._finish(task, "failed")
+                print(f"Task {task_id} failed: {e}")
+
+    def _finish(self, task: Dict[str, Any], status: str):
+        """Mark a task finished and schedule its record for retention pruning."""
+        task["status"] = status
+        task["completed_at"] = datetime.now().isoformat()
+        self._finished.append((time.monotonic(), task["task_id"]))
+
+    def _prune_finished(self):
+        """Drop finished task records past the retention period or count cap."""
+        cutoff = time.monotonic() - self.retention_seconds
+        while self._finished and (
+            self._finished[0][0] < cutoff or len(self._finished) > self.max_finished_tasks
+        ):
+            _, task_id = self._finished.popleft()
+            self.tasks.pop(task_id, None)
+
+    def _get_process_pool(self) -> ProcessPoolExecutor:
+        """Lazily create the process pool for CPU-bound handlers."""
+        if self._process_pool is None:
+            self._process_pool = ProcessPoolExecutor(max_workers=self.process_workers)
+        return self._process_pool
+
     def _progress_callback(self, task_id: str):
         """Create a progress callback for a specific task."""
         def update_progress(progress: float):
             if task_id in self.tasks:
                 self.tasks[task_id]["progress"] = min(1.0, max(0.0, progress))
-        
+
         return update_progress
-    
+
     def get_task_stats(self) -> Dict[str, Any]:
         """Get worker statistics."""
+        self._prune_finished()
+
         stats = {
             "total_tasks": len(self.tasks),
             "running_tasks": len(self.running_tasks),
+            "queued_tasks": self._queue.qsize() + sum(len(parked) for parked in self._parked.values()),
             "is_running": self.is_running,
             "max_concurrent": self.max_concurrent_tasks,
-            "registered_handlers": list(self.task_handlers.keys())
+            "registered_handlers": list(self.task_handlers.keys()),
+            "running_by_type": dict(self._running_by_type),
+            "durable_jobs": job_queue.stats()
         }
-        
+
         # Count by status
         status_counts = {}
         for task in self.tasks.values():
             status = task["status"]
             status_counts[status] = status_counts.get(status, 0) + 1
-        
+
         stats["status_counts"] = status_counts
         return stats
 
@@ -167,19 +377,19 @@ async def audio_processing_task(task_data: Dict[str, Any], progress_callback: Ca
     for i in range(10):
         await asyncio.sleep(0.5)
         progress_callback(i / 10)
-    
+
     return {"processed": True, "duration": 5.0}
 
 async def translation_task(task_data: Dict[str, Any], progress_callback: Callable):
     """Example translation task handler."""
     text = task_data.get("text", "")
     target_lang = task_data.get("target_language", "es")
-    
+
     # Simulate translation processing
     for i in range(5):
         await asyncio.sleep(0.3)
         progress_callback(i / 5)
-    
+
     return {
         "original_text": text,
         "translated_text": f"[Translated to {target_lang}] {text}",
@@ -187,8 +397,10 @@ async def translation_task(task_data: Dict[str, Any], progress_callback: Callabl
     }
 
 # Global worker instance
-background_worker = BackgroundTaskWorker()
+background_worker = BackgroundTaskWorker(
+    consume_durable=os.getenv("JOB_RUNNER_IN_PROCESS", "true").lower() == "true"
+)
 
 # Register example handlers
-background_worker.register_handler("audio_processing", audio_processing_task)
-background_worker.register_handler("translation", translation_task)
+background_worker.register_handler("audio_processing", audio_processing_task, max_concurrent=2, max_retries=2)
+background_worker.register_handler("translation", translation_task, max_concurrent=4, max_retries=2)
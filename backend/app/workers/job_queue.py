@@ -0,0 +1,462 @@
+"""
+Durable job queue for background workers
+Persists queued and running jobs so they survive restarts and can be
+consumed by several worker processes.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Dict, List, Any, Optional
+
+JOB_STATUSES = ("queued", "running", "completed", "cancelled", "dead")
+
+class JobQueueBackend(ABC):
+    """
+    Interface shared by the durable queue backends.
+
+    Delivery is at-least-once: a claimed job is leased to one worker for
+    visibility_timeout seconds. Workers extend the lease with heartbeat();
+    if a worker dies the lease expires and another worker claims the job
+    again. Jobs that fail or time out max_attempts times move to the
+    "dead" (dead-letter) state and can be requeued by hand.
+    """
+
+    def __init__(self, visibility_timeout: float = 60.0):
+        self.visibility_timeout = visibility_timeout
+
+    @abstractmethod
+    def enqueue(self, task_type: str, payload: Dict[str, Any],
+                priority: int = 5, max_attempts: int = 3) -> str:
+        """Add a job and return its ID. Lower priority values run first."""
+
+    @abstractmethod
+    def claim(self, task_types: List[str], worker_id: str) -> Optional[Dict[str, Any]]:
+        """Lease the next available job of one of task_types, or None."""
+
+    @abstractmethod
+    def heartbeat(self, job_id: str, worker_id: str, progress: Optional[float] = None) -> bool:
+        """Extend the lease; False means the worker no longer owns the job."""
+
+    @abstractmethod
+    def complete(self, job_id: str, worker_id: str, result: Any = None) -> bool:
+        """Mark a leased job completed."""
+
+    @abstractmethod
+    def fail(self, job_id: str, worker_id: str, error: str, retry_delay: float = 0.0) -> str:
+        """Record a failure; returns the new status ("queued" for retry or "dead")."""
+
+    @abstractmethod
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued or running job."""
+
+    @abstractmethod
+    def requeue(self, job_id: str) -> bool:
+        """Move a dead-lettered job back to the queue with fresh attempts."""
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get a job record."""
+
+    @abstractmethod
+    def stats(self) -> Dict[str, int]:
+        """Job counts by status."""
+
+class SQLiteJobQueue(JobQueueBackend):
+    """
+    Job queue stored in a single SQLite table.
+
+    WAL mode and a busy timeout let several worker processes on the same
+    host share the database; claims are a single UPDATE ... RETURNING so
+    two workers can never lease the same job.
+    """
+
+    def __init__(self, db_path: str, visibility_timeout: float = 60.0):
+        super().__init__(visibility_timeout)
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA busy_timeout=30000")
+        self._create_schema()
+
+    def _create_schema(self):
+        """Create the jobs table and indexes if missing."""
+        with self._lock:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    task_type TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    priority INTEGER NOT NULL DEFAULT 5,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    max_attempts INTEGER NOT NULL DEFAULT 3,
+                    available_at REAL NOT NULL,
+                    lease_owner TEXT,
+                    lease_expires REAL,
+                    progress REAL NOT NULL DEFAULT 0,
+                    result TEXT,
+                    error TEXT,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                )
+            """)
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_jobs_ready ON jobs (status, task_type, priority, available_at)"
+            )
+
+    def _execute(self, sql: str, params: tuple = ()) -> tuple:
+        """Run one statement in its own immediate transaction; returns (rows, rowcount)."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = self._conn.execute(sql, params)
+                rows = cursor.fetchall()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            return rows, cursor.rowcount
+
+    def enqueue(self, task_type: str, payload: Dict[str, Any],
+                priority: int = 5, max_attempts: int = 3) -> str:
+        job_id = f"job_{task_type}_{uuid.uuid4().hex}"
+        now = datetime.now().isoformat()
+        self._execute("""
+            INSERT INTO jobs (job_id, task_type, payload, priority, status, max_attempts,
+                              available_at, created_at, updated_at)
+            VALUES (?, ?, ?, ?, 'queued', ?, ?, ?, ?)
+        """, (job_id, task_type, json.dumps(payload), priority, max_attempts, time.time(), now, now))
+        return job_id
+
+    def claim(self, task_types: List[str], worker_id: str) -> Optional[Dict[str, Any]]:
+        if not task_types:
+            return None
+
+        now = time.time()
+        placeholders = ",".join("?" for _ in task_types)
+
+        # Expired leases that already used every attempt go to the dead-letter state
+        self._execute(f"""
+            UPDATE jobs SET status = 'dead', error = 'Visibility timeout exceeded',
+                            lease_owner = NULL, updated_at = ?
+            WHERE status = 'running' AND lease_expires < ? AND attempts >= max_attempts
+              AND task_type IN ({placeholders})
+        """, (datetime.now().isoformat(), now, *task_types))
+
+        rows, _ = self._execute(f"""
+            UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_owner = ?,
+                            lease_expires = ?, updated_at = ?
+            WHERE job_id = (
+                SELECT job_id FROM jobs
+                WHERE task_type IN ({placeholders})
+                  AND ((status = 'queued' AND available_at <= ?)
+                       OR (status = 'running' AND lease_expires < ?))
+                ORDER BY priority, available_at
+                LIMIT 1
+            )
+            RETURNING *
+        """, (worker_id, now + self.visibility_timeout, datetime.now().isoformat(),
+              *task_types, now, now))
+
+        return self._row_to_job(rows[0]) if rows else None
+
+    def heartbeat(self, job_id: str, worker_id: str, progress: Optional[float] = None) -> bool:
+        _, updated = self._execute("""
+            UPDATE jobs SET lease_expires = ?, progress = COALESCE(?, progress), updated_at = ?
+            WHERE job_id = ? AND status = 'running' AND lease_owner = ?
+        """, (time.time() + self.visibility_timeout, progress, datetime.now().isoformat(),
+              job_id, worker_id))
+        return updated > 0
+
+    def complete(self, job_id: str, worker_id: str, result: Any = None) -> bool:
+        _, updated = self._execute("""
+            UPDATE jobs SET status = 'completed', progress = 1.0, result = ?, lease_owner = NULL,
+                            lease_expires = NULL, updated_at = ?
+            WHERE job_id = ? AND status = 'running' AND lease_owner = ?
+        """, (json.dumps(result), datetime.now().isoformat(), job_id, worker_id))
+        return updated > 0
+
+    def fail(self, job_id: str, worker_id: str, error: str, retry_delay: float = 0.0) -> str:
+        rows, _ = self._execute("""
+            UPDATE jobs SET status = CASE WHEN attempts >= max_attempts THEN 'dead' ELSE 'queued' END,
+                            available_at = ?, error = ?, lease_owner = NULL, lease_expires = NULL,
+                            updated_at = ?
+            WHERE job_id = ? AND status = 'running' AND lease_owner = ?
+            RETURNING status
+        """, (time.time() + retry_delay, error, datetime.now().isoformat(), job_id, worker_id))
+        return rows[0]["status"] if rows else "unknown"
+
+    def cancel(self, job_id: str) -> bool:
+        _, updated = self._execute("""
+            UPDATE jobs SET status = 'cancelled', lease_owner = NULL, lease_expires = NULL, updated_at = ?
+            WHERE job_id = ? AND status IN ('queued', 'running')
+        """, (datetime.now().isoformat(), job_id))
+        return updated > 0
+
+    def requeue(self, job_id: str) -> bool:
+        _, updated = self._execute("""
+            UPDATE jobs SET status = 'queued', attempts = 0, available_at = ?, updated_at = ?
+            WHERE job_id = ? AND status = 'dead'
+        """, (time.time(), datetime.now().isoformat(), job_id))
+        return updated > 0
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def _row_to_job(self, row: sqlite3.Row) -> Dict[str, Any]:
+        """Convert a jobs row to the job dict returned to callers."""
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+        return job
+
+# Lease a job atomically: check its state, count the attempt and record
+# the owner in one step, so a cancel or a second claim can't interleave.
+# Returns 1 if leased, -1 if it was dead-lettered, 0 if it is finished.
+START_JOB_LUA = """
+local state = redis.call('HMGET', KEYS[1], 'status', 'attempts', 'max_attempts')
+if not state[1] or (state[1] ~= 'queued' and state[1] ~= 'running') then
+    return 0
+end
+local attempts = tonumber(state[2])
+if attempts >= tonumber(state[3]) then
+    redis.call('HSET', KEYS[1], 'status', 'dead', 'error', 'Visibility timeout exceeded',
+               'updated_at', ARGV[3])
+    return -1
+end
+redis.call('HSET', KEYS[1], 'status', 'running', 'attempts', attempts + 1,
+           'lease_owner', ARGV[1], 'entry_id', ARGV[2], 'updated_at', ARGV[3])
+return 1
+"""
+
+class RedisJobQueue(JobQueueBackend):
+    """
+    Job queue on Redis streams.
+
+    Each task type has a stream read through one consumer group. Pending
+    entries idle for longer than visibility_timeout are reclaimed with
+    XAUTOCLAIM, heartbeats reset the idle time with XCLAIM, and retries
+    wait in a sorted set until due. Job records live in a hash per job.
+    Streams are FIFO, so priority only orders jobs in the retry set.
+    """
+
+    GROUP = "workers"
+
+    def __init__(self, redis_url: str, visibility_timeout: float = 60.0, prefix: str = "jobs"):
+        super().__init__(visibility_timeout)
+        import redis
+
+        self.redis = redis.Redis.from_url(redis_url, decode_responses=True)
+        self.prefix = prefix
+        self._groups_created = set()
+        self._start_job_script = self.redis.register_script(START_JOB_LUA)
+
+    def _stream(self, task_type: str) -> str:
+        return f"{self.prefix}:stream:{task_type}"
+
+    def _job_key(self, job_id: str) -> str:
+        return f"{self.prefix}:job:{job_id}"
+
+    def _ensure_group(self, task_type: str):
+        """Create the consumer group for a task type's stream once."""
+        if task_type in self._groups_created:
+            return
+
+        import redis
+
+        try:
+            self.redis.xgroup_create(self._stream(task_type), self.GROUP, id="0", mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        self._groups_created.add(task_type)
+
+    def enqueue(self, task_type: str, payload: Dict[str, Any],
+                priority: int = 5, max_attempts: int = 3) -> str:
+        job_id = f"job_{task_type}_{uuid.uuid4().hex}"
+        now = datetime.now().isoformat()
+        self._ensure_group(task_type)
+
+        pipe = self.redis.pipeline()
+        pipe.hset(self._job_key(job_id), mapping={
+            "job_id": job_id,
+            "task_type": task_type,
+            "payload": json.dumps(payload),
+            "priority": priority,
+            "status": "queued",
+            "attempts": 0,
+            "max_attempts": max_attempts,
+            "progress": 0.0,
+            "created_at": now,
+            "updated_at": now
+        })
+        pipe.xadd(self._stream(task_type), {"job_id": job_id})
+        pipe.execute()
+        return job_id
+
+    def _promote_due_retries(self):
+        """Move retries whose delay has elapsed back onto their streams."""
+        delayed = f"{self.prefix}:delayed"
+        for job_id in self.redis.zrangebyscore(delayed, "-inf", time.time()):
+            # ZREM decides which worker promotes the job
+            if self.redis.zrem(delayed, job_id):
+                task_type = self.redis.hget(self._job_key(job_id), "task_type")
+                if task_type:
+                    self.redis.xadd(self._stream(task_type), {"job_id": job_id})
+
+    def claim(self, task_types: List[str], worker_id: str) -> Optional[Dict[str, Any]]:
+        self._promote_due_retries()
+        idle_ms = int(self.visibility_timeout * 1000)
+
+        for task_type in task_types:
+            self._ensure_group(task_type)
+            stream = self._stream(task_type)
+
+            # Redis 6.2 replies [cursor, entries]; 7.0+ adds deleted IDs
+            entries = self.redis.xautoclaim(stream, self.GROUP, worker_id, idle_ms, count=1)[1]
+            if not entries:
+                response = self.redis.xreadgroup(self.GROUP, worker_id, {stream: ">"}, count=1)
+                entries = response[0][1] if response else []
+
+            for entry_id, fields in entries:
+                job = self._start_job(fields["job_id"], entry_id, worker_id)
+                if job:
+                    return job
+                self.redis.xack(stream, self.GROUP, entry_id)
+
+        return None
+
+    def _start_job(self, job_id: str, entry_id: str, worker_id: str) -> Optional[Dict[str, Any]]:
+        """Lease a delivered entry; None if the job is finished or dead-lettered."""
+        started = self._start_job_script(
+            keys=[self._job_key(job_id)], args=[worker_id, entry_id, datetime.now().isoformat()]
+        )
+        return self.get(job_id) if started == 1 else None
+
+    def _owned(self, job_id: str, worker_id: str) -> Optional[Dict[str, str]]:
+        """Job record if it is running and leased by worker_id."""
+        record = self.redis.hgetall(self._job_key(job_id))
+        if record.get("status") == "running" and record.get("lease_owner") == worker_id:
+            return record
+        return None
+
+    def heartbeat(self, job_id: str, worker_id: str, progress: Optional[float] = None) -> bool:
+        record = self._owned(job_id, worker_id)
+        if not record:
+            return False
+
+        self.redis.xclaim(self._stream(record["task_type"]), self.GROUP, worker_id, 0,
+                          [record["entry_id"]], justid=True)
+        updates = {"updated_at": datetime.now().isoformat()}
+        if progress is not None:
+            updates["progress"] = progress
+        self.redis.hset(self._job_key(job_id), mapping=updates)
+        return True
+
+    def _finish(self, record: Dict[str, str], status: str, **fields):
+        """Acknowledge the stream entry and store the final job state."""
+        stream = self._stream(record["task_type"])
+        self.redis.xack(stream, self.GROUP, record["entry_id"])
+        self.redis.xdel(stream, record["entry_id"])
+        self.redis.hset(self._job_key(record["job_id"]), mapping={
+            "status": status, "lease_owner": "", "updated_at": datetime.now().isoformat(), **fields
+        })
+
+    def complete(self, job_id: str, worker_id: str, result: Any = None) -> bool:
+        record = self._owned(job_id, worker_id)
+        if not record:
+            return False
+
+        self._finish(record, "completed", progress=1.0, result=json.dumps(result))
+        return True
+
+    def fail(self, job_id: str, worker_id: str, error: str, retry_delay: float = 0.0) -> str:
+        record = self._owned(job_id, worker_id)
+        if not record:
+            return "unknown"
+
+        if int(record["attempts"]) >= int(record["max_attempts"]):
+            self._finish(record, "dead", error=error)
+            return "dead"
+
+        self._finish(record, "queued", error=error)
+        self.redis.zadd(f"{self.prefix}:delayed", {job_id: time.time() + retry_delay})
+        return "queued"
+
+    def cancel(self, job_id: str) -> bool:
+        key = self._job_key(job_id)
+        if self.redis.hget(key, "status") not in ("queued", "running"):
+            return False
+
+        # Stream entries of cancelled jobs are acknowledged when next delivered
+        self.redis.zrem(f"{self.prefix}:delayed", job_id)
+        self.redis.hset(key, mapping={
+            "status": "cancelled", "lease_owner": "", "updated_at": datetime.now().isoformat()
+        })
+        return True
+
+    def requeue(self, job_id: str) -> bool:
+        key = self._job_key(job_id)
+        record = self.redis.hgetall(key)
+        if record.get("status") != "dead":
+            return False
+
+        self.redis.hset(key, mapping={
+            "status": "queued", "attempts": 0, "updated_at": datetime.now().isoformat()
+        })
+        self.redis.xadd(self._stream(record["task_type"]), {"job_id": job_id})
+        return True
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        record = self.redis.hgetall(self._job_key(job_id))
+        if not record:
+            return None
+
+        job = dict(record)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job.get("result") else None
+        for field in ("priority", "attempts", "max_attempts"):
+            job[field] = int(job[field])
+        job["progress"] = float(job.get("progress", 0.0))
+        return job
+
+    def stats(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for key in self.redis.scan_iter(f"{self.prefix}:job:*"):
+            status = self.redis.hget(key, "status")
+            counts[status] = counts.get(status, 0) + 1
+        return counts
+
+def create_job_queue() -> JobQueueBackend:
+    """
+    Build the configured queue backend.
+
+    JOB_QUEUE_BACKEND selects "sqlite" (default, JOB_QUEUE_PATH) or
+    "redis" (REDIS_URL). JOB_VISIBILITY_TIMEOUT sets the lease length.
+    """
+    backend = os.getenv("JOB_QUEUE_BACKEND", "sqlite").lower()
+    visibility_timeout = float(os.getenv("JOB_VISIBILITY_TIMEOUT", "60"))
+
+    if backend == "redis":
+        return RedisJobQueue(os.getenv("REDIS_URL", "redis://localhost:6379/0"), visibility_timeout)
+
+    return SQLiteJobQueue(os.getenv("JOB_QUEUE_PATH", "jobs/jobs.db"), visibility_timeout)
+
+# Global queue instance
+job_queue = create_job_queue()
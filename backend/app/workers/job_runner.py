@@ -0,0 +1,195 @@
+"""
+Durable job runner
+Consumes jobs from the durable job queue, in the API process or as a
+standalone worker process:
+
+    python -m app.workers.job_runner --types voice_training --concurrency 2
+"""
+import argparse
+import asyncio
+import os
+import socket
+import uuid
+from typing import Dict, List, Any, Callable, Optional
+
+from .job_queue import JobQueueBackend, job_queue
+
+class DurableJobRunner:
+    """
+    Leases jobs from a JobQueueBackend and runs their handlers.
+
+    Handlers have the same signature as BackgroundTaskWorker handlers:
+    async handler(payload, progress_callback). While a handler runs, a
+    heartbeat extends the lease and publishes progress; if the lease is
+    lost (job cancelled or reclaimed) the handler is cancelled.
+    """
+
+    def __init__(self,
+                 queue: JobQueueBackend,
+                 concurrency: int = 2,
+                 poll_interval: float = 1.0,
+                 retry_backoff: float = 2.0,
+                 worker_id: Optional[str] = None):
+        self.queue = queue
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.retry_backoff = retry_backoff
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.handlers: Dict[str, Callable] = {}
+        self.running_jobs: Dict[str, asyncio.Task] = {}
+        self.is_running = False
+
+        self._wakeup = asyncio.Event()
+        self._loop_task: Optional[asyncio.Task] = None
+
+    def register_handler(self, task_type: str, handler: Callable):
+        """Register the handler for a durable task type."""
+        self.handlers[task_type] = handler
+
+    async def start(self):
+        """Start claiming jobs."""
+        if self.is_running or not self.handlers:
+            return
+
+        self.is_running = True
+        self._loop_task = asyncio.create_task(self._claim_loop())
+        print(f"Durable job runner {self.worker_id} started for: {', '.join(self.handlers)}")
+
+    async def stop(self):
+        """
+        Stop claiming and cancel running handlers.
+
+        Cancelled jobs keep their lease until it expires, then another
+        worker picks them up again.
+        """
+        self.is_running = False
+        self._wakeup.set()
+
+        if self._loop_task:
+            await asyncio.gather(self._loop_task, return_exceptions=True)
+            self._loop_task = None
+
+        for running in self.running_jobs.values():
+            running.cancel()
+        if self.running_jobs:
+            await asyncio.gather(*self.running_jobs.values(), return_exceptions=True)
+
+        print(f"Durable job runner {self.worker_id} stopped")
+
+    def notify(self):
+        """Wake the claim loop, e.g. right after enqueueing from this process."""
+        self._wakeup.set()
+
+    async def _claim_loop(self):
+        """Claim jobs while there is free capacity, polling when the queue is empty."""
+        while self.is_running:
+            if len(self.running_jobs) >= self.concurrency:
+                await self._wait()
+                continue
+
+            try:
+                job = await asyncio.to_thread(self.queue.claim, list(self.handlers), self.worker_id)
+            except Exception as e:
+                print(f"Error claiming job: {e}")
+                job = None
+
+            if job is None:
+                await self._wait()
+                continue
+
+            running = asyncio.create_task(self._run_job(job))
+            running.add_done_callback(lambda _, job_id=job["job_id"]: self._job_done(job_id))
+            self.running_jobs[job["job_id"]] = running
+
+    async def _wait(self):
+        """Sleep until notified or the poll interval elapses."""
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    def _job_done(self, job_id: str):
+        """Free the job's slot and wake the claim loop."""
+        self.running_jobs.pop(job_id, None)
+        self._wakeup.set()
+
+    async def _run_job(self, job: Dict[str, Any]):
+        """Run one leased job with a heartbeat alongside it."""
+        job_id = job["job_id"]
+        progress = {"value": None}
+
+        def progress_callback(value: float):
+            progress["value"] = min(1.0, max(0.0, value))
+
+        handler_task = asyncio.create_task(self.handlers[job["task_type"]](job["payload"], progress_callback))
+        heartbeat_task = asyncio.create_task(self._heartbeat(job_id, handler_task, progress))
+
+        try:
+            result = await handler_task
+            await asyncio.to_thread(self.queue.complete, job_id, self.worker_id, result)
+            print(f"Completed job {job_id}")
+
+        except asyncio.CancelledError:
+            print(f"Job {job_id} cancelled on worker {self.worker_id}")
+
+        except Exception as e:
+            delay = self.retry_backoff * (2 ** (job["attempts"] - 1))
+            status = await asyncio.to_thread(self.queue.fail, job_id, self.worker_id, str(e), delay)
+            print(f"Job {job_id} failed: {e} (now {status})")
+
+        finally:
+            heartbeat_task.cancel()
+            if not handler_task.done():
+                handler_task.cancel()
+
+    async def _heartbeat(self, job_id: str, handler_task: asyncio.Task, progress: Dict[str, Any]):
+        """Extend the lease every third of the visibility timeout."""
+        interval = self.queue.visibility_timeout / 3
+        while True:
+            await asyncio.sleep(interval)
+            owned = await asyncio.to_thread(self.queue.heartbeat, job_id, self.worker_id, progress["value"])
+            if not owned:
+                print(f"Lost lease on job {job_id}, cancelling")
+                handler_task.cancel()
+                return
+
+def build_handler_registry() -> Dict[str, Callable]:
+    """Handlers for every durable task type, keyed by task type."""
+    from .background_worker import background_worker
+    from .voice_training_worker import voice_training_worker
+
+    handlers = {
+        task_type: registration.handler
+        for task_type, registration in background_worker.task_handlers.items()
+        if not registration.cpu_bound
+    }
+    handlers["voice_training"] = voice_training_worker.train_voice_model
+    return handlers
+
+async def run_worker(task_types: List[str], concurrency: int):
+    """Run a standalone runner until interrupted."""
+    registry = build_handler_registry()
+    runner = DurableJobRunner(job_queue, concurrency=concurrency)
+    for task_type in task_types or list(registry):
+        runner.register_handler(task_type, registry[task_type])
+
+    await runner.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="Consume jobs from the durable job queue")
+    parser.add_argument("--types", nargs="*", default=[], help="Task types to consume (default: all)")
+    parser.add_argument("--concurrency", type=int, default=2, help="Jobs to run at once")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(run_worker(args.types, args.concurrency))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -1,94 +1,198 @@
 """
-Voice training worker stub for Phase 5B
+Voice training worker for Phase 5B
 Handles asynchronous voice model training.
 """
 import asyncio
 import json
-from typing import Dict, Any
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Any, Callable, Optional
 from datetime import datetime
 
-class VoiceTrainingWorker:
-    """Worker for training voice cloning models."""
-    
+import numpy as np
+
+from .job_queue import job_queue
+from .job_runner import DurableJobRunner
+
+FEATURE_FRAME_SIZE = 512
+FEATURE_BINS = 64
+
+def _load_samples(file_path: str) -> np.ndarray:
+    """Decode an audio file to mono float samples, falling back to raw 16-bit PCM."""
+    try:
+        import soundfile as sf
+
+        audio, _ = sf.read(file_path, dtype="float32", always_2d=True)
+        return audio.mean(axis=1)
+    except Exception:
+        with open(file_path, 'rb') as f:
+            data = f.read()
+        return np.frombuffer(data[:len(data) - len(data) % 2], dtype="<i2").astype(np.float32) / 32768.0
+
+def extract_sample_features(file_path: str) -> List[float]:
+    """
+    CPU-bound feature extraction for one sample; runs in the training pool.
+
+    Returns the mean log-magnitude spectrum over FEATURE_FRAME_SIZE frames,
+    pooled into FEATURE_BINS bands.
+    """
+    audio = _load_samples(file_path)
+    frame_count = len(audio) // FEATURE_FRAME_SIZE
+    if frame_count == 0:
+        raise ValueError(f"Sample too short for feature extraction: {file_path}")
+
+    frames = audio[:frame_count * FEATURE_FRAME_SIZE].reshape(frame_count, FEATURE_FRAME_SIZE)
+    spectrum = np.abs(np.fft.rfft(frames * np.hanning(FEATURE_FRAME_SIZE), axis=1))
+    log_spectrum = np.log1p(spectrum).mean(axis=0)
+    bands = np.array_split(log_spectrum, FEATURE_BINS)
+    return [float(band.mean()) for band in bands]
+
+def fit_voice_model(features: List[List[float]], model_path: str) -> Dict[str, Any]:
+    """Combine per-sample features into a voice model file; runs in the training pool."""
+    matrix = np.array(features, dtype=np.float32)
+    model = np.stack([matrix.mean(axis=0), matrix.std(axis=0)])
+
+    os.makedirs(os.path.dirname(model_path), exist_ok=True)
+    np.save(model_path, model)
+    return {"feature_dim": int(matrix.shape[1]), "sample_count": int(matrix.shape[0])}
+
+class TrainingProgressBroker:
+    """In-process fan-out of training progress events to SSE/WebSocket subscribers."""
+
     def __init__(self):
-        self.training_jobs = {}
+        self._subscribers: Dict[str, List[asyncio.Queue]] = {}
+
+    def subscribe(self, profile_id: str) -> asyncio.Queue:
+        """Register a subscriber queue for a profile's events."""
+        queue = asyncio.Queue()
+        self._subscribers.setdefault(profile_id, []).append(queue)
+        return queue
+
+    def unsubscribe(self, profile_id: str, queue: asyncio.Queue):
+        """Remove a subscriber queue."""
+        subscribers = self._subscribers.get(profile_id, [])
+        if queue in subscribers:
+            subscribers.remove(queue)
+        if not subscribers:
+            self._subscribers.pop(profile_id, None)
+
+    def publish(self, profile_id: str, event: Dict[str, Any]):
+        """Push an event to every subscriber of a profile."""
+        for queue in self._subscribers.get(profile_id, []):
+            queue.put_nowait(event)
+
+class VoiceTrainingWorker:
+    """
+    Worker for training voice cloning models.
+
+    Jobs are stored in the durable job queue, so queued and in-flight
+    training survives restarts and can be consumed by dedicated worker
+    processes (python -m app.workers.job_runner --types voice_training).
+    Feature extraction and model fitting run in a ProcessPoolExecutor so
+    they never block the event loop; progress is published to
+    training_progress for streaming to clients.
+    """
+
+    def __init__(self, concurrency: int = 1, process_workers: int = 2, consume_in_process: bool = True):
+        self.process_workers = process_workers
+        self.consume_in_process = consume_in_process
+        self.runner = DurableJobRunner(job_queue, concurrency=concurrency)
+        self.runner.register_handler("voice_training", self.train_voice_model)
         self.is_running = False
-    
+
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+
     async def start(self):
-        """Start the training worker."""
+        """Start consuming training jobs in this process."""
+        if not self.consume_in_process:
+            return
+
         self.is_running = True
+        await self.runner.start()
         print("Voice training worker started")
-        
-        # Start background task processing
-        asyncio.create_task(self._process_training_queue())
-    
+
     async def stop(self):
         """Stop the training worker."""
         self.is_running = False
+        await self.runner.stop()
+
+        if self._process_pool:
+            self._process_pool.shutdown(wait=False, cancel_futures=True)
+            self._process_pool = None
+
         print("Voice training worker stopped")
-    
-    async def queue_training_job(self, profile_id: str, samples: list) -> str:
-        """Queue a new voice training job."""
-        job_id = f"job_{profile_id}_{datetime.now().timestamp()}"
-        
-        self.training_jobs[job_id] = {
+
+    async def queue_training_job(self, profile_id: str, samples: list, model_path: str) -> str:
+        """
+        Queue a new voice training job.
+
+        Args:
+            profile_id: Voice profile being trained
+            samples: Paths of the profile's sample files
+            model_path: Where the trained model is written
+
+        Returns:
+            Job ID
+        """
+        job_id = job_queue.enqueue("voice_training", {
             "profile_id": profile_id,
             "samples": samples,
-            "status": "queued",
-            "progress": 0.0,
-            "started_at": None,
-            "completed_at": None,
-            "error": None
-        }
-        
+            "model_path": model_path
+        })
+        self.runner.notify()
+
         print(f"Queued training job {job_id} for profile {profile_id}")
         return job_id
-    
+
     async def get_job_status(self, job_id: str) -> Dict[str, Any]:
         """Get status of a training job."""
-        return self.training_jobs.get(job_id, {"error": "Job not found"})
-    
-    async def _process_training_queue(self):
-        """Process training jobs in the background."""
-        while self.is_running:
-            # Find queued jobs
-            for job_id, job in self.training_jobs.items():
-                if job["status"] == "queued":
-                    await self._train_voice_model(job_id, job)
-                    break
-            
-            await asyncio.sleep(5)  # Check every 5 seconds
-    
-    async def _train_voice_model(self, job_id: str, job: Dict[str, Any]):
-        """Train a voice model (stub implementation)."""
-        try:
-            job["status"] = "training"
-            job["started_at"] = datetime.now().isoformat()
-            
-            print(f"Starting voice training for job {job_id}")
-            
-            # Simulate training progress
-            for progress in [0.1, 0.3, 0.5, 0.7, 0.9, 1.0]:
-                if not self.is_running:
-                    break
-                
-                job["progress"] = progress
-                print(f"Job {job_id} progress: {progress * 100:.1f}%")
-                
-                # Simulate training time
-                await asyncio.sleep(10)
-            
-            if self.is_running:
-                job["status"] = "completed"
-                job["completed_at"] = datetime.now().isoformat()
-                print(f"Completed voice training for job {job_id}")
-            else:
-                job["status"] = "cancelled"
-                
-        except Exception as e:
-            job["status"] = "failed"
-            job["error"] = str(e)
-            print(f"Voice training failed for job {job_id}: {e}")
-
-# Global worker instance
-voice_training_worker = VoiceTrainingWorker()
+        return job_queue.get(job_id) or {"error": "Job not found"}
+
+    def _get_process_pool(self) -> ProcessPoolExecutor:
+        """Lazily create the training process pool."""
+        if self._process_pool is None:
+            self._process_pool = ProcessPoolExecutor(max_workers=self.process_workers)
+        return self._process_pool
+
+    async def train_voice_model(self, payload: Dict[str, Any], progress_callback: Callable) -> Dict[str, Any]:
+        """Durable job handler: extract features per sample in the pool, then fit the model."""
+        profile_id = payload["profile_id"]
+        samples = payload["samples"]
+        loop = asyncio.get_running_loop()
+        pool = self._get_process_pool()
+
+        def report(progress: float, status: str = "processing", **fields):
+            progress_callback(progress)
+            training_progress.publish(profile_id, {
+                "profile_id": profile_id, "status": status, "progress": progress, **fields
+            })
+
+        print(f"Starting voice training for profile {profile_id}")
+        report(0.1)
+
+        extraction = [loop.run_in_executor(pool, extract_sample_features, path) for path in samples]
+        features = []
+        for done in asyncio.as_completed(extraction):
+            features.append(await done)
+            report(0.1 + 0.8 * len(features) / len(samples))
+
+        summary = await loop.run_in_executor(pool, fit_voice_model, features, payload["model_path"])
+
+        result = {
+            "profile_id": profile_id,
+            "model_path": payload["model_path"],
+            "completed_at": datetime.now().isoformat(),
+            **summary
+        }
+        report(1.0, status="ready", model_path=payload["model_path"])
+
+        print(f"Completed voice training for profile {profile_id}")
+        return result
+
+# Global broker and worker instances
+training_progress = TrainingProgressBroker()
+voice_training_worker = VoiceTrainingWorker(
+    concurrency=int(os.getenv("VOICE_TRAINING_CONCURRENCY", "1")),
+    process_workers=int(os.getenv("VOICE_TRAINING_PROCESSES", "2")),
+    consume_in_process=os.getenv("JOB_RUNNER_IN_PROCESS", "true").lower() == "true"
+)
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for text emotion detection.
+
+Compares the previous per-keyword substring scan (text.lower() and
+`kw in text` for every keyword, re.search for every pattern) against the
+single-pass compiled scanner in EmotionDetector.
+
+Usage: python benchmark_emotion.py [transcript_count]
+"""
+import random
+import re
+import sys
+import time
+
+from modules.emotion.emotion_service import EmotionDetector, EmotionType
+
+LEGACY_PATTERNS = {
+    EmotionType.HAPPY: [r':\)', r':-\)', r':D', r'😊', r'😄', r'😃', r'\bhaha\b', r'\blol\b', r'\byay\b'],
+    EmotionType.SAD: [r':\(', r':-\(', r':\'', r'😢', r'😭', r'😞', r'\*sigh\*', r'\bcry\b'],
+    EmotionType.ANGRY: [r'>:\(', r'😠', r'😡', r'!{2,}', r'[A-Z]{3,}', r'\bdamn\b', r'\bhell\b'],
+    EmotionType.EXCITED: [r'!{1,}', r'😆', r'🎉', r'💫', r'\bwow\b', r'\bomg\b', r'\bawesome\b']
+}
+
+FILLER = (
+    "so I think we should probably look at the numbers again before the meeting "
+    "tomorrow and then maybe we can decide what to do about the rollout plan because "
+    "honestly nobody really knows yet how the customers will react to the change"
+).split()
+
+def legacy_detect(detector: EmotionDetector, text: str) -> str:
+    """Previous detect_emotion scoring, reduced to the primary emotion."""
+    scores = {}
+    indicators = []
+    for emotion, keywords in detector.emotion_keywords.items():
+        matches = sum(1 for kw in keywords if kw in text.lower())
+        scores[emotion.value] = min(1.0, matches / max(len(text.lower().split()) * 0.1, 1))
+        indicators.extend(kw for kw in keywords if kw in text.lower())
+    for emotion, patterns in LEGACY_PATTERNS.items():
+        matches = sum(1 for pattern in patterns if re.search(pattern, text))
+        scores[emotion.value] += min(0.5, matches * 0.2) * 0.5
+    if max(scores.values()) < 0.1:
+        return EmotionType.NEUTRAL.value
+    return max(scores, key=scores.get)
+
+def build_transcripts(count: int, detector: EmotionDetector):
+    """Synthetic utterances: mostly filler words with a few emotion cues."""
+    cues = [kw for keywords in detector.emotion_keywords.values() for kw in keywords]
+    cues += [m for markers in detector.emotion_markers.values() for m in markers] + ["!!", "?", "WHAT"]
+    transcripts = []
+    for _ in range(count):
+        words = random.choices(FILLER, k=random.randint(8, 40))
+        for _ in range(random.randint(0, 3)):
+            words.insert(random.randrange(len(words) + 1), random.choice(cues))
+        transcripts.append(" ".join(words))
+    return transcripts
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    detector = EmotionDetector()
+    transcripts = build_transcripts(count, detector)
+    words = sum(len(t.split()) for t in transcripts)
+    print(f"{count:,} transcripts, {words:,} words")
+
+    started = time.perf_counter()
+    for text in transcripts:
+        legacy_detect(detector, text)
+    legacy_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    detector.detect_emotions(transcripts)
+    compiled_s = time.perf_counter() - started
+
+    print(f"Substring scan:    {count / legacy_s:10,.0f} texts/s")
+    print(f"Compiled scanner:  {count / compiled_s:10,.0f} texts/s")
+    print(f"Speedup:           {legacy_s / compiled_s:10.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Memory benchmark for per-session state.
+
+Measures with tracemalloc how many bytes each live session costs in the
+streaming manager, the analytics tracker and the conversation log,
+comparing the previous representations (plain dataclasses, a dict of
+boxed counters per analytics session, an unused audio_buffer list,
+per-request copies of language codes) against the slotted dataclasses,
+interned codes and struct-of-arrays counters.
+
+Usage: python benchmark_session_memory.py [session_count] [entries_per_session]
+"""
+import gc
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from app.services.analytics.analytics_service import AnalyticsService
+from app.services.conversation_logger import ConversationEntry
+from app.services.streaming.streaming_service import StreamSession
+
+LANGUAGES = ["en", "ur", "es", "fr", "de", "ar"]
+EMOTIONS = ["neutral", "happy", "sad", "angry", "excited"]
+
+@dataclass
+class LegacyStreamSession:
+    session_id: str
+    user_id: Optional[str]
+    source_lang: str
+    target_lang: str
+    translate_enabled: bool
+    voice_profile_id: Optional[str]
+    created_at: float
+    last_activity: float
+    audio_buffer: List
+    partial_text: str
+    final_text: str
+    sequence_counter: int
+
+@dataclass
+class LegacyConversationEntry:
+    timestamp: str
+    session_id: str
+    speaker_id: str
+    speaker_label: str
+    original_text: str
+    translated_text: Optional[str]
+    source_language: Optional[str]
+    target_language: Optional[str]
+    emotion: str
+    emotion_confidence: float
+    audio_file_path: Optional[str] = None
+
+def fresh(value: str) -> str:
+    """A new string object, as decoded from a request body."""
+    return "".join(list(value))
+
+def legacy_sessions(count: int, entries: int) -> list:
+    """Build state the way it was held before."""
+    state = []
+    for i in range(count):
+        lang = LANGUAGES[i % len(LANGUAGES)]
+        stream = LegacyStreamSession(
+            f"s{i}", f"u{i}", fresh(lang), fresh("en"), True, None,
+            time.time(), time.time(), [], "", "", 0
+        )
+        analytics = {
+            "user_id": f"u{i}",
+            "start_time": datetime.now().isoformat(),
+            "language": fresh(lang),
+            "message_count": 0,
+            "audio_minutes": 0.0,
+            "tokens_used": 0,
+            "features_used": set(),
+            "endpoint_calls": defaultdict(int),
+            "errors": []
+        }
+        for _ in range(entries):
+            analytics["message_count"] += 1
+            analytics["tokens_used"] += 1234
+            analytics["audio_minutes"] += 2.5 / 60
+        log = [
+            LegacyConversationEntry(
+                datetime.now().isoformat(), f"s{i}", "speaker_1", "Speaker 1", "hello there",
+                None, fresh(lang), fresh("en"), fresh(EMOTIONS[n % len(EMOTIONS)]), 0.9
+            )
+            for n in range(entries)
+        ]
+        state.append((stream, analytics, log))
+    return state
+
+def compact_sessions(count: int, entries: int) -> list:
+    """Build the same state with the current representations."""
+    analytics = AnalyticsService(storage_path=tempfile.mkdtemp())
+    state = [analytics]
+    for i in range(count):
+        lang = LANGUAGES[i % len(LANGUAGES)]
+        stream = StreamSession(
+            f"s{i}", f"u{i}", fresh(lang), fresh("en"), True, None,
+            time.time(), time.time(), "", "", 0
+        )
+        analytics.start_session(f"s{i}", f"u{i}", fresh(lang))
+        for _ in range(entries):
+            analytics.track_message(f"s{i}", 1234)
+            analytics.track_audio(f"s{i}", 2.5)
+        log = [
+            ConversationEntry(
+                datetime.now().isoformat(), f"s{i}", "speaker_1", "Speaker 1", "hello there",
+                None, fresh(lang), fresh("en"), fresh(EMOTIONS[n % len(EMOTIONS)]), 0.9
+            )
+            for n in range(entries)
+        ]
+        state.append((stream, log))
+    return state
+
+def measure(build: Callable[[int, int], list], count: int, entries: int) -> float:
+    """Bytes allocated per session by build(), as seen by tracemalloc."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    state = build(count, entries)
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    del state
+    return allocated / count
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    entries = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    print(f"{count:,} sessions, {entries} log entries each")
+
+    # Warm up imports and caches outside the measurement
+    compact_sessions(10, entries)
+
+    legacy_bytes = measure(legacy_sessions, count, entries)
+    compact_bytes = measure(compact_sessions, count, entries)
+
+    print(f"Before:  {legacy_bytes:10,.0f} bytes/session")
+    print(f"After:   {compact_bytes:10,.0f} bytes/session")
+    print(f"Saved:   {(1 - compact_bytes / legacy_bytes) * 100:9.1f}%")
+
+if __name__ == "__main__":
+    main()
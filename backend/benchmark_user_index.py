@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Benchmark for per-user analytics queries.
+
+Writes synthetic sessions into an on-disk ColumnarMetricsStore and times
+AnalyticsService.get_user_analytics, the path behind
+/analytics/users/{user_id}: a cold query hydrates the user's index entry
+from the partition column files, then every query reads the selected
+rows through the memory-mapped columns. The previous linear scan over
+every session (parsing start_time on each one) is timed for reference.
+
+Usage: python benchmark_user_index.py [session_count] [user_count]
+"""
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from app.services.analytics.analytics_service import AnalyticsService
+
+FEATURES = ["translation", "voice_profile", "tts", "multiparty"]
+
+def build_sessions(session_count: int, user_count: int):
+    """Generate synthetic sessions spread over the last 90 days."""
+    now = datetime.now()
+    sessions = []
+    for i in range(session_count):
+        start = now - timedelta(seconds=random.randint(0, 90 * 86400))
+        sessions.append({
+            "session_id": f"s{i}",
+            "user_id": f"user_{random.randrange(user_count)}",
+            "start_time": start.isoformat(),
+            "duration_seconds": random.uniform(10, 600),
+            "message_count": random.randint(1, 40),
+            "audio_minutes": random.uniform(0, 10),
+            "tokens_used": random.randint(50, 5000),
+            "language": random.choice(["en", "es", "fr", "ur"]),
+            "features_used": random.sample(FEATURES, random.randint(0, 2)),
+            "endpoint_calls": {"/chat": random.randint(1, 20)},
+            "error_count": 0,
+        })
+    return sessions
+
+def write_store(storage_path: str, sessions):
+    """Append the sessions to the columnar store the way end_session does."""
+    service = AnalyticsService(storage_path=storage_path)
+    for s in sessions:
+        service.store.append(**s)
+    service.checkpoint()
+
+def linear_lookup(sessions, user_id: str, start_date: datetime):
+    """Previous get_user_analytics filter."""
+    return [
+        s for s in sessions
+        if s["user_id"] == user_id and datetime.fromisoformat(s["start_time"]) >= start_date
+    ]
+
+def time_queries(service: AnalyticsService, user_ids):
+    """Run get_user_analytics for each user; returns (ms per query, session counts)."""
+    started = time.perf_counter()
+    results = [service.get_user_analytics(user_id, days=30) for user_id in user_ids]
+    elapsed_ms = (time.perf_counter() - started) * 1000 / len(user_ids)
+    return elapsed_ms, [r["summary"].get("total_sessions", 0) for r in results]
+
+def main():
+    session_count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    user_count = int(sys.argv[2]) if len(sys.argv) > 2 else 5_000
+    queries = 20
+
+    print(f"Generating {session_count:,} sessions for {user_count:,} users...")
+    sessions = build_sessions(session_count, user_count)
+
+    with tempfile.TemporaryDirectory() as storage_path:
+        started = time.perf_counter()
+        write_store(storage_path, sessions)
+        print(f"Store write: {time.perf_counter() - started:.2f}s")
+
+        user_ids = random.sample([f"user_{i}" for i in range(user_count)], min(queries, user_count))
+        start_date = datetime.now() - timedelta(days=30)
+
+        started = time.perf_counter()
+        linear_hits = [len(linear_lookup(sessions, user_id, start_date)) for user_id in user_ids]
+        linear_ms = (time.perf_counter() - started) * 1000 / len(user_ids)
+
+        # A fresh service has no user index in memory, like a restarted worker
+        started = time.perf_counter()
+        service = AnalyticsService(storage_path=storage_path)
+        open_ms = (time.perf_counter() - started) * 1000
+
+        cold_ms, cold_hits = time_queries(service, user_ids)
+        warm_ms, warm_hits = time_queries(service, user_ids)
+
+        # Sessions within a second of the cutoff may fall either side of it
+        assert all(abs(a - b) <= 1 for a, b in zip(linear_hits, cold_hits)), "store and linear scan disagree"
+        assert cold_hits == warm_hits, "cold and warm queries disagree"
+
+    print(f"Service open:        {open_ms:10.3f} ms")
+    print(f"Linear scan:         {linear_ms:10.3f} ms/query")
+    print(f"Store, cold index:   {cold_ms:10.3f} ms/query (hydration + memmap reads)")
+    print(f"Store, warm index:   {warm_ms:10.3f} ms/query (memmap reads)")
+    print(f"Speedup (warm):      {linear_ms / max(warm_ms, 1e-9):10.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -2,12 +2,23 @@
 main.py - Voice AI Bot Backend Entry Point (Phase 5B)
 FastAPI application with multiparty conversations, persistent memory, and containerization.
 """
+import asyncio
+import os
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from app.routes import base, chat, transcribe, ws_stream_simple as ws_stream, voice_profiles, analytics, dashboard, phase5b, multi_lang_simple
+from app.routes import base, chat, transcribe, ws_stream_simple as ws_stream, voice_profiles, analytics, dashboard, phase4, phase5b, multi_lang_simple, multi_language_ws
 from app.db import create_tables
 from app.config import settings
+from app.services.analytics.analytics_service import analytics_service
+from app.workers.background_worker import background_worker
+from app.workers.voice_training_worker import voice_training_worker
+from app.services.local_asr import local_asr_pool
+from app.services.local_mode import local_mode_service
+from app.services.rate_limiter import RateLimitMiddleware, rate_limiter
+from modules.auth.key_store import api_key_store
+from app.services.expiry import expiry_scheduler
+from app.services.batch_analysis import text_batch_analyzer
 
 # Initialize FastAPI application
 app = FastAPI(
@@ -28,6 +39,10 @@ allowed_origins = settings.ALLOWED_ORIGINS.split(",") if settings.ALLOWED_ORIGIN
     "http://127.0.0.1:3003"
 ]
 
+# Rate limits per API key, route class and WebSocket message type; added
+# before CORS so 429 responses still carry CORS headers
+app.add_middleware(RateLimitMiddleware, limiter=rate_limiter)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=allowed_origins,
@@ -40,6 +55,28 @@ app.add_middleware(
 @app.on_event("startup")
 async def startup_event():
     create_tables()
+    asyncio.create_task(analytics_service.run_checkpoint_loop())
+    asyncio.create_task(api_key_store.run_flush_loop())
+    # Single task that expires idle sessions, buffers and rooms
+    asyncio.create_task(expiry_scheduler.run())
+    await background_worker.start()
+    await voice_training_worker.start()
+    # Warm the local ASR model pool so the first local request doesn't pay for loading
+    if os.getenv("LOCAL_ASR_PRELOAD", "true").lower() == "true":
+        await asyncio.to_thread(local_asr_pool.load)
+    # Probe cloud/local backends whose circuit is open so they recover without traffic
+    asyncio.create_task(local_mode_service.run_health_probes(
+        float(os.getenv("FAILOVER_PROBE_INTERVAL", "10"))
+    ))
+
+# Flush pending analytics aggregates and stop background workers and pools on shutdown
+@app.on_event("shutdown")
+async def shutdown_event():
+    analytics_service.checkpoint()
+    api_key_store.flush_usage()
+    await background_worker.stop()
+    await voice_training_worker.stop()
+    text_batch_analyzer.shutdown()
 
 # Mount static files
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -55,9 +92,13 @@ app.include_router(voice_profiles.router, prefix="/api/v1", tags=["Voice Profile
 app.include_router(analytics.router, prefix="/api/v1", tags=["Analytics"])
 app.include_router(dashboard.router, prefix="/admin", tags=["Dashboard"])
 
+# Phase 4 router: sessions, speaker/emotion analysis, history and export
+app.include_router(phase4.router, prefix="/api/v1", tags=["Phase 4 - Sessions & Analysis"])
+
 # Phase 5B routers
 app.include_router(phase5b.router, prefix="/api/v2", tags=["Phase 5B - Multiparty & Persistence"])
 app.include_router(multi_lang_simple.router, prefix="/api/v2", tags=["Multi-Language Simple"])
+app.include_router(multi_language_ws.router, prefix="/api/v2/multi-language", tags=["Multi-Language Rooms"])
 
 # To run: uvicorn main:app --reload
 
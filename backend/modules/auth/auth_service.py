@@ -2,12 +2,17 @@
 Enhanced Authentication Service for Phase 4
 Manages API keys, sessions, and user access control.
 """
-import hashlib
+import os
 import secrets
 from datetime import datetime, timedelta
-from typing import Dict, Optional, Set
+from typing import Dict, Optional
 from dataclasses import dataclass
 
+from modules.auth.key_store import StoredKey, api_key_store
+
+# Development-only key, see ENABLE_TEST_API_KEY
+TEST_API_KEY = "fast_API_KEY"
+
 @dataclass
 class SessionInfo:
     """Information about an active session."""
@@ -20,27 +25,17 @@ class SessionInfo:
     target_language: Optional[str] = None
     user_preferences: Dict = None
 
-@dataclass
-class APIKeyInfo:
-    """Information about an API key."""
-    key_hash: str
-    name: str
-    created_at: datetime
-    last_used: datetime
-    request_count: int
-    is_active: bool
-    rate_limit: int = 100  # requests per hour
-
 class EnhancedAuthService:
     """
     Enhanced authentication service with session management.
     """
     
     def __init__(self):
-        self.valid_api_keys: Set[str] = set()
-        self.api_key_info: Dict[str, APIKeyInfo] = {}
+        # Keys live in the shared hashed key store, never in raw form here
+        self.key_store = api_key_store
         self.active_sessions: Dict[str, SessionInfo] = {}
-        self.rate_limits: Dict[str, Dict] = {}
+        self.session_lifetime = timedelta(hours=24)
+        self.expiry = None  # set by use_expiry_scheduler()
         
         # Load default API key from config
         self._load_default_api_keys()
@@ -50,19 +45,25 @@ class EnhancedAuthService:
         try:
             from config.settings import settings
             default_key = settings.API_KEY
-            if default_key:
-                self.add_api_key(default_key, "Default API Key")
         except ImportError:
             # Fallback to direct environment variable
-            import os
             from dotenv import load_dotenv
             load_dotenv()
             default_key = os.getenv("API_KEY")
-            if default_key:
-                self.add_api_key(default_key, "Default API Key")
         
-        # Also add the test key for validation
-        self.add_api_key("fast_API_KEY", "Test API Key")
+        if default_key:
+            # The configured key is always usable, even if it was revoked before
+            self.key_store.add_key(default_key, "Default API Key", reactivate=True)
+        
+        # The well-known test key used by debug_server.py and the stream test
+        # page is only honoured when explicitly enabled for local development,
+        # unless it is the configured API_KEY itself
+        if os.getenv("ENABLE_TEST_API_KEY", "false").lower() == "true":
+            self.add_api_key(TEST_API_KEY, "Test API Key")
+        elif default_key != TEST_API_KEY:
+            record = self.key_store.verify(TEST_API_KEY)
+            if record:
+                self.key_store.revoke(record.key_id)
     
     def add_api_key(self, api_key: str, name: str = "API Key") -> str:
         """
@@ -73,21 +74,9 @@ class EnhancedAuthService:
             name: Human-readable name for the key
             
         Returns:
-            Key hash for tracking
+            Key ID for tracking
         """
-        key_hash = hashlib.sha256(api_key.encode()).hexdigest()[:16]
-        
-        self.valid_api_keys.add(api_key)
-        self.api_key_info[api_key] = APIKeyInfo(
-            key_hash=key_hash,
-            name=name,
-            created_at=datetime.now(),
-            last_used=datetime.now(),
-            request_count=0,
-            is_active=True
-        )
-        
-        return key_hash
+        return self.key_store.add_key(api_key, name).key_id
     
     def validate_api_key(self, api_key: str) -> bool:
         """
@@ -99,21 +88,12 @@ class EnhancedAuthService:
         Returns:
             True if valid, False otherwise
         """
-        if not api_key or api_key not in self.valid_api_keys:
-            return False
-        
-        # Check if key is active
-        key_info = self.api_key_info.get(api_key)
-        if not key_info or not key_info.is_active:
-            return False
-        
-        # Check rate limits
-        if not self._check_rate_limit(api_key):
+        # Rate limits are enforced by RateLimitMiddleware (app.services.rate_limiter)
+        record = self.key_store.verify(api_key)
+        if record is None:
             return False
         
-        # Update usage statistics
-        self._update_key_usage(api_key)
-        
+        self.key_store.record_use(record.key_id)
         return True
     
     def create_session(self, api_key: str, preferences: Dict = None) -> str:
@@ -127,7 +107,7 @@ class EnhancedAuthService:
         Returns:
             Session ID
         """
-        if not self.validate_api_key(api_key):
+        if self.key_store.verify(api_key) is None:
             raise ValueError("Invalid API key")
         
         session_id = secrets.token_urlsafe(32)
@@ -140,6 +120,8 @@ class EnhancedAuthService:
             request_count=0,
             user_preferences=preferences or {}
         )
+        if self.expiry:
+            self.expiry.touch("auth_session", session_id)
         
         return session_id
     
@@ -159,7 +141,7 @@ class EnhancedAuthService:
         session = self.active_sessions[session_id]
         
         # Check if session is expired (24 hours)
-        if datetime.now() - session.created_at > timedelta(hours=24):
+        if datetime.now() - session.created_at > self.session_lifetime:
             self.end_session(session_id)
             return False
         
@@ -189,62 +171,36 @@ class EnhancedAuthService:
         Returns:
             True if session was ended, False if not found
         """
+        if self.expiry:
+            self.expiry.cancel("auth_session", session_id)
         if session_id in self.active_sessions:
             del self.active_sessions[session_id]
             return True
         return False
     
-    def _check_rate_limit(self, api_key: str) -> bool:
-        """Check if API key has exceeded rate limits."""
-        now = datetime.now()
-        hour_key = now.strftime("%Y-%m-%d-%H")
-        
-        if api_key not in self.rate_limits:
-            self.rate_limits[api_key] = {}
-        
-        key_limits = self.rate_limits[api_key]
-        
-        # Clean old entries
-        old_keys = [k for k in key_limits.keys() if k != hour_key]
-        for old_key in old_keys:
-            del key_limits[old_key]
-        
-        # Check current hour limit
-        current_requests = key_limits.get(hour_key, 0)
-        rate_limit = self.api_key_info[api_key].rate_limit
+    def use_expiry_scheduler(self, scheduler):
+        """
+        Have a scheduler end sessions when their lifetime is up.
         
-        if current_requests >= rate_limit:
-            return False
+        Sessions expire a fixed time after creation, so they are scheduled
+        once and not touched on activity.
         
-        # Increment counter
-        key_limits[hour_key] = current_requests + 1
-        return True
-    
-    def _update_key_usage(self, api_key: str):
-        """Update API key usage statistics."""
-        if api_key in self.api_key_info:
-            info = self.api_key_info[api_key]
-            info.last_used = datetime.now()
-            info.request_count += 1
+        Args:
+            scheduler: ExpiryScheduler (app.services.expiry)
+        """
+        self.expiry = scheduler
+        scheduler.register("auth_session", self.session_lifetime.total_seconds(), self.end_session)
+        for session_id, session in self.active_sessions.items():
+            remaining = self.session_lifetime - (datetime.now() - session.created_at)
+            scheduler.touch("auth_session", session_id, ttl=max(0.0, remaining.total_seconds()))
     
-    def get_api_key_stats(self, api_key: str) -> Optional[APIKeyInfo]:
+    def get_api_key_stats(self, api_key: str) -> Optional[StoredKey]:
         """Get statistics for an API key."""
-        return self.api_key_info.get(api_key)
+        return self.key_store.verify(api_key, include_inactive=True)
     
     def get_active_sessions_count(self) -> int:
         """Get count of active sessions."""
         return len(self.active_sessions)
-    
-    def cleanup_expired_sessions(self):
-        """Clean up expired sessions."""
-        now = datetime.now()
-        expired_sessions = [
-            sid for sid, session in self.active_sessions.items()
-            if now - session.created_at > timedelta(hours=24)
-        ]
-        
-        for session_id in expired_sessions:
-            self.end_session(session_id)
 
 # Global enhanced auth service instance
 enhanced_auth_service = EnhancedAuthService()
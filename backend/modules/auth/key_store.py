@@ -0,0 +1,263 @@
+"""
+API key store
+Keeps only salted hashes of tenant API keys, verifies presented keys in
+constant time behind a small LRU, and batches usage statistics.
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+@dataclass
+class StoredKey:
+    """A tenant API key, without the key itself."""
+    key_id: str
+    name: str
+    tenant: str
+    salt: str
+    key_hash: str
+    fingerprint: str
+    created_at: str
+    is_active: bool = True
+    last_used: Optional[str] = None
+    request_count: int = 0
+
+    def public_dict(self) -> Dict:
+        """Key details safe to show (no hash or salt)."""
+        data = asdict(self)
+        del data["salt"], data["key_hash"], data["fingerprint"]
+        return data
+
+class APIKeyStore:
+    """
+    Salted-hash API key store.
+
+    Keys are stored as PBKDF2-SHA256 hashes with a per-key salt. To avoid
+    hashing a presented key against every tenant, each record also keeps
+    a short fingerprint that narrows the candidates: the first hex digits
+    of an HMAC of the key under a server-side index secret, which is kept
+    out of the key file (API_KEY_INDEX_SECRET, or a 0600 file next to
+    it), so the file alone gives no cheap way to test guesses. The salted
+    hash then decides, compared with hmac.compare_digest. Verified keys
+    are remembered in an LRU (by SHA-256 digest, in memory only, for
+    cache_ttl seconds) so the slow hash runs once per key rather than once
+    per request. Usage counts are buffered and applied by flush_usage(),
+    off the request path.
+    """
+
+    FINGERPRINT_CHARS = 8
+
+    def __init__(self,
+                 path: Optional[str] = None,
+                 iterations: int = 100_000,
+                 cache_size: int = 1024,
+                 cache_ttl: float = 300.0,
+                 index_secret: Optional[bytes] = None):
+        self.path = path
+        self.index_secret = index_secret or self._load_index_secret()
+        self.iterations = iterations
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+
+        self.keys: Dict[str, StoredKey] = {}
+        self._by_fingerprint: Dict[str, List[str]] = {}
+        self._cache: "OrderedDict[bytes, Tuple[str, float]]" = OrderedDict()
+        self._pending_counts: Dict[str, int] = {}
+        self._pending_last_used: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+        if path and os.path.exists(path):
+            self._load()
+
+    def _load_index_secret(self) -> bytes:
+        """Secret for fingerprints: kept beside the key file, never inside it."""
+        if not self.path:
+            return secrets.token_bytes(32)
+
+        secret_path = f"{self.path}.index_secret"
+        if os.path.exists(secret_path):
+            with open(secret_path, "rb") as f:
+                return bytes.fromhex(f.read().decode().strip())
+
+        secret = secrets.token_bytes(32)
+        os.makedirs(os.path.dirname(secret_path) or ".", exist_ok=True)
+        fd = os.open(secret_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "w") as f:
+            f.write(secret.hex())
+        return secret
+
+    def _fingerprint(self, raw_key: str) -> str:
+        return hmac.new(self.index_secret, raw_key.encode(), hashlib.sha256).hexdigest()[:self.FINGERPRINT_CHARS]
+
+    def _hash(self, raw_key: str, salt: bytes) -> bytes:
+        return hashlib.pbkdf2_hmac("sha256", raw_key.encode(), salt, self.iterations)
+
+    @staticmethod
+    def _digest(raw_key: str) -> bytes:
+        return hashlib.sha256(raw_key.encode()).digest()
+
+    def add_key(self, raw_key: str, name: str = "API Key", tenant: str = "default",
+                reactivate: bool = False) -> StoredKey:
+        """
+        Register an existing key; registering the same key again is a no-op.
+
+        Args:
+            reactivate: Re-enable the key if it was revoked (for keys that
+                come from configuration, which stays authoritative)
+
+        Returns:
+            The stored record
+        """
+        existing = self.verify(raw_key, include_inactive=True)
+        if existing:
+            if reactivate and not existing.is_active:
+                with self._lock:
+                    existing.is_active = True
+                self.save()
+            return existing
+
+        salt = secrets.token_bytes(16)
+        record = StoredKey(
+            key_id=secrets.token_hex(8),
+            name=name,
+            tenant=tenant,
+            salt=salt.hex(),
+            key_hash=self._hash(raw_key, salt).hex(),
+            fingerprint=self._fingerprint(raw_key),
+            created_at=datetime.now().isoformat()
+        )
+        with self._lock:
+            self._index(record)
+        self.save()
+        return record
+
+    def create_key(self, name: str, tenant: str = "default") -> Tuple[str, StoredKey]:
+        """
+        Generate a new key for a tenant.
+
+        Returns:
+            (raw key, shown only this once; stored record)
+        """
+        raw_key = "vk_" + secrets.token_urlsafe(32)
+        return raw_key, self.add_key(raw_key, name, tenant)
+
+    def verify(self, raw_key: Optional[str], include_inactive: bool = False) -> Optional[StoredKey]:
+        """
+        Look up the record for a presented key.
+
+        Args:
+            raw_key: Key from the request
+            include_inactive: Also return revoked keys
+
+        Returns:
+            The matching record, or None
+        """
+        if not raw_key:
+            return None
+
+        digest = self._digest(raw_key)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._cache.get(digest)
+            if cached and cached[1] > now:
+                self._cache.move_to_end(digest)
+                record = self.keys.get(cached[0])
+                if record and (record.is_active or include_inactive):
+                    return record
+            candidates = [self.keys[key_id] for key_id in self._by_fingerprint.get(self._fingerprint(raw_key), [])]
+
+        for record in candidates:
+            if hmac.compare_digest(self._hash(raw_key, bytes.fromhex(record.salt)), bytes.fromhex(record.key_hash)):
+                if record.is_active:
+                    with self._lock:
+                        self._cache[digest] = (record.key_id, now + self.cache_ttl)
+                        self._cache.move_to_end(digest)
+                        while len(self._cache) > self.cache_size:
+                            self._cache.popitem(last=False)
+                return record if (record.is_active or include_inactive) else None
+        return None
+
+    def record_use(self, key_id: str):
+        """Count a request for a key; applied at the next flush."""
+        self._pending_counts[key_id] = self._pending_counts.get(key_id, 0) + 1
+        self._pending_last_used[key_id] = time.time()
+
+    def revoke(self, key_id: str) -> bool:
+        """Deactivate a key and drop it from the verification cache."""
+        with self._lock:
+            record = self.keys.get(key_id)
+            if record is None:
+                return False
+            record.is_active = False
+            for digest in [digest for digest, (cached_id, _) in self._cache.items() if cached_id == key_id]:
+                del self._cache[digest]
+        self.save()
+        return True
+
+    def list_keys(self, tenant: Optional[str] = None) -> List[Dict]:
+        """Public details of all keys, optionally for one tenant."""
+        return [record.public_dict() for record in self.keys.values() if tenant is None or record.tenant == tenant]
+
+    def flush_usage(self):
+        """Apply buffered usage counts to the records and persist them."""
+        counts, self._pending_counts = self._pending_counts, {}
+        last_used, self._pending_last_used = self._pending_last_used, {}
+        if not counts:
+            return
+
+        with self._lock:
+            for key_id, count in counts.items():
+                record = self.keys.get(key_id)
+                if record:
+                    record.request_count += count
+                    record.last_used = datetime.fromtimestamp(last_used[key_id]).isoformat()
+        self.save()
+
+    async def run_flush_loop(self, interval: float = 30.0):
+        """Flush usage statistics periodically while the app is running."""
+        while True:
+            await asyncio.sleep(interval)
+            await asyncio.to_thread(self.flush_usage)
+
+    def _index(self, record: StoredKey):
+        """Add a record to the lookup tables (lock held)."""
+        self.keys[record.key_id] = record
+        self._by_fingerprint.setdefault(record.fingerprint, []).append(record.key_id)
+
+    def _load(self):
+        with open(self.path) as f:
+            for data in json.load(f):
+                self._index(StoredKey(**data))
+
+    def save(self):
+        """Write the store to disk (hashes only), replacing the file atomically."""
+        if not self.path:
+            return
+        with self._lock:
+            data = [asdict(record) for record in self.keys.values()]
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+# Global key store; API_KEYS adds tenant keys as "tenant:key,tenant:key"
+api_key_store = APIKeyStore(
+    path=os.getenv("API_KEY_STORE_PATH", "keys/api_keys.json") or None,
+    iterations=int(os.getenv("API_KEY_HASH_ITERATIONS", "100000")),
+    cache_size=int(os.getenv("API_KEY_CACHE_SIZE", "1024")),
+    index_secret=bytes.fromhex(os.getenv("API_KEY_INDEX_SECRET", "")) or None
+)
+for _entry in filter(None, (entry.strip() for entry in os.getenv("API_KEYS", "").split(","))):
+    _tenant, _, _raw_key = _entry.rpartition(":")
+    api_key_store.add_key(_raw_key, name=f"{_tenant or 'default'} key", tenant=_tenant or "default",
+                          reactivate=True)
@@ -7,6 +7,31 @@ from typing import Dict, List, Tuple
 from dataclasses import dataclass
 from enum import Enum
 
+def _trie_pattern(literals) -> str:
+    """
+    Regex alternation for a set of literals, factored as a prefix trie.
+    
+    Shared prefixes are matched once, so the regex engine does at most one
+    branch test per character instead of trying every literal in turn.
+    """
+    trie: Dict[str, dict] = {}
+    for literal in literals:
+        node = trie
+        for char in literal:
+            node = node.setdefault(char, {})
+        node[''] = {}
+    
+    def build(node: Dict[str, dict]) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        pattern = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if '' in node:
+            pattern = '(?:' + pattern + ')?'
+        return pattern
+    
+    return build(trie)
+
 class EmotionType(Enum):
     """Basic emotion types."""
     HAPPY = "happy"
@@ -61,24 +86,55 @@ class EmotionDetector:
             ]
         }
         
-        self.emotion_patterns = {
+        # Literal emoticons, emoji and case-sensitive marker words
+        self.emotion_markers = {
             EmotionType.HAPPY: [
-                r':\)', r':-\)', r':D', r'😊', r'😄', r'😃',
-                r'\bhaha\b', r'\blol\b', r'\byay\b'
+                ':)', ':-)', ':D', '😊', '😄', '😃', 'haha', 'lol', 'yay'
             ],
             EmotionType.SAD: [
-                r':\(', r':-\(', r':\'', r'😢', r'😭', r'😞',
-                r'\*sigh\*', r'\bcry\b'
+                ':(', ':-(', ":'", '😢', '😭', '😞', '*sigh*', 'cry'
             ],
             EmotionType.ANGRY: [
-                r'>:\(', r'😠', r'😡', r'!{2,}', r'[A-Z]{3,}',
-                r'\bdamn\b', r'\bhell\b'
+                '>:(', '😠', '😡', 'damn', 'hell'
             ],
             EmotionType.EXCITED: [
-                r'!{1,}', r'😆', r'🎉', r'💫', r'\bwow\b',
-                r'\bomg\b', r'\bawesome\b'
+                '😆', '🎉', '💫', 'wow', 'omg', 'awesome'
             ]
         }
+        
+        self._compile()
+    
+    def _compile(self):
+        """
+        Build the single-pass scanner from the keyword and marker tables.
+        
+        All keywords and marker words go into one case-insensitive trie
+        regex anchored on word boundaries (so "hell" no longer matches
+        "hello"), symbols into a second trie, and exclamation runs and
+        all-caps words get their own groups. detect_emotion then makes one
+        finditer pass per text and resolves each match with a dict lookup.
+        """
+        self._keyword_emotions: Dict[str, List[EmotionType]] = {}
+        for emotion, keywords in self.emotion_keywords.items():
+            for keyword in keywords:
+                self._keyword_emotions.setdefault(keyword.lower(), []).append(emotion)
+        
+        self._marker_emotions: Dict[str, List[EmotionType]] = {}
+        for emotion, markers in self.emotion_markers.items():
+            for marker in markers:
+                self._marker_emotions.setdefault(marker, []).append(emotion)
+        
+        words = set(self._keyword_emotions)
+        words.update(m.lower() for m in self._marker_emotions if m.isalpha())
+        symbols = [m for m in self._marker_emotions if not m.isalpha()]
+        
+        self._scanner = re.compile(
+            r"(?P<word>\b(?i:" + _trie_pattern(words) + r")\b)"
+            r"|(?P<caps>\b[A-Z]{3,}\b)"
+            r"|(?P<symbol>" + _trie_pattern(symbols) + r")"
+            r"|(?P<bang>!+)"
+        )
+        self._caps_word = re.compile(r"[A-Z]{3,}")
     
     def detect_emotion(self, text: str, context: Dict = None) -> EmotionResult:
         """
@@ -91,26 +147,52 @@ class EmotionDetector:
         Returns:
             EmotionResult with detected emotion and metadata
         """
+        keyword_hits = {emotion: {} for emotion in self.emotion_keywords}
+        marker_hits = {emotion: set() for emotion in self.emotion_markers}
+        longest_bang = 0
+        has_caps = False
+        
+        for match in self._scanner.finditer(text):
+            kind = match.lastgroup
+            token = match.group()
+            
+            if kind == "word":
+                for emotion in self._keyword_emotions.get(token.lower(), ()):
+                    keyword_hits[emotion][token.lower()] = True
+                for emotion in self._marker_emotions.get(token, ()):
+                    marker_hits[emotion].add(token)
+                if not has_caps and self._caps_word.fullmatch(token):
+                    has_caps = True
+            elif kind == "caps":
+                has_caps = True
+            elif kind == "symbol":
+                for emotion in self._marker_emotions[token]:
+                    marker_hits[emotion].add(token)
+            else:
+                longest_bang = max(longest_bang, len(token))
+        
+        # Exclamations and shouting count as markers too
+        if longest_bang:
+            marker_hits[EmotionType.EXCITED].add("!")
+        if longest_bang >= 2:
+            marker_hits[EmotionType.ANGRY].add("!!")
+        if has_caps:
+            marker_hits[EmotionType.ANGRY].add("CAPS")
+        
+        # Keyword score: distinct keywords relative to text length
+        word_count = len(text.split())
         emotion_scores = {}
         detected_indicators = []
+        for emotion, found in keyword_hits.items():
+            emotion_scores[emotion.value] = min(1.0, len(found) / max(word_count * 0.1, 1))
+            detected_indicators.extend(found)
         
-        # Analyze keywords
-        for emotion, keywords in self.emotion_keywords.items():
-            score = self._calculate_keyword_score(text.lower(), keywords)
-            emotion_scores[emotion.value] = score
-            
-            # Track which keywords were found
-            found_keywords = [kw for kw in keywords if kw in text.lower()]
-            if found_keywords:
-                detected_indicators.extend(found_keywords)
-        
-        # Analyze patterns
-        for emotion, patterns in self.emotion_patterns.items():
-            pattern_score = self._calculate_pattern_score(text, patterns)
-            emotion_scores[emotion.value] += pattern_score * 0.5
-        
-        # Analyze punctuation and capitalization
-        punctuation_emotion, punctuation_score = self._analyze_punctuation(text)
+        # Marker score
+        for emotion, found in marker_hits.items():
+            emotion_scores[emotion.value] += min(0.5, len(found) * 0.2) * 0.5
+        
+        # Punctuation and capitalization
+        punctuation_emotion, punctuation_score = self._analyze_punctuation(text, longest_bang, has_caps)
         if punctuation_emotion:
             emotion_scores[punctuation_emotion.value] += punctuation_score
         
@@ -134,21 +216,24 @@ class EmotionDetector:
             detected_indicators=detected_indicators
         )
     
-    def _calculate_keyword_score(self, text: str, keywords: List[str]) -> float:
-        """Calculate emotion score based on keyword matches."""
-        matches = sum(1 for keyword in keywords if keyword in text)
-        word_count = len(text.split())
-        return min(1.0, matches / max(word_count * 0.1, 1))
-    
-    def _calculate_pattern_score(self, text: str, patterns: List[str]) -> float:
-        """Calculate emotion score based on pattern matches."""
-        matches = sum(1 for pattern in patterns if re.search(pattern, text))
-        return min(0.5, matches * 0.2)
+    def detect_emotions(self, texts: List[str], context: Dict = None) -> List[EmotionResult]:
+        """
+        Detect emotion for a batch of texts.
+        
+        Args:
+            texts: Input texts to analyze
+            context: Optional context information shared by the batch
+            
+        Returns:
+            EmotionResult per text, in input order
+        """
+        detect = self.detect_emotion
+        return [detect(text, context) for text in texts]
     
-    def _analyze_punctuation(self, text: str) -> Tuple[EmotionType, float]:
+    def _analyze_punctuation(self, text: str, longest_bang: int, has_caps: bool) -> Tuple[EmotionType, float]:
         """Analyze punctuation patterns for emotion indicators."""
         # Multiple exclamation marks = excited/happy
-        if re.search(r'!{2,}', text):
+        if longest_bang >= 2:
             return EmotionType.EXCITED, 0.3
         
         # Question marks might indicate confusion
@@ -157,8 +242,7 @@ class EmotionDetector:
             return EmotionType.CONFUSED, 0.2
         
         # All caps might indicate anger or excitement
-        caps_words = re.findall(r'\b[A-Z]{3,}\b', text)
-        if caps_words:
+        if has_caps:
             return EmotionType.ANGRY, 0.3
         
         return None, 0.0
@@ -0,0 +1,326 @@
+"""
+Acoustic emotion detection
+Prosodic features (pitch contour, energy variation, speaking rate) from the
+utterance PCM, scored into emotions and fused with the text EmotionResult.
+"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .emotion_service import EmotionResult, EmotionType
+
+SAMPLE_RATE = 16000
+FRAME_LENGTH = 640   # 40 ms
+HOP_LENGTH = 160     # 10 ms
+PITCH_MIN_HZ = 70
+PITCH_MAX_HZ = 400
+# Pitch is tracked on a 2x decimated signal: F0 stays far below 4 kHz and
+# the autocorrelation FFTs get four times cheaper
+PITCH_RATE = SAMPLE_RATE // 2
+PITCH_FRAME = FRAME_LENGTH // 2
+PITCH_FFT = 512      # >= PITCH_FRAME + max lag, so no circular wrap
+VOICING_THRESHOLD = 0.45
+SILENCE_DB = -60.0    # absolute floor, dBFS
+DYNAMIC_RANGE_DB = 35.0
+
+_window = np.hanning(PITCH_FRAME).astype(np.float32)
+_lags = np.arange(PITCH_RATE // PITCH_MAX_HZ, PITCH_RATE // PITCH_MIN_HZ + 1)
+
+@dataclass
+class ProsodyFeatures:
+    """Utterance-level prosodic measurements."""
+    duration: float
+    voiced_ratio: float
+    pitch_mean_hz: float
+    pitch_std_semitones: float
+    pitch_range_semitones: float
+    pitch_slope: float          # semitones per second over voiced frames
+    energy_mean_db: float
+    energy_std_db: float
+    speaking_rate: float        # energy peaks (syllable nuclei) per voiced second
+
+    def to_dict(self) -> Dict[str, float]:
+        return {key: round(value, 3) for key, value in asdict(self).items()}
+
+def _frame(audio: np.ndarray, frame_length: int, hop_length: int) -> np.ndarray:
+    """Strided view of overlapping frames (no copy)."""
+    if len(audio) < frame_length:
+        audio = np.pad(audio, (0, frame_length - len(audio)))
+    frame_count = 1 + (len(audio) - frame_length) // hop_length
+    return np.lib.stride_tricks.as_strided(
+        audio,
+        shape=(frame_count, frame_length),
+        strides=(audio.strides[0] * hop_length, audio.strides[0])
+    )
+
+def _track_pitch(audio: np.ndarray, frame_count: int, active: np.ndarray) -> tuple:
+    """
+    F0 and voicing strength per frame from a normalized autocorrelation.
+
+    Only active frames are analyzed; all of them go through one batched
+    float32 FFT at PITCH_RATE, and the peak lag is refined by parabolic
+    interpolation.
+
+    Returns:
+        (f0_hz, strength), zero for inactive frames
+    """
+    from scipy import fft
+
+    f0 = np.zeros(frame_count, dtype=np.float32)
+    strength = np.zeros(frame_count, dtype=np.float32)
+    if not active.any():
+        return f0, strength
+
+    # Pairwise averaging is a cheap anti-alias filter for the decimation
+    even = len(audio) - len(audio) % 2
+    decimated = np.ascontiguousarray(0.5 * (audio[0:even:2] + audio[1:even:2]))
+    frames = _frame(decimated, PITCH_FRAME, HOP_LENGTH // 2)[:frame_count][active[:frame_count]]
+
+    windowed = (frames - frames.mean(axis=1, keepdims=True)) * _window
+    power = np.abs(fft.rfft(windowed, n=PITCH_FFT, axis=1)) ** 2
+    autocorr = fft.irfft(power, n=PITCH_FFT, axis=1)
+    normalized = autocorr[:, _lags[0] - 1:_lags[-1] + 2] / np.maximum(autocorr[:, :1], 1e-10)
+
+    peak = normalized[:, 1:-1].argmax(axis=1) + 1
+    rows = np.arange(len(frames))
+    left, center, right = normalized[rows, peak - 1], normalized[rows, peak], normalized[rows, peak + 1]
+    curvature = left - 2 * center + right
+    offset = np.where(curvature < 0, 0.5 * (left - right) / np.minimum(curvature, -1e-9), 0.0)
+    # A maximum at the edge of the lag range is not a real period peak
+    is_peak = (center >= left) & (center >= right)
+
+    indices = np.flatnonzero(active[:frame_count])
+    f0[indices] = PITCH_RATE / (_lags[0] - 1 + peak + np.clip(offset, -0.5, 0.5))
+    strength[indices] = np.where(is_peak, center, 0.0)
+    return f0, strength
+
+def extract_prosody(audio: np.ndarray, sample_rate: int = SAMPLE_RATE) -> ProsodyFeatures:
+    """
+    Measure prosody of one utterance.
+
+    Pitch comes from a normalized autocorrelation computed for all frames
+    in one batched FFT, so a few seconds of speech cost a few
+    milliseconds. Frames more than DYNAMIC_RANGE_DB below the loudest
+    frame, or below SILENCE_DB, are treated as silence.
+
+    Args:
+        audio: Mono float samples in [-1, 1]
+        sample_rate: Sample rate of audio (resampled to 16 kHz if different)
+
+    Returns:
+        ProsodyFeatures for the utterance
+    """
+    from modules.speaker_id.embeddings import to_mono_16k
+
+    audio = np.ascontiguousarray(to_mono_16k(audio, sample_rate), dtype=np.float32)
+    frames = _frame(audio, FRAME_LENGTH, HOP_LENGTH)
+
+    # Frame energy in dB relative to full scale
+    energy_db = 10 * np.log10(np.einsum("ij,ij->i", frames, frames) / FRAME_LENGTH + 1e-10)
+    active = (energy_db >= energy_db.max() - DYNAMIC_RANGE_DB) & (energy_db >= SILENCE_DB)
+
+    f0_track, strength = _track_pitch(audio, len(frames), active)
+    voiced = active & (strength >= VOICING_THRESHOLD)
+
+    duration = len(audio) / SAMPLE_RATE
+    voiced_count = int(voiced.sum())
+    if voiced_count >= 3:
+        f0 = f0_track[voiced]
+        semitones = 12 * np.log2(f0 / np.median(f0))
+        times = np.flatnonzero(voiced) * HOP_LENGTH / SAMPLE_RATE
+        pitch_mean = float(f0.mean())
+        pitch_std = float(semitones.std())
+        pitch_range = float(np.percentile(semitones, 95) - np.percentile(semitones, 5))
+        pitch_slope = float(np.polyfit(times, semitones, 1)[0]) if np.ptp(times) > 0 else 0.0
+    else:
+        pitch_mean = pitch_std = pitch_range = pitch_slope = 0.0
+
+    active_db = energy_db[active] if active.any() else energy_db
+
+    # Syllable nuclei: local maxima of the smoothed energy envelope that
+    # rise at least 3 dB above the surrounding dips
+    speaking_rate = 0.0
+    voiced_seconds = voiced_count * HOP_LENGTH / SAMPLE_RATE
+    if voiced_seconds > 0:
+        from scipy.signal import find_peaks
+
+        envelope = np.convolve(np.where(active, energy_db, active_db.min()), np.ones(5) / 5, mode="same")
+        peaks, _ = find_peaks(envelope, prominence=3.0, distance=8)
+        speaking_rate = len(peaks) / max(voiced_seconds, 0.25)
+
+    return ProsodyFeatures(
+        duration=duration,
+        voiced_ratio=voiced_count / len(frames),
+        pitch_mean_hz=pitch_mean,
+        pitch_std_semitones=pitch_std,
+        pitch_range_semitones=pitch_range,
+        pitch_slope=pitch_slope,
+        energy_mean_db=float(active_db.mean()),
+        energy_std_db=float(active_db.std()),
+        speaking_rate=speaking_rate
+    )
+
+class AcousticEmotionDetector:
+    """
+    Rule-based emotion scoring from prosody, and fusion with text emotion.
+
+    Arousal is read from pitch variation, energy variation, loudness and
+    speaking rate; wide, rising pitch points to excitement, loud and fast
+    speech with a flatter contour to anger, and quiet, slow, monotone
+    speech to sadness. Feature extraction runs on a small thread pool
+    (NumPy releases the GIL), keeping it off the event loop.
+    """
+
+    def __init__(self, text_weight: float = 0.6, max_workers: int = 2):
+        self.text_weight = text_weight
+        self.max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Lazily create the feature extraction pool."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="prosody")
+        return self._executor
+
+    def score(self, features: ProsodyFeatures) -> Dict[str, float]:
+        """
+        Emotion scores in [0, 1] from prosodic features.
+
+        Args:
+            features: Output of extract_prosody
+
+        Returns:
+            Scores keyed by EmotionType value
+        """
+        scores = {emotion.value: 0.0 for emotion in EmotionType}
+        if features.voiced_ratio < 0.05:
+            scores[EmotionType.NEUTRAL.value] = 0.5
+            return scores
+
+        def ramp(value: float, low: float, high: float) -> float:
+            return float(np.clip((value - low) / (high - low), 0.0, 1.0))
+
+        pitch_variation = ramp(features.pitch_std_semitones, 1.5, 5.0)
+        energy_variation = ramp(features.energy_std_db, 4.0, 12.0)
+        loudness = ramp(features.energy_mean_db, -35.0, -12.0)
+        fast = ramp(features.speaking_rate, 3.5, 6.5)
+        slow = 1.0 - ramp(features.speaking_rate, 2.0, 4.0)
+        rising = ramp(features.pitch_slope, 0.5, 4.0)
+        arousal = 0.35 * pitch_variation + 0.25 * energy_variation + 0.2 * loudness + 0.2 * fast
+
+        scores[EmotionType.EXCITED.value] = arousal * (0.6 + 0.4 * pitch_variation)
+        scores[EmotionType.HAPPY.value] = 0.6 * arousal * pitch_variation + 0.2 * rising
+        scores[EmotionType.ANGRY.value] = arousal * loudness * (1.0 - 0.5 * pitch_variation)
+        scores[EmotionType.SAD.value] = (1.0 - arousal) * (0.5 * slow + 0.5 * (1.0 - loudness)) * (1.0 - pitch_variation)
+        scores[EmotionType.CONFUSED.value] = 0.5 * rising * (1.0 - fast)
+        scores[EmotionType.NEUTRAL.value] = 0.6 * (1.0 - arousal)
+        return {emotion: round(value, 4) for emotion, value in scores.items()}
+
+    def fuse(self, text_result: Optional[EmotionResult], acoustic_scores: Dict[str, float],
+             features: Optional[ProsodyFeatures] = None) -> EmotionResult:
+        """
+        Combine text and acoustic scores into one EmotionResult.
+
+        Args:
+            text_result: Result of emotion_detector.detect_emotion, or None
+            acoustic_scores: Output of score()
+            features: Prosody used for the indicators
+
+        Returns:
+            EmotionResult with weighted scores
+        """
+        text_scores = text_result.emotion_scores if text_result else {}
+        text_weight = self.text_weight if text_result else 0.0
+        if text_result and not text_result.detected_indicators:
+            # Text with no emotional cues only says "probably neutral"; let the voice lead
+            text_weight *= 0.5
+
+        combined = {
+            emotion.value: text_weight * text_scores.get(emotion.value, 0.0)
+            + (1.0 - text_weight) * acoustic_scores.get(emotion.value, 0.0)
+            for emotion in EmotionType
+        }
+
+        indicators: List[str] = list(text_result.detected_indicators) if text_result else []
+        if features:
+            if features.pitch_std_semitones > 4.0:
+                indicators.append("prosody:wide_pitch")
+            if features.speaking_rate > 5.5:
+                indicators.append("prosody:fast_speech")
+            elif 0 < features.speaking_rate < 2.5:
+                indicators.append("prosody:slow_speech")
+            if features.energy_std_db > 10.0:
+                indicators.append("prosody:energy_bursts")
+
+        emotional = {k: v for k, v in combined.items() if k != EmotionType.NEUTRAL.value}
+        primary = max(emotional, key=emotional.get)
+        if combined[primary] < 0.15:
+            primary_emotion = EmotionType.NEUTRAL
+            confidence = max(0.5, min(0.9, combined[EmotionType.NEUTRAL.value] + 0.3))
+        else:
+            primary_emotion = EmotionType(primary)
+            confidence = min(0.95, combined[primary])
+
+        return EmotionResult(
+            primary_emotion=primary_emotion,
+            confidence=round(confidence, 4),
+            emotion_scores={k: round(v, 4) for k, v in combined.items()},
+            detected_indicators=indicators
+        )
+
+    def analyze(self, audio: np.ndarray, sample_rate: int = SAMPLE_RATE) -> Tuple[ProsodyFeatures, Dict[str, float]]:
+        """Extract prosody and score it (synchronous)."""
+        features = extract_prosody(audio, sample_rate)
+        return features, self.score(features)
+
+    def detect(self, audio: np.ndarray, sample_rate: int = SAMPLE_RATE,
+               text_result: Optional[EmotionResult] = None) -> EmotionResult:
+        """Extract prosody, score it and fuse with the text result (synchronous)."""
+        features, scores = self.analyze(audio, sample_rate)
+        return self.fuse(text_result, scores, features)
+
+    async def analyze_async(self, audio: Optional[np.ndarray],
+                            sample_rate: int = SAMPLE_RATE) -> Optional[Tuple[ProsodyFeatures, Dict[str, float]]]:
+        """
+        analyze() on the prosody pool, independent of any transcript.
+
+        Returns None when there is no usable audio or the analysis fails.
+        """
+        if audio is None or len(audio) == 0:
+            return None
+
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._get_executor(), self.analyze, audio, sample_rate)
+        except Exception as e:
+            print(f"Prosody analysis failed: {e}")
+            return None
+
+    async def detect_async(self, audio: Optional[np.ndarray], sample_rate: int = SAMPLE_RATE,
+                           text_result: Optional[EmotionResult] = None) -> Optional[EmotionResult]:
+        """
+        detect() on the prosody pool.
+
+        Returns text_result unchanged when there is no usable audio.
+        """
+        analysis = await self.analyze_async(audio, sample_rate)
+        if analysis is None:
+            return text_result
+
+        features, scores = analysis
+        return self.fuse(text_result, scores, features)
+
+    def shutdown(self):
+        """Stop the prosody pool."""
+        if self._executor:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+# Global acoustic emotion detector instance
+acoustic_emotion_detector = AcousticEmotionDetector(
+    text_weight=float(os.getenv("EMOTION_TEXT_WEIGHT", "0.6"))
+)
@@ -0,0 +1,189 @@
+"""
+Acoustic speaker embeddings
+Vectorized MFCC-statistics embeddings and a cosine-similarity index.
+"""
+import io
+from typing import List, Optional, Tuple
+
+import numpy as np
+from scipy.fft import dct
+
+SAMPLE_RATE = 16000
+FRAME_LENGTH = 400   # 25 ms
+HOP_LENGTH = 160     # 10 ms
+N_FFT = 512
+N_MELS = 40
+N_MFCC = 20
+EMBEDDING_DIM = 3 * (N_MFCC - 1)
+# Deltas need at least two frames
+MIN_UTTERANCE_SAMPLES = FRAME_LENGTH + HOP_LENGTH
+LIFTER = 22
+
+# Sinusoidal lifter: boosts the higher cepstra, which carry most of the
+# speaker-specific vocal tract detail, over the dominant low-order ones
+_lifter = (1 + (LIFTER / 2) * np.sin(np.pi * np.arange(1, N_MFCC) / LIFTER)).astype(np.float32)
+
+_mel_basis: Optional[np.ndarray] = None
+_window = np.hamming(FRAME_LENGTH).astype(np.float32)
+
+def _get_mel_basis() -> np.ndarray:
+    """Mel filterbank, built once."""
+    global _mel_basis
+    if _mel_basis is None:
+        import librosa
+
+        _mel_basis = librosa.filters.mel(sr=SAMPLE_RATE, n_fft=N_FFT, n_mels=N_MELS).T.astype(np.float32)
+    return _mel_basis
+
+def to_mono_16k(audio: np.ndarray, sample_rate: int) -> np.ndarray:
+    """Convert audio to mono float32 at SAMPLE_RATE."""
+    audio = np.asarray(audio, dtype=np.float32)
+    if audio.ndim > 1:
+        audio = audio.mean(axis=1)
+    if sample_rate != SAMPLE_RATE:
+        import soxr
+
+        audio = soxr.resample(audio, sample_rate, SAMPLE_RATE)
+    return audio
+
+def decode_utterance(audio_bytes: bytes) -> Optional[np.ndarray]:
+    """Decode an audio file to mono 16 kHz samples, or None if it can't be decoded."""
+    try:
+        import soundfile as sf
+
+        audio, sample_rate = sf.read(io.BytesIO(audio_bytes), dtype="float32", always_2d=True)
+        return to_mono_16k(audio, sample_rate)
+    except Exception:
+        return None
+
+def _frame(audio: np.ndarray) -> np.ndarray:
+    """Strided view of overlapping frames (no copy)."""
+    if len(audio) < FRAME_LENGTH:
+        audio = np.pad(audio, (0, FRAME_LENGTH - len(audio)))
+    frame_count = 1 + (len(audio) - FRAME_LENGTH) // HOP_LENGTH
+    return np.lib.stride_tricks.as_strided(
+        audio,
+        shape=(frame_count, FRAME_LENGTH),
+        strides=(audio.strides[0] * HOP_LENGTH, audio.strides[0])
+    )
+
+def compute_embeddings(utterances: List[np.ndarray]) -> np.ndarray:
+    """
+    Embed a batch of mono 16 kHz utterances.
+
+    All frames of the batch go through one FFT / filterbank / DCT pass;
+    per-utterance statistics (liftered MFCC mean and std and delta std,
+    c0 dropped) are then reduced with reduceat. Low-energy frames are
+    excluded so silence doesn't pull embeddings together.
+
+    Returns:
+        (len(utterances), EMBEDDING_DIM) array of L2-normalized embeddings;
+        utterances shorter than MIN_UTTERANCE_SAMPLES get an all-zero row
+    """
+    result = np.zeros((len(utterances), EMBEDDING_DIM), dtype=np.float32)
+    usable = [i for i, u in enumerate(utterances) if is_embeddable(u)]
+    if not usable:
+        return result
+
+    framed = [_frame(np.ascontiguousarray(utterances[i], dtype=np.float32)) for i in usable]
+    counts = np.array([len(f) for f in framed])
+    frames = np.concatenate(framed) * _window
+
+    power = np.abs(np.fft.rfft(frames, n=N_FFT, axis=1)) ** 2
+    log_mel = np.log(power @ _get_mel_basis() + 1e-10)
+    mfcc = dct(log_mel, type=2, axis=1, norm="ortho")[:, :N_MFCC]
+
+    # Drop frames more than 30 dB below each utterance's loudest frame
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    energy = log_mel.max(axis=1)
+    peak = np.maximum.reduceat(energy, starts)
+    keep = energy >= np.repeat(peak, counts) - np.log(1000.0)
+    keep_counts = np.add.reduceat(keep.astype(np.int64), starts)
+
+    # Deltas within each utterance only: central differences, one-sided at
+    # the utterance's first and last frame (np.gradient per utterance)
+    ends = starts + counts - 1
+    position = np.arange(len(mfcc))
+    previous = position - 1
+    following = position + 1
+    previous[starts] = starts
+    following[ends] = ends
+    delta = (mfcc[following] - mfcc[previous]) / (following - previous)[:, None]
+    features = mfcc[:, 1:] * _lifter * keep[:, None]
+    deltas = delta[:, 1:] * _lifter * keep[:, None]
+
+    n = keep_counts[:, None].astype(np.float32)
+    mean = np.add.reduceat(features, starts, axis=0) / n
+    var = np.add.reduceat(features ** 2, starts, axis=0) / n - mean ** 2
+    delta_mean = np.add.reduceat(deltas, starts, axis=0) / n
+    delta_var = np.add.reduceat(deltas ** 2, starts, axis=0) / n - delta_mean ** 2
+
+    embeddings = np.concatenate([
+        mean, np.sqrt(np.maximum(var, 0)), np.sqrt(np.maximum(delta_var, 0))
+    ], axis=1).astype(np.float32)
+    embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-9)
+    result[usable] = embeddings
+    return result
+
+def is_embeddable(audio: np.ndarray) -> bool:
+    """Whether a mono 16 kHz utterance is long enough to embed."""
+    return len(audio) >= MIN_UTTERANCE_SAMPLES
+
+def compute_embedding(audio: np.ndarray) -> Optional[np.ndarray]:
+    """Embed a single mono 16 kHz utterance, or None if it is too short."""
+    if not is_embeddable(audio):
+        return None
+    return compute_embeddings([audio])[0]
+
+class SpeakerEmbeddingIndex:
+    """
+    Cosine-similarity index over speaker centroids.
+
+    Centroids are kept L2-normalized in a preallocated matrix (grown by
+    doubling), so a lookup is one matrix-vector product and a batch of
+    lookups is one matrix-matrix product.
+    """
+
+    def __init__(self, dim: int = EMBEDDING_DIM, initial_capacity: int = 64):
+        self.dim = dim
+        self.ids: List[str] = []
+        self._positions = {}
+        self._centroids = np.zeros((initial_capacity, dim), dtype=np.float32)
+        self._sums = np.zeros((initial_capacity, dim), dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, speaker_id: str, embedding: np.ndarray):
+        """Enroll a new speaker with its first embedding."""
+        if len(self.ids) == len(self._centroids):
+            self._centroids = np.concatenate([self._centroids, np.zeros_like(self._centroids)])
+            self._sums = np.concatenate([self._sums, np.zeros_like(self._sums)])
+
+        position = len(self.ids)
+        self.ids.append(speaker_id)
+        self._positions[speaker_id] = position
+        self._sums[position] = embedding
+        self._centroids[position] = embedding / max(float(np.linalg.norm(embedding)), 1e-9)
+
+    def update(self, speaker_id: str, embedding: np.ndarray):
+        """Fold another embedding into a speaker's centroid."""
+        position = self._positions[speaker_id]
+        self._sums[position] += embedding
+        total = self._sums[position]
+        self._centroids[position] = total / max(float(np.linalg.norm(total)), 1e-9)
+
+    def search(self, embeddings: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Best match for each query embedding.
+
+        Returns:
+            (positions, similarities); positions are -1 when the index is empty
+        """
+        embeddings = np.atleast_2d(embeddings)
+        if not self.ids:
+            return np.full(len(embeddings), -1), np.zeros(len(embeddings), dtype=np.float32)
+
+        similarities = embeddings @ self._centroids[:len(self.ids)].T
+        best = similarities.argmax(axis=1)
+        return best, similarities[np.arange(len(embeddings)), best]
@@ -4,9 +4,20 @@ Detects and maintains speaker separation throughout conversations.
 """
 import hashlib
 import re
-from typing import Dict, List, Tuple
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass
 
+import numpy as np
+
+from .embeddings import SpeakerEmbeddingIndex, compute_embeddings, is_embeddable, to_mono_16k
+
+# Cosine similarity at or above which an utterance is attributed to a known
+# speaker and refines the centroid; below NEW_SPEAKER_THRESHOLD a new speaker
+# is enrolled. In between, the closest speaker is reported with low confidence.
+MATCH_THRESHOLD = 0.88
+NEW_SPEAKER_THRESHOLD = 0.8
+
 @dataclass
 class SpeakerInfo:
     """Information about an identified speaker."""
@@ -15,34 +26,153 @@ class SpeakerInfo:
     confidence: float
     first_seen: str
     last_seen: str
+    utterance_count: int = 0
 
 class SpeakerIdentifier:
     """
-    Speaker identification service that analyzes text patterns
-    and maintains speaker consistency across conversations.
+    Speaker identification service that maintains speaker consistency
+    across conversations.
+    
+    When audio is available, speakers are identified acoustically: each
+    utterance is embedded and matched against enrolled speaker centroids
+    in a cosine-similarity index. Text-only calls fall back to a text
+    style signature.
     """
     
-    def __init__(self):
+    def __init__(self,
+                 match_threshold: float = MATCH_THRESHOLD,
+                 new_speaker_threshold: float = NEW_SPEAKER_THRESHOLD):
         self.speakers: Dict[str, SpeakerInfo] = {}
         self.speaker_counter = 0
+        self.match_threshold = match_threshold
+        self.new_speaker_threshold = new_speaker_threshold
+        self.index = SpeakerEmbeddingIndex()
+        self._signature_speakers: Dict[str, str] = {}
         
-    def identify_speaker(self, text: str, audio_features: Dict = None) -> Tuple[str, float]:
+    def identify_speaker(self,
+                         text: str,
+                         audio_features: Dict = None,
+                         audio: Optional[np.ndarray] = None,
+                         sample_rate: int = 16000) -> Tuple[str, float]:
         """
-        Identify speaker from text patterns and optional audio features.
+        Identify speaker from audio, or from text patterns when no audio is given.
         
         Args:
             text: Transcribed text
-            audio_features: Optional audio characteristics (pitch, tone, etc.)
+            audio_features: Optional audio characteristics; an "embedding"
+                entry is used directly as the speaker embedding
+            audio: Optional utterance samples (mono or multi-channel)
+            sample_rate: Sample rate of audio
             
         Returns:
             Tuple of (speaker_id, confidence_score)
         """
-        # Simple speaker identification based on text patterns and style
-        speaker_signature = self._extract_speaker_signature(text)
-        speaker_id = self._get_or_create_speaker(speaker_signature)
-        confidence = self._calculate_confidence(text, speaker_signature)
+        if audio_features and audio_features.get("embedding") is not None:
+            embedding = np.asarray(audio_features["embedding"], dtype=np.float32)
+            return self.identify_embeddings(embedding[None, :])[0]
+        
+        if audio is not None and len(audio) > 0:
+            result = self.identify_speakers_batch([audio], sample_rate)[0]
+            if result is not None:
+                return result
+        
+        # Text-only fallback based on text patterns and style (also for
+        # utterances too short to embed)
+        signature, confidence = self.text_signature(text)
+        return self._get_or_create_speaker(signature), confidence
+    
+    def text_signature(self, text: str) -> Tuple[str, float]:
+        """
+        Text style signature and its confidence, without touching speaker state.
+        
+        Pure function of the text, so batches can compute it in worker
+        processes and resolve the signatures with identify_signatures.
+        
+        Args:
+            text: Transcribed text
+            
+        Returns:
+            Tuple of (signature, confidence_score)
+        """
+        signature = self._extract_speaker_signature(text)
+        return signature, self._calculate_confidence(text, signature)
+    
+    def identify_signatures(self, signatures: List[Tuple[str, float]]) -> List[Tuple[str, float]]:
+        """
+        Resolve precomputed text signatures to speakers, creating new ones as needed.
+        
+        Args:
+            signatures: (signature, confidence) pairs from text_signature
+            
+        Returns:
+            (speaker_id, confidence) per signature, in order
+        """
+        return [(self._get_or_create_speaker(signature), confidence) for signature, confidence in signatures]
+    
+    def identify_speakers_batch(self,
+                                utterances: List[np.ndarray],
+                                sample_rate: int = 16000) -> List[Optional[Tuple[str, float]]]:
+        """
+        Identify the speakers of several utterances at once.
         
-        return speaker_id, confidence
+        Args:
+            utterances: Utterance sample arrays
+            sample_rate: Sample rate shared by the utterances
+            
+        Returns:
+            (speaker_id, confidence) per utterance, in order; None for
+            utterances too short to embed
+        """
+        audio = [to_mono_16k(u, sample_rate) for u in utterances]
+        usable = [i for i, u in enumerate(audio) if is_embeddable(u)]
+        results: List[Optional[Tuple[str, float]]] = [None] * len(audio)
+        if usable:
+            embeddings = compute_embeddings([audio[i] for i in usable])
+            for i, result in zip(usable, self.identify_embeddings(embeddings)):
+                results[i] = result
+        return results
+    
+    def identify_embeddings(self, embeddings: np.ndarray) -> List[Tuple[str, float]]:
+        """
+        Match embeddings against enrolled speakers, enrolling new ones as needed.
+        
+        The whole batch is scored with one matrix product. Utterances that
+        need a new speaker are then resolved in order, since they may
+        belong to a speaker enrolled earlier in the same batch.
+        """
+        positions, similarities = self.index.search(embeddings)
+        results = []
+        enrolled_in_batch = False
+        
+        for embedding, position, similarity in zip(embeddings, positions, similarities):
+            if enrolled_in_batch:
+                # A speaker enrolled earlier in this batch may match better
+                position, similarity = (value[0] for value in self.index.search(embedding))
+            
+            if position < 0 or similarity < self.new_speaker_threshold:
+                speaker_id = self._enroll_speaker(embedding)
+                enrolled_in_batch = True
+                # Confidence that this is a new speaker: distance to the closest known one
+                results.append((speaker_id, 1.0 if position < 0 else 1.0 - float(max(similarity, 0.0))))
+                continue
+            
+            speaker_id = self.index.ids[position]
+            if similarity >= self.match_threshold:
+                self.index.update(speaker_id, embedding)
+            
+            speaker = self.speakers[speaker_id]
+            speaker.utterance_count += 1
+            speaker.last_seen = datetime.now().isoformat()
+            results.append((speaker_id, float(similarity)))
+        
+        return results
+    
+    def _enroll_speaker(self, embedding: np.ndarray) -> str:
+        """Create a speaker from an embedding and add it to the index."""
+        speaker_id = self._create_speaker(f"a{len(self.index):04d}")
+        self.index.add(speaker_id, embedding)
+        self.speakers[speaker_id].utterance_count = 1
+        return speaker_id
     
     def _extract_speaker_signature(self, text: str) -> str:
         """
@@ -88,15 +218,17 @@ class SpeakerIdentifier:
             Speaker ID
         """
         # Check if we've seen this signature before
-        for speaker_id, info in self.speakers.items():
-            if signature in speaker_id:
-                return speaker_id
+        if signature in self._signature_speakers:
+            return self._signature_speakers[signature]
         
-        # Create new speaker
+        speaker_id = self._create_speaker(signature)
+        self._signature_speakers[signature] = speaker_id
+        return speaker_id
+    
+    def _create_speaker(self, suffix: str) -> str:
+        """Register a new speaker with the next letter label."""
         self.speaker_counter += 1
-        speaker_id = f"Speaker_{chr(64 + self.speaker_counter)}_{signature}"
-        
-        from datetime import datetime
+        speaker_id = f"Speaker_{chr(64 + self.speaker_counter)}_{suffix}"
         now = datetime.now().isoformat()
         
         self.speakers[speaker_id] = SpeakerInfo(
@@ -142,7 +274,6 @@ class SpeakerIdentifier:
     def update_speaker_activity(self, speaker_id: str):
         """Update last seen timestamp for a speaker."""
         if speaker_id in self.speakers:
-            from datetime import datetime
             self.speakers[speaker_id].last_seen = datetime.now().isoformat()
 
 # Global speaker identifier instance